@@ -3,10 +3,19 @@ HAZM TUWAIQ - Fatigue Detection
 Detect worker fatigue through facial analysis and body language
 """
 
+import atexit
 import logging
+import multiprocessing
+import os
+import queue
+import sys
+import sysconfig
+import time
 from collections import deque
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 
@@ -28,6 +37,316 @@ try:
 except ImportError:
     MEDIAPIPE_AVAILABLE = False
 
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except Exception:  # Not installed, or a broken install - stay on plain NumPy
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Fallback decorator - kernels run as plain NumPy without numba"""
+
+        def decorator(func):
+            return func
+
+        return decorator
+
+
+# Returned when a ratio can't be computed
+NEUTRAL_ASPECT_RATIO = 0.3
+
+
+@njit(cache=True)
+def _ear_kernel(pts: np.ndarray) -> float:
+    """
+    Eye Aspect Ratio over the extracted points (eye rows 0-5)
+    EAR = (||p2-p6|| + ||p3-p5||) / (2 * ||p1-p4||)
+    """
+    width = np.hypot(pts[0, 0] - pts[3, 0], pts[0, 1] - pts[3, 1])
+    if width == 0:
+        return NEUTRAL_ASPECT_RATIO
+
+    v1 = np.hypot(pts[1, 0] - pts[5, 0], pts[1, 1] - pts[5, 1])
+    v2 = np.hypot(pts[2, 0] - pts[4, 0], pts[2, 1] - pts[4, 1])
+    return (v1 + v2) / (2.0 * width)
+
+
+@njit(cache=True)
+def _mar_kernel(pts: np.ndarray) -> float:
+    """Mouth Aspect Ratio over the extracted points (mouth rows 6-9)"""
+    width = np.hypot(pts[8, 0] - pts[9, 0], pts[8, 1] - pts[9, 1])
+    if width == 0:
+        return NEUTRAL_ASPECT_RATIO
+
+    return np.hypot(pts[6, 0] - pts[7, 0], pts[6, 1] - pts[7, 1]) / width
+
+
+class _RunningSum:
+    """Fixed-size window of numbers with an O(1) running total"""
+
+    __slots__ = ("_buf", "total")
+
+    def __init__(self, maxlen: int):
+        self._buf = deque(maxlen=maxlen)
+        self.total = 0
+
+    def append(self, value):
+        """Add a value, dropping the oldest one once the window is full"""
+        if len(self._buf) == self._buf.maxlen:
+            self.total -= self._buf[0]
+        self._buf.append(value)
+        self.total += value
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+
+class _TasksFaceLandmarker:
+    """
+    MediaPipe Tasks FaceLandmarker behind the solutions FaceMesh interface.
+
+    The GPU delegate keeps the whole landmark graph on the GPU; hosts without
+    one fall back to the CPU delegate. VIDEO running mode keeps process()
+    synchronous, so it works the same inline and in the background worker.
+    """
+
+    def __init__(self, model_asset_path: str, max_num_faces: int):
+        from mediapipe.tasks.python import BaseOptions, vision
+
+        error = None
+        for delegate in (BaseOptions.Delegate.GPU, BaseOptions.Delegate.CPU):
+            try:
+                options = vision.FaceLandmarkerOptions(
+                    base_options=BaseOptions(
+                        model_asset_path=model_asset_path, delegate=delegate
+                    ),
+                    running_mode=vision.RunningMode.VIDEO,
+                    num_faces=max_num_faces,
+                    min_face_detection_confidence=0.5,
+                    min_tracking_confidence=0.5,
+                )
+                self._landmarker = vision.FaceLandmarker.create_from_options(options)
+                self.delegate = delegate.name
+                break
+            except Exception as e:
+                error = e
+        else:
+            raise RuntimeError(f"FaceLandmarker initialization failed: {error}")
+
+        self._last_timestamp_ms = -1
+
+    def process(self, image_rgb: np.ndarray):
+        """Detect face landmarks; same result shape as FaceMesh.process()"""
+        # VIDEO mode requires strictly increasing timestamps
+        timestamp_ms = max(
+            time.monotonic_ns() // 1_000_000, self._last_timestamp_ms + 1
+        )
+        self._last_timestamp_ms = timestamp_ms
+
+        image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image_rgb)
+        result = self._landmarker.detect_for_video(image, timestamp_ms)
+
+        return SimpleNamespace(
+            multi_face_landmarks=[
+                SimpleNamespace(landmark=face) for face in result.face_landmarks
+            ]
+        )
+
+    def close(self):
+        self._landmarker.close()
+
+
+def _create_face_mesh(max_num_faces: int, model_asset_path: Optional[str] = None):
+    """
+    Create the face landmark model with the detector's settings
+
+    Prefers the Tasks FaceLandmarker (GPU delegate) when a .task model bundle
+    is configured, and otherwise uses the solutions FaceMesh.
+    """
+    if model_asset_path:
+        try:
+            return _TasksFaceLandmarker(model_asset_path, max_num_faces)
+        except Exception as e:
+            logging.getLogger(__name__).warning(
+                f"FaceLandmarker unavailable, using FaceMesh: {e}"
+            )
+
+    return mp.solutions.face_mesh.FaceMesh(
+        max_num_faces=max_num_faces,
+        refine_landmarks=True,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5,
+    )
+
+
+def _bgr_to_rgb(image: np.ndarray, buf: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Convert a BGR frame to RGB into a reusable buffer
+
+    The buffer is only reallocated when the frame shape changes, and is left
+    read-only so MediaPipe can use it without copying.
+    """
+    cv2 = _get_cv2()  # Lazy import
+    if buf is None or buf.shape != image.shape or buf.dtype != image.dtype:
+        buf = np.empty(image.shape, dtype=image.dtype)
+
+    buf.flags.writeable = True
+    cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=buf)
+    buf.flags.writeable = False
+    return buf
+
+
+def _face_mesh_worker(
+    shm_name: str,
+    requests,
+    results,
+    max_num_faces: int,
+    model_asset_path: Optional[str],
+):
+    """Worker process loop: run FaceMesh on frames placed in shared memory"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    face_mesh = _create_face_mesh(max_num_faces, model_asset_path)
+    rgb_buf = None
+
+    try:
+        while True:
+            job = requests.get()
+            if job is None:
+                break
+
+            shape, dtype = job
+            image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            try:
+                rgb_buf = _bgr_to_rgb(image, rgb_buf)
+                output = face_mesh.process(rgb_buf)
+                faces = FatigueDetector._face_points(output)
+            except Exception:
+                faces = []
+            del image  # Release the shared buffer view
+            results.put(faces)
+    finally:
+        face_mesh.close()
+        shm.close()
+
+
+def _fit_frame(image: np.ndarray, max_bytes: int) -> np.ndarray:
+    """Uniformly downscale image so it fits in max_bytes (no-op if it does)"""
+    if image.nbytes <= max_bytes:
+        return image
+
+    # Floor the target size: rounding to nearest can overshoot the slot
+    scale = (max_bytes / image.nbytes) ** 0.5
+    height, width = image.shape[:2]
+    dsize = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return _get_cv2().resize(image, dsize)
+
+
+class _FaceMeshWorker:
+    """
+    FaceMesh running in a daemon process, one frame in flight at a time.
+
+    Frames are copied into a single shared-memory slot instead of being
+    pickled; landmarks come back over a queue. The slot is only rewritten
+    after the worker has returned the previous frame's result.
+    """
+
+    def __init__(
+        self,
+        max_num_faces: int,
+        model_asset_path: Optional[str] = None,
+        max_frame_bytes: int = 1920 * 1080 * 3,
+    ):
+        ctx = multiprocessing.get_context("spawn")
+        self._shm = shared_memory.SharedMemory(create=True, size=max_frame_bytes)
+        self._requests = ctx.Queue(maxsize=1)
+        self._results = ctx.Queue()
+        self._busy = False
+        self._process = ctx.Process(
+            target=_face_mesh_worker,
+            args=(
+                self._shm.name,
+                self._requests,
+                self._results,
+                max_num_faces,
+                model_asset_path,
+            ),
+            daemon=True,
+        )
+        try:
+            self._start(self._process)
+        except Exception:
+            self._shm.close()
+            self._shm.unlink()
+            raise
+
+    @staticmethod
+    def _start(process):
+        """
+        Start a spawned process with the stdlib ahead of app paths on sys.path.
+
+        The app inserts backend/ at the front of sys.path, and backend/platform
+        would shadow the stdlib module inside the fresh interpreter.
+        """
+        stdlib = {sysconfig.get_path("stdlib"), sysconfig.get_path("platstdlib")}
+        stdlib |= {os.path.join(path, "lib-dynload") for path in stdlib}
+        saved = list(sys.path)
+        sys.path.sort(key=lambda path: path not in stdlib)
+        try:
+            process.start()
+        finally:
+            sys.path[:] = saved
+
+    def submit(self, image: np.ndarray) -> bool:
+        """Hand a BGR frame to the worker; returns False if it is still busy"""
+        if self._busy:
+            return False
+        if not self._process.is_alive():
+            raise RuntimeError("FaceMesh worker process is not running")
+
+        # Landmarks are normalized, so a uniform downscale doesn't change them
+        image = _fit_frame(image, self._shm.size)
+        assert image.nbytes <= self._shm.size, "frame does not fit the shm slot"
+
+        frame = np.ndarray(image.shape, dtype=image.dtype, buffer=self._shm.buf)
+        frame[...] = image
+        del frame
+        self._requests.put((image.shape, image.dtype.str))
+        self._busy = True
+        return True
+
+    def poll(self) -> Optional[List[Any]]:
+        """
+        Landmarks of the last submitted frame, or None if not ready yet
+
+        Raises RuntimeError if the worker died before answering.
+        """
+        if not self._busy:
+            return None
+
+        try:
+            faces = self._results.get_nowait()
+        except queue.Empty:
+            if self._process.is_alive():
+                return None
+            self._busy = False
+            raise RuntimeError(
+                f"FaceMesh worker exited (code {self._process.exitcode})"
+            )
+
+        self._busy = False
+        return faces
+
+    def close(self):
+        """Stop the worker process and release the shared frame buffer"""
+        if self._process.is_alive():
+            self._requests.put(None)
+            self._process.join(timeout=2)
+            if self._process.is_alive():
+                self._process.terminate()
+        self._shm.close()
+        self._shm.unlink()
+
 
 class FatigueDetector:
     """
@@ -35,83 +354,305 @@ class FatigueDetector:
     Fatigue detection through facial and body language analysis
     """
 
-    def __init__(self):
-        """Initialize fatigue detector"""
+    # MediaPipe face mesh landmark indices
+    # Left eye p1..p6: outer corner, upper lid x2, inner corner, lower lid x2
+    LEFT_EYE_IDX = (33, 160, 158, 133, 153, 144)
+    # Mouth: upper lip, lower lip, left corner, right corner
+    MOUTH_IDX = (13, 14, 61, 291)
+    # Landmark count needed to compute both ratios
+    MIN_LANDMARKS = max(LEFT_EYE_IDX + MOUTH_IDX) + 1
+    # Returned when a ratio can't be computed
+    NEUTRAL_ASPECT_RATIO = NEUTRAL_ASPECT_RATIO
+
+    # Fatigue score thresholds and the (level, message, action) above each
+    LEVEL_THRESHOLDS = np.array([15, 30, 50])
+    LEVEL_TABLE = (
+        ("LOW", "✅ حالة طبيعية", "NONE"),
+        ("MODERATE", "⚡ إرهاق متوسط - مراقبة مستمرة", "MONITOR"),
+        ("HIGH", "⚠️ إرهاق عالي - يُنصح بأخذ استراحة", "SUGGEST_BREAK"),
+        ("CRITICAL", "🚨 إرهاق حرج - يجب إيقاف العمل فوراً", "IMMEDIATE_BREAK"),
+    )
+
+    # Simulation mode: levels with probabilities 0.6 / 0.2 / 0.15 / 0.05
+    SIM_LEVELS = np.array([0, 15, 35, 60])
+    SIM_CDF = np.array([0.6, 0.8, 0.95])
+
+    def __init__(
+        self,
+        max_num_faces: int = 1,
+        async_mode: bool = False,
+        model_asset_path: Optional[str] = None,
+    ):
+        """
+        Initialize fatigue detector
+
+        Args:
+            max_num_faces: Faces FaceMesh looks for per frame (cost scales with it)
+            async_mode: Run FaceMesh in a background process. Results then lag
+                one frame behind, but the caller never waits on the model.
+            model_asset_path: MediaPipe face_landmarker.task bundle; enables the
+                GPU-delegated Tasks API (default: FACE_LANDMARKER_MODEL env var)
+        """
         self.logger = logging.getLogger(__name__)
+        self.max_num_faces = max_num_faces
+        self.async_mode = async_mode
+        self.model_asset_path = model_asset_path or os.getenv("FACE_LANDMARKER_MODEL")
 
         # Fatigue indicators thresholds
         self.EYE_CLOSURE_THRESHOLD = 0.2  # Eye aspect ratio
         self.YAWN_THRESHOLD = 0.6  # Mouth aspect ratio
         self.HEAD_NOD_THRESHOLD = 15  # Degrees
 
-        # Tracking windows (last N frames)
-        self.blink_history = deque(maxlen=100)  # Last 100 frames
-        self.yawn_history = deque(maxlen=100)
-        self.posture_history = deque(maxlen=50)
+        # Tracking windows per person (last N frames)
+        self._per_person: Dict[int, Dict[str, Any]] = {}
+
+        # Last analyses, reported while the background worker is busy
+        self._last_analysis: Dict[int, Dict[str, Any]] = {}
+        self._last_batch: List[Dict[str, Any]] = []
 
         # Initialize MediaPipe if available
         self.face_mesh = None
-        if MEDIAPIPE_AVAILABLE:
-            try:
-                mp_face_mesh = mp.solutions.face_mesh
-                self.face_mesh = mp_face_mesh.FaceMesh(
-                    max_num_faces=5,
-                    refine_landmarks=True,
-                    min_detection_confidence=0.5,
-                    min_tracking_confidence=0.5,
+        self._worker: Optional[_FaceMeshWorker] = None
+        self._rgb_buf: Optional[np.ndarray] = None
+        self._init_face_mesh()
+
+        # Compile the ratio kernels now rather than on the first face
+        if NUMBA_AVAILABLE:
+            _ear_kernel(np.ones((10, 2)))
+            _mar_kernel(np.ones((10, 2)))
+
+    def _init_face_mesh(self):
+        """Create the MediaPipe FaceMesh for the current max_num_faces"""
+        if not MEDIAPIPE_AVAILABLE:
+            return
+
+        try:
+            if self.async_mode:
+                self._worker = _FaceMeshWorker(
+                    self.max_num_faces, self.model_asset_path
+                )
+                atexit.register(self._worker.close)
+                self.logger.info("✅ MediaPipe Face Mesh worker started")
+            else:
+                self.face_mesh = _create_face_mesh(
+                    self.max_num_faces, self.model_asset_path
                 )
                 self.logger.info("✅ MediaPipe Face Mesh initialized")
-            except Exception as e:
-                self.logger.warning(f"MediaPipe initialization failed: {e}")
+        except Exception as e:
+            self.logger.warning(f"MediaPipe initialization failed: {e}")
+
+    def close(self):
+        """Release FaceMesh resources (and stop the background worker)"""
+        if self.face_mesh is not None:
+            self.face_mesh.close()
+            self.face_mesh = None
+        if self._worker is not None:
+            atexit.unregister(self._worker.close)
+            self._worker.close()
+            self._worker = None
+
+    def _drop_worker(self, error: Exception):
+        """Replace a dead background worker with in-process FaceMesh"""
+        self.logger.warning(f"FaceMesh worker failed, running in-process: {error}")
+        self.close()
+        self.async_mode = False
+        self._init_face_mesh()
+
+    def set_max_faces(self, max_num_faces: int):
+        """
+        Change how many faces FaceMesh tracks per frame
 
-    def detect_fatigue(self, image: np.ndarray, person_id: int = 0) -> Dict[str, Any]:
+        Use with detect_fatigue_batch to analyze several workers from one pass.
+        """
+        if max_num_faces == self.max_num_faces:
+            return
+
+        self.max_num_faces = max_num_faces
+        self.close()
+        self._init_face_mesh()
+
+    def _person_history(self, person_id: int) -> Dict[str, Any]:
+        """Get (or start) the tracking windows of one person"""
+        history = self._per_person.get(person_id)
+        if history is None:
+            history = self._per_person[person_id] = {
+                "blink": _RunningSum(100),  # Last 100 frames
+                "yawn": _RunningSum(100),
+                "posture": deque(maxlen=50),
+            }
+        return history
+
+    def reset_history(self, person_id: Optional[int] = None):
+        """Drop tracking windows for one person, or for everyone"""
+        if person_id is None:
+            self._per_person.clear()
+            self._last_analysis.clear()
+            self._last_batch = []
+        else:
+            self._per_person.pop(person_id, None)
+            self._last_analysis.pop(person_id, None)
+
+    @classmethod
+    def _face_points(cls, results) -> List[Optional[np.ndarray]]:
+        """
+        Extract the eye/mouth landmarks of each face into a (10, 2) array
+
+        Protobuf landmarks are read once here; everything downstream indexes
+        plain arrays. Faces with a partial mesh yield None.
+        """
+        points = []
+        for face in results.multi_face_landmarks or []:
+            lm = face.landmark
+            if len(lm) < cls.MIN_LANDMARKS:
+                points.append(None)
+                continue
+            points.append(
+                np.array(
+                    [(lm[i].x, lm[i].y) for i in cls.LEFT_EYE_IDX + cls.MOUTH_IDX],
+                    dtype=np.float64,
+                )
+            )
+        return points
+
+    def _process_faces(self, image: np.ndarray) -> Optional[List[Any]]:
+        """
+        Run FaceMesh on a BGR image and return landmark points for each face
+
+        With the background worker this submits the frame and returns the
+        landmarks of the previous one, or None while the worker is busy.
+        """
+        if self._worker is not None:
+            try:
+                faces = self._worker.poll()
+                self._worker.submit(image)
+                return faces
+            except RuntimeError as e:
+                self._drop_worker(e)
+                if self.face_mesh is None:
+                    # No in-process FaceMesh either; callers fall back to simulation
+                    raise
+
+        # Convert to RGB for MediaPipe
+        self._rgb_buf = _bgr_to_rgb(image, self._rgb_buf)
+
+        # Process image
+        results = self.face_mesh.process(self._rgb_buf)
+
+        return self._face_points(results)
+
+    def detect_fatigue(
+        self,
+        image: np.ndarray,
+        person_id: int = 0,
+        timestamp: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         Detect fatigue indicators in image
 
         Args:
             image: Input image (BGR)
             person_id: ID of person to track
+            timestamp: ISO timestamp of the frame (shared across detectors)
 
         Returns:
             Fatigue analysis results
         """
-        if self.face_mesh is None:
-            return self._simulate_fatigue()
+        if timestamp is None:
+            timestamp = datetime.now().isoformat()
+
+        if self.face_mesh is None and self._worker is None:
+            return self._simulate_fatigue(timestamp)
 
         try:
-            cv2 = _get_cv2()  # Lazy import
-            # Convert to RGB for MediaPipe
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            faces = self._process_faces(image)
 
-            # Process image
-            results = self.face_mesh.process(image_rgb)
+            if faces is None:
+                # Background FaceMesh still busy - keep reporting the last result
+                if person_id in self._last_analysis:
+                    return self._last_analysis[person_id]
 
-            if not results.multi_face_landmarks:
+            if not faces:
                 return {
                     "fatigue_detected": False,
                     "fatigue_level": 0,
                     "indicators": [],
                     "message": "لا يوجد وجوه مكتشفة",
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": timestamp,
                 }
 
             # Analyze first face (or specified person)
-            face_landmarks = results.multi_face_landmarks[0]
+            face_points = faces[0]
 
             # Calculate fatigue indicators
-            indicators = self._analyze_face(face_landmarks, image.shape)
+            indicators = self._analyze_face(face_points, image.shape, person_id)
 
             # Calculate overall fatigue level
-            fatigue_analysis = self._calculate_fatigue_level(indicators)
+            fatigue_analysis = self._calculate_fatigue_level(indicators, timestamp)
+            self._last_analysis[person_id] = fatigue_analysis
 
             return fatigue_analysis
 
         except Exception as e:
             self.logger.error(f"Fatigue detection error: {e}")
-            return self._simulate_fatigue()
+            return self._simulate_fatigue(timestamp)
+
+    def detect_fatigue_batch(
+        self,
+        image: np.ndarray,
+        person_ids: Optional[List[int]] = None,
+        timestamp: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Detect fatigue for every face in the image with a single FaceMesh pass
 
-    def _analyze_face(self, landmarks, image_shape) -> Dict[str, Any]:
-        """Analyze facial landmarks for fatigue indicators"""
+        Args:
+            image: Input image (BGR)
+            person_ids: Tracking IDs in FaceMesh face order (default: face index)
+            timestamp: ISO timestamp of the frame (shared across detectors)
+
+        Returns:
+            One fatigue analysis per detected face, tagged with person_id
+        """
+        if timestamp is None:
+            timestamp = datetime.now().isoformat()
+
+        if self.face_mesh is None and self._worker is None:
+            return [
+                {**self._simulate_fatigue(timestamp), "person_id": person_id}
+                for person_id in (person_ids or [0])
+            ]
+
+        try:
+            faces = self._process_faces(image)
+        except Exception as e:
+            self.logger.error(f"Fatigue detection error: {e}")
+            return []
+
+        if faces is None:
+            # Background FaceMesh still busy - keep reporting the last result
+            return list(self._last_batch)
+
+        analyses = []
+        for index, face_points in enumerate(faces):
+            person_id = (
+                person_ids[index] if person_ids and index < len(person_ids) else index
+            )
+            indicators = self._analyze_face(face_points, image.shape, person_id)
+            analysis = self._calculate_fatigue_level(indicators, timestamp)
+            analysis["person_id"] = person_id
+            analyses.append(analysis)
+
+        self._last_batch = analyses
+        return analyses
+
+    def _analyze_face(
+        self, points: Optional[np.ndarray], image_shape, person_id: int = 0
+    ) -> Dict[str, Any]:
+        """Analyze facial landmark points for fatigue indicators"""
+
+        history = self._person_history(person_id)
+        blink_history = history["blink"]
+        yawn_history = history["yawn"]
 
         indicators = {
             "eye_closure": False,
@@ -121,112 +662,60 @@ class FatigueDetector:
             "details": {},
         }
 
-        # Calculate Eye Aspect Ratio (EAR)
-        ear = self._calculate_eye_aspect_ratio(landmarks)
+        # Partial meshes can't be measured - treat them as a neutral face
+        if points is not None:
+            ear = self._calculate_eye_aspect_ratio(points)
+            mar = self._calculate_mouth_aspect_ratio(points)
+        else:
+            ear = mar = self.NEUTRAL_ASPECT_RATIO
+
+        # Eye Aspect Ratio (EAR)
         if ear < self.EYE_CLOSURE_THRESHOLD:
             indicators["eye_closure"] = True
-            self.blink_history.append(1)
+            blink_history.append(1)
         else:
-            self.blink_history.append(0)
+            blink_history.append(0)
 
         indicators["details"]["eye_aspect_ratio"] = ear
 
-        # Calculate Mouth Aspect Ratio (MAR) for yawning
-        mar = self._calculate_mouth_aspect_ratio(landmarks)
+        # Mouth Aspect Ratio (MAR) for yawning
         if mar > self.YAWN_THRESHOLD:
             indicators["yawning"] = True
-            self.yawn_history.append(1)
+            yawn_history.append(1)
         else:
-            self.yawn_history.append(0)
+            yawn_history.append(0)
 
         indicators["details"]["mouth_aspect_ratio"] = mar
 
         # Check blink frequency
-        if len(self.blink_history) >= 100:
-            blink_rate = sum(self.blink_history) / len(self.blink_history)
+        if len(blink_history) >= 100:
+            blink_rate = blink_history.total / len(blink_history)
             if blink_rate > 0.15:  # More than 15% of frames with eyes closed
                 indicators["slow_blinking"] = True
             indicators["details"]["blink_rate"] = blink_rate
 
         # Check yawn frequency
-        if len(self.yawn_history) >= 100:
-            yawn_rate = sum(self.yawn_history) / len(self.yawn_history)
+        if len(yawn_history) >= 100:
+            yawn_rate = yawn_history.total / len(yawn_history)
             if yawn_rate > 0.05:  # More than 5% of frames yawning
                 indicators["details"]["yawn_frequency"] = "high"
 
         return indicators
 
-    def _calculate_eye_aspect_ratio(self, landmarks) -> float:
+    def _calculate_eye_aspect_ratio(self, points: np.ndarray) -> float:
         """
         Calculate Eye Aspect Ratio (EAR)
         EAR = (||p2-p6|| + ||p3-p5||) / (2 * ||p1-p4||)
         """
-        try:
-            # Left eye landmarks (simplified)
-            # MediaPipe face mesh has 468 landmarks
-            # Eye landmarks: 33, 133, 160, 158, 144, 153
-
-            left_eye = [33, 160, 158, 133, 153, 144]
-
-            # Get landmark coordinates
-            def get_coords(idx):
-                lm = landmarks.landmark[idx]
-                return (lm.x, lm.y)
+        return float(_ear_kernel(points))
 
-            # Calculate vertical distances
-            p2 = get_coords(left_eye[1])
-            p6 = get_coords(left_eye[5])
-            p3 = get_coords(left_eye[2])
-            p5 = get_coords(left_eye[4])
-
-            vertical1 = np.linalg.norm(np.array(p2) - np.array(p6))
-            vertical2 = np.linalg.norm(np.array(p3) - np.array(p5))
-
-            # Calculate horizontal distance
-            p1 = get_coords(left_eye[0])
-            p4 = get_coords(left_eye[3])
-            horizontal = np.linalg.norm(np.array(p1) - np.array(p4))
-
-            # EAR
-            if horizontal == 0:
-                return 0.3
-
-            ear = (vertical1 + vertical2) / (2.0 * horizontal)
-            return ear
-
-        except:
-            return 0.3  # Default neutral value
-
-    def _calculate_mouth_aspect_ratio(self, landmarks) -> float:
+    def _calculate_mouth_aspect_ratio(self, points: np.ndarray) -> float:
         """Calculate Mouth Aspect Ratio (MAR) for yawn detection"""
-        try:
-            # Mouth landmarks: 61, 291, 81, 178
-            mouth = [61, 81, 13, 14, 78, 308]
-
-            def get_coords(idx):
-                lm = landmarks.landmark[idx]
-                return (lm.x, lm.y)
-
-            # Vertical distance (mouth opening)
-            p1 = get_coords(13)  # Upper lip
-            p2 = get_coords(14)  # Lower lip
-            vertical = np.linalg.norm(np.array(p1) - np.array(p2))
+        return float(_mar_kernel(points))
 
-            # Horizontal distance (mouth width)
-            p3 = get_coords(61)  # Left corner
-            p4 = get_coords(291)  # Right corner
-            horizontal = np.linalg.norm(np.array(p3) - np.array(p4))
-
-            if horizontal == 0:
-                return 0.3
-
-            mar = vertical / horizontal
-            return mar
-
-        except:
-            return 0.3
-
-    def _calculate_fatigue_level(self, indicators: Dict[str, Any]) -> Dict[str, Any]:
+    def _calculate_fatigue_level(
+        self, indicators: Dict[str, Any], timestamp: str
+    ) -> Dict[str, Any]:
         """Calculate overall fatigue level from indicators"""
 
         fatigue_score = 0
@@ -274,22 +763,7 @@ class FatigueDetector:
             )
 
         # Determine fatigue level
-        if fatigue_score >= 50:
-            level = "CRITICAL"
-            message = "🚨 إرهاق حرج - يجب إيقاف العمل فوراً"
-            action = "IMMEDIATE_BREAK"
-        elif fatigue_score >= 30:
-            level = "HIGH"
-            message = "⚠️ إرهاق عالي - يُنصح بأخذ استراحة"
-            action = "SUGGEST_BREAK"
-        elif fatigue_score >= 15:
-            level = "MODERATE"
-            message = "⚡ إرهاق متوسط - مراقبة مستمرة"
-            action = "MONITOR"
-        else:
-            level = "LOW"
-            message = "✅ حالة طبيعية"
-            action = "NONE"
+        level, message, action = self._level_for_score(fatigue_score)
 
         return {
             "fatigue_detected": fatigue_score > 0,
@@ -299,14 +773,22 @@ class FatigueDetector:
             "message": message,
             "recommended_action": action,
             "details": indicators.get("details", {}),
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
         }
 
-    def _simulate_fatigue(self) -> Dict[str, Any]:
+    def _level_for_score(self, fatigue_score: int) -> Tuple[str, str, str]:
+        """(level, message, action) for a fatigue score"""
+        bucket = int(
+            np.searchsorted(self.LEVEL_THRESHOLDS, fatigue_score, side="right")
+        )
+        return self.LEVEL_TABLE[bucket]
+
+    def _simulate_fatigue(self, timestamp: str) -> Dict[str, Any]:
         """Simulate fatigue detection when MediaPipe not available"""
 
-        # Random fatigue level
-        fatigue_level = np.random.choice([0, 15, 35, 60], p=[0.6, 0.2, 0.15, 0.05])
+        # Random fatigue level (inverse-CDF sample, no per-call validation)
+        bucket = np.searchsorted(self.SIM_CDF, np.random.random(), side="right")
+        fatigue_level = int(self.SIM_LEVELS[bucket])
 
         indicators = []
 
@@ -328,22 +810,7 @@ class FatigueDetector:
                 }
             )
 
-        if fatigue_level >= 50:
-            level = "CRITICAL"
-            message = "🚨 إرهاق حرج - يجب إيقاف العمل فوراً"
-            action = "IMMEDIATE_BREAK"
-        elif fatigue_level >= 30:
-            level = "HIGH"
-            message = "⚠️ إرهاق عالي - يُنصح بأخذ استراحة"
-            action = "SUGGEST_BREAK"
-        elif fatigue_level >= 15:
-            level = "MODERATE"
-            message = "⚡ إرهاق متوسط - مراقبة مستمرة"
-            action = "MONITOR"
-        else:
-            level = "LOW"
-            message = "✅ حالة طبيعية"
-            action = "NONE"
+        level, message, action = self._level_for_score(fatigue_level)
 
         return {
             "fatigue_detected": fatigue_level > 0,
@@ -357,7 +824,7 @@ class FatigueDetector:
                 "mouth_aspect_ratio": 0.65 if fatigue_level >= 50 else 0.30,
                 "blink_rate": 0.18 if fatigue_level >= 30 else 0.08,
             },
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
             "simulation_mode": True,
         }
 
@@ -5,12 +5,75 @@ Revolutionary "Unhappened Accident" Engine
 """
 
 import logging
-from collections import deque
+import math
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except Exception:  # Not installed, or a broken install - stay on plain NumPy
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Fallback decorator - kernels run as plain NumPy without numba"""
+
+        def decorator(func):
+            return func
+
+        return decorator
+
+
+def _push(buf: np.ndarray, head: int, n: int, value) -> Tuple[int, int]:
+    """Write value into a ring buffer slot, returning the new (head, count)"""
+    buf[head] = value
+    return (head + 1) % len(buf), min(n + 1, len(buf))
+
+
+def _window(buf: np.ndarray, head: int, n: int) -> np.ndarray:
+    """Ring buffer contents in chronological order (oldest first)"""
+    if n < len(buf):
+        return buf[:n]
+    return np.roll(buf, -head, axis=0)
+
+
+@njit(cache=True)
+def _movement_stats(
+    vel: np.ndarray, dirs: np.ndarray
+) -> Tuple[float, float, float, float, int]:
+    """
+    All per-frame movement reductions in one pass
+
+    Args:
+        vel: (N, 2) velocity window
+        dirs: (M, 2) unit directions, oldest first (may be empty)
+
+    Returns:
+        (avg_vx, avg_vy, speed_sq, direction_variance, direction_changes)
+    """
+    avg_vx = vel[:, 0].mean()
+    avg_vy = vel[:, 1].mean()
+
+    direction_variance = 0.0
+    direction_changes = 0
+    if dirs.shape[0] > 0:
+        direction_variance = dirs[:, 0].var() + dirs[:, 1].var()
+
+        # Angle between consecutive directions; > 0.5 rad is ~30 degrees
+        dots = dirs[1:, 0] * dirs[:-1, 0] + dirs[1:, 1] * dirs[:-1, 1]
+        direction_changes = np.count_nonzero(np.arccos(np.clip(dots, -1.0, 1.0)) > 0.5)
+
+    return (
+        avg_vx,
+        avg_vy,
+        avg_vx * avg_vx + avg_vy * avg_vy,
+        direction_variance,
+        direction_changes,
+    )
+
 
 class IntentDetector:
     """
@@ -20,6 +83,10 @@ class IntentDetector:
     This is the revolutionary "Unhappened Accident Engine"
     """
 
+    # Movement type by average speed; compared squared to skip the sqrt
+    SPEED_THRESHOLDS_SQ = np.array([5.0, 15.0, 30.0]) ** 2
+    MOVEMENT_TYPES = ("STATIONARY", "WALKING", "FAST_WALKING", "RUNNING")
+
     def __init__(self, history_window: int = 30):
         """
         Initialize intent detector
@@ -30,23 +97,59 @@ class IntentDetector:
         self.history_window = history_window
         self.logger = logging.getLogger(__name__)
 
+        # Tracking histories (fixed-size ring buffers)
+        self._init_history()
+
+        # Known dangerous zones (would come from configuration)
+        self.set_danger_zones(
+            [
+                {"name": "Heavy Machinery Area", "x": 100, "y": 200, "radius": 150},
+                {"name": "Electrical Panel", "x": 500, "y": 300, "radius": 100},
+                {"name": "Loading Zone", "x": 800, "y": 400, "radius": 200},
+            ]
+        )
+
+        # Compile numeric kernels up front so the first frame doesn't pay for it
+        if NUMBA_AVAILABLE:
+            _movement_stats(np.zeros((2, 2)), np.zeros((2, 2)))
+
+    def set_danger_zones(self, zones: List[Dict[str, Any]]):
+        """
+        Configure danger zones
+
+        Args:
+            zones: Dicts with name, x, y and radius
+        """
+        self.danger_zones = list(zones)
+
+        # (Z, 3) array of x, y, radius so per-frame checks skip dict lookups
+        self._zone_arr = np.array(
+            [[z["x"], z["y"], z["radius"]] for z in self.danger_zones],
+            dtype=np.float64,
+        ).reshape(-1, 3)
+        self._zone_names = [z["name"] for z in self.danger_zones]
+        self._zone_r2 = self._zone_arr[:, 2] ** 2
+        self._zone_warn_r2 = (self._zone_arr[:, 2] * 1.5) ** 2  # Warning zone
+
+    def _init_history(self):
+        """Allocate (history_window, 2) ring buffers for all tracked series"""
+        window = self.history_window
+
         # Movement tracking
-        self.position_history = deque(maxlen=history_window)
-        self.velocity_history = deque(maxlen=history_window)
-        self.direction_history = deque(maxlen=history_window)
+        self._pos = np.zeros((window, 2))
+        self._pos_head = self._pos_n = 0
+        self._vel = np.zeros((window, 2))
+        self._vel_head = self._vel_n = 0
+        self._dir = np.zeros((window, 2))
+        self._dir_head = self._dir_n = 0
 
         # Gaze tracking
-        self.gaze_history = deque(maxlen=history_window)
+        self._gaze = np.zeros((window, 2))
+        self._gaze_head = self._gaze_n = 0
 
         # Body orientation tracking
-        self.orientation_history = deque(maxlen=history_window)
-
-        # Known dangerous zones (would come from configuration)
-        self.danger_zones = [
-            {"name": "Heavy Machinery Area", "x": 100, "y": 200, "radius": 150},
-            {"name": "Electrical Panel", "x": 500, "y": 300, "radius": 100},
-            {"name": "Loading Zone", "x": 800, "y": 400, "radius": 200},
-        ]
+        self._ori = np.zeros((window, 2))
+        self._ori_head = self._ori_n = 0
 
     def detect_intent(
         self,
@@ -54,6 +157,7 @@ class IntentDetector:
         person_pose: Optional[Dict] = None,
         gaze_direction: Optional[Tuple[float, float]] = None,
         context: Optional[Dict] = None,
+        timestamp: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Detect person's intent and predict potential accidents
@@ -63,6 +167,7 @@ class IntentDetector:
             person_pose: Pose keypoints from pose estimator
             gaze_direction: (dx, dy) gaze vector
             context: Additional context (nearby objects, etc.)
+            timestamp: ISO timestamp of the frame (shared across detectors)
 
         Returns:
             Intent analysis with predictions
@@ -92,11 +197,11 @@ class IntentDetector:
 
         return {
             "intent": movement_analysis,
-            "predicted_path": predicted_path,
+            "predicted_path": predicted_path.tolist(),
             "collision_risks": collision_risks,
             "dangerous_intents": dangerous_intents,
             "risk_assessment": risk_assessment,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp or datetime.now().isoformat(),
         }
 
     def _update_history(
@@ -105,28 +210,37 @@ class IntentDetector:
         """Update tracking histories"""
 
         # Add position
-        self.position_history.append(position)
+        self._pos_head, self._pos_n = _push(
+            self._pos, self._pos_head, self._pos_n, position
+        )
 
         # Calculate velocity
-        if len(self.position_history) >= 2:
-            prev_pos = self.position_history[-2]
-            velocity = (position[0] - prev_pos[0], position[1] - prev_pos[1])
-            self.velocity_history.append(velocity)
+        if self._pos_n >= 2:
+            prev_x, prev_y = self._pos[self._pos_head - 2]
+            velocity = (position[0] - prev_x, position[1] - prev_y)
+            self._vel_head, self._vel_n = _push(
+                self._vel, self._vel_head, self._vel_n, velocity
+            )
 
             # Calculate direction
-            speed = np.sqrt(velocity[0] ** 2 + velocity[1] ** 2)
-            if speed > 0:
+            speed_sq = velocity[0] * velocity[0] + velocity[1] * velocity[1]
+            if speed_sq > 0:
+                speed = math.sqrt(speed_sq)
                 direction = (velocity[0] / speed, velocity[1] / speed)
-                self.direction_history.append(direction)
+                self._dir_head, self._dir_n = _push(
+                    self._dir, self._dir_head, self._dir_n, direction
+                )
 
         # Add gaze
         if gaze:
-            self.gaze_history.append(gaze)
+            self._gaze_head, self._gaze_n = _push(
+                self._gaze, self._gaze_head, self._gaze_n, gaze
+            )
 
     def _analyze_movement(self) -> Dict[str, Any]:
         """Analyze movement patterns"""
 
-        if len(self.velocity_history) < 5:
+        if self._vel_n < 5:
             return {
                 "type": "STATIONARY",
                 "speed": 0,
@@ -134,127 +248,103 @@ class IntentDetector:
                 "pattern": "INSUFFICIENT_DATA",
             }
 
-        # Calculate average velocity
-        velocities = list(self.velocity_history)
-        avg_vx = np.mean([v[0] for v in velocities])
-        avg_vy = np.mean([v[1] for v in velocities])
+        # Direction pattern needs at least 10 samples, in chronological order
+        if self._dir_n >= 10:
+            directions = _window(self._dir, self._dir_head, self._dir_n)
+        else:
+            directions = self._dir[:0]
 
-        speed = np.sqrt(avg_vx**2 + avg_vy**2)
+        # Velocity order doesn't matter for the mean
+        avg_vx, avg_vy, speed_sq, direction_variance, direction_changes = (
+            _movement_stats(self._vel[: self._vel_n], directions)
+        )
 
         # Determine movement type
-        if speed < 5:
-            movement_type = "STATIONARY"
-        elif speed < 15:
-            movement_type = "WALKING"
-        elif speed < 30:
-            movement_type = "FAST_WALKING"
-        else:
-            movement_type = "RUNNING"
+        movement_type = self.MOVEMENT_TYPES[
+            np.searchsorted(self.SPEED_THRESHOLDS_SQ, speed_sq, side="right")
+        ]
 
         # Detect patterns
-        pattern = self._detect_movement_pattern()
+        pattern = self._detect_movement_pattern(
+            len(directions), direction_variance, direction_changes
+        )
 
         return {
             "type": movement_type,
-            "speed": float(speed),
-            "direction": (float(avg_vx), float(avg_vy)) if speed > 0 else None,
+            "speed": math.sqrt(speed_sq),
+            "direction": (float(avg_vx), float(avg_vy)) if speed_sq > 0 else None,
             "pattern": pattern,
         }
 
-    def _detect_movement_pattern(self) -> str:
-        """Detect specific movement patterns"""
+    def _detect_movement_pattern(
+        self, samples: int, direction_variance: float, direction_changes: int
+    ) -> str:
+        """Detect specific movement patterns from direction statistics"""
 
-        if len(self.direction_history) < 10:
+        if samples < 10:
             return "UNKNOWN"
 
-        directions = list(self.direction_history)
-
         # Check for straight line
-        direction_variance = np.var([d[0] for d in directions]) + np.var(
-            [d[1] for d in directions]
-        )
-
         if direction_variance < 0.1:
             return "STRAIGHT_LINE"
 
         # Check for turning
-        direction_changes = 0
-        for i in range(1, len(directions)):
-            angle_change = np.arccos(
-                np.clip(
-                    directions[i][0] * directions[i - 1][0]
-                    + directions[i][1] * directions[i - 1][1],
-                    -1.0,
-                    1.0,
-                )
-            )
-            if abs(angle_change) > 0.5:  # ~30 degrees
-                direction_changes += 1
-
-        if direction_changes > len(directions) * 0.3:
+        if direction_changes > samples * 0.3:
             return "ERRATIC"
         elif direction_changes > 2:
             return "TURNING"
 
         return "NORMAL"
 
-    def _predict_trajectory(self, steps: int = 10) -> List[Tuple[float, float]]:
-        """Predict future trajectory"""
+    def _predict_trajectory(self, steps: int = 10) -> np.ndarray:
+        """Predict future trajectory as a (steps, 2) array (empty without history)"""
 
-        if len(self.position_history) < 2 or len(self.velocity_history) < 2:
-            return []
+        if self._pos_n < 2 or self._vel_n < 2:
+            return np.empty((0, 2))
 
         # Get current position and velocity
-        current_pos = self.position_history[-1]
-        current_vel = self.velocity_history[-1]
-
-        # Simple linear prediction
-        trajectory = []
-        for i in range(1, steps + 1):
-            predicted_pos = (
-                current_pos[0] + current_vel[0] * i,
-                current_pos[1] + current_vel[1] * i,
-            )
-            trajectory.append(predicted_pos)
+        current_pos = self._pos[self._pos_head - 1]
+        current_vel = self._vel[self._vel_head - 1]
 
-        return trajectory
+        # Simple linear prediction for all steps at once
+        t = np.arange(1, steps + 1, dtype=np.float64)[:, None]
+        return current_pos[None, :] + current_vel[None, :] * t
 
-    def _check_collision_risks(
-        self, trajectory: List[Tuple[float, float]]
-    ) -> List[Dict[str, Any]]:
+    def _check_collision_risks(self, trajectory: np.ndarray) -> List[Dict[str, Any]]:
         """Check if predicted trajectory intersects danger zones"""
 
         risks = []
 
-        for point in trajectory:
-            for zone in self.danger_zones:
-                # Calculate distance to danger zone
-                distance = np.sqrt(
-                    (point[0] - zone["x"]) ** 2 + (point[1] - zone["y"]) ** 2
-                )
+        if not len(trajectory):
+            return risks
+
+        # Squared distance from every step to every zone centre: (steps, zones)
+        d2 = ((trajectory[:, None, :] - self._zone_arr[None, :, :2]) ** 2).sum(-1)
+        hits = d2 < self._zone_r2
 
-                if distance < zone["radius"]:
-                    # Calculate time to collision
-                    step_index = trajectory.index(point)
-                    time_to_collision = step_index * 0.1  # Assuming 10 FPS
-
-                    risks.append(
-                        {
-                            "zone": zone["name"],
-                            "time_to_collision": time_to_collision,
-                            "severity": "HIGH" if time_to_collision < 2 else "MEDIUM",
-                            "predicted_position": point,
-                            "type": "TRAJECTORY_COLLISION",
-                        }
-                    )
-                    break
+        # Only the first matching zone (in configured order) counts per step
+        for step_index in np.flatnonzero(hits.any(axis=1)):
+            zone_name = self._zone_names[hits[step_index].argmax()]
+
+            # Calculate time to collision
+            time_to_collision = int(step_index) * 0.1  # Assuming 10 FPS
+
+            risks.append(
+                {
+                    "zone": zone_name,
+                    "time_to_collision": time_to_collision,
+                    "severity": "HIGH" if time_to_collision < 2 else "MEDIUM",
+                    "predicted_position": tuple(trajectory[step_index].tolist()),
+                    "type": "TRAJECTORY_COLLISION",
+                }
+            )
 
         return risks
 
     def _detect_dangerous_intents(
         self,
         movement: Dict[str, Any],
-        trajectory: List[Tuple[float, float]],
+        trajectory: np.ndarray,
         pose: Optional[Dict],
         context: Optional[Dict],
     ) -> List[Dict[str, Any]]:
@@ -263,7 +353,7 @@ class IntentDetector:
         intents = []
 
         # Running towards danger
-        if movement["type"] == "RUNNING" and trajectory:
+        if movement["type"] == "RUNNING" and len(trajectory):
             intents.append(
                 {
                     "intent": "RUSHING",
@@ -285,9 +375,8 @@ class IntentDetector:
             )
 
         # Not looking at path (would use gaze data)
-        if self.gaze_history and len(self.gaze_history) >= 5:
+        if self._gaze_n >= 5:
             # Check if gaze direction differs from movement direction
-            recent_gazes = list(self.gaze_history)[-5:]
             if movement["direction"]:
                 # Simplified check
                 intents.append(
@@ -300,21 +389,18 @@ class IntentDetector:
                 )
 
         # Approaching restricted area
-        if trajectory:
-            last_point = trajectory[-1]
-            for zone in self.danger_zones:
-                distance = np.sqrt(
-                    (last_point[0] - zone["x"]) ** 2 + (last_point[1] - zone["y"]) ** 2
+        if len(trajectory):
+            d2 = ((self._zone_arr[:, :2] - trajectory[-1]) ** 2).sum(axis=1)
+            for zone_index in np.flatnonzero(d2 < self._zone_warn_r2):
+                zone_name = self._zone_names[zone_index]
+                intents.append(
+                    {
+                        "intent": "APPROACHING_DANGER_ZONE",
+                        "risk": "HIGH",
+                        "description": f"اقتراب من منطقة خطرة: {zone_name}",
+                        "prevention": "إيقاف الوصول أو تحذير العامل",
+                    }
                 )
-                if distance < zone["radius"] * 1.5:  # Warning zone
-                    intents.append(
-                        {
-                            "intent": "APPROACHING_DANGER_ZONE",
-                            "risk": "HIGH",
-                            "description": f'اقتراب من منطقة خطرة: {zone["name"]}',
-                            "prevention": "إيقاف الوصول أو تحذير العامل",
-                        }
-                    )
 
         return intents
 
@@ -378,12 +464,12 @@ class IntentDetector:
         }
 
     def reset_history(self):
-        """Reset all tracking histories"""
-        self.position_history.clear()
-        self.velocity_history.clear()
-        self.direction_history.clear()
-        self.gaze_history.clear()
-        self.orientation_history.clear()
+        """Reset all tracking histories (buffers stay allocated)"""
+        self._pos_head = self._pos_n = 0
+        self._vel_head = self._vel_n = 0
+        self._dir_head = self._dir_n = 0
+        self._gaze_head = self._gaze_n = 0
+        self._ori_head = self._ori_n = 0
 
 
 # Singleton instance
@@ -0,0 +1,483 @@
+"""
+HAZM TUWAIQ - Model Backends
+Faster inference backends and runtime settings for the Ultralytics models
+"""
+
+import contextlib
+import importlib.util
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Input size every model is exported, warmed up and run at, so engines and
+# cuDNN autotuning only ever see one shape
+IMGSZ = 640
+
+_THREAD_STATE = threading.local()
+
+# One loaded model per weights file, shared by every engine in the process
+_MODELS: Dict[str, Any] = {}
+_BATCH_LIMITS: Dict[str, int] = {}  # Most frames per call each model accepts
+_MODELS_LOCK = threading.Lock()
+
+
+class DeviceFrame(NamedTuple):
+    """A frame letterboxed once on the GPU, shared by several models"""
+
+    tensor: Any  # (1, 3, IMGSZ, IMGSZ) RGB float in [0, 1] on the device
+    scale: float
+    pad_x: int
+    pad_y: int
+    shape: Tuple[int, ...]  # Original frame shape (h, w, c)
+
+    def unletterbox(self, xy: np.ndarray) -> np.ndarray:
+        """Map (..., 2k) letterbox x/y coordinates back onto the original frame"""
+        h, w = self.shape[:2]
+        pairs = (xy.reshape(-1, 2) - (self.pad_x, self.pad_y)) / self.scale
+        np.clip(pairs, 0, (w, h), out=pairs)
+        return pairs.astype(np.float32).reshape(xy.shape)
+
+
+def _cuda_device_name() -> Optional[str]:
+    """Name of the first CUDA device, or None without torch/CUDA"""
+    try:
+        import torch
+    except ImportError:
+        return None
+
+    if not torch.cuda.is_available():
+        return None
+
+    return torch.cuda.get_device_name(0)
+
+
+def export_tensorrt(model: Any, model_path: str, imgsz: int = IMGSZ) -> Optional[str]:
+    """
+    Export a TensorRT engine for a loaded YOLO model (once, then cached)
+
+    Only runs when TORCH_DEVICE=cuda. FP16 by default; YOLO_INT8=1 builds an
+    INT8 engine calibrated on the YOLO_CALIB_YAML dataset instead. The engine
+    takes dynamic batches of up to max_batch() frames. Engines are cached per
+    GPU model since INT8 calibration is device-specific.
+
+    Args:
+        model: Loaded ultralytics YOLO model (PyTorch weights)
+        model_path: Weights path the model was loaded from
+        imgsz: Fixed input size the engine is built for
+
+    Returns:
+        Path to the engine file, or None to keep the PyTorch model
+    """
+    if not os.getenv("TORCH_DEVICE", "cpu").startswith("cuda"):
+        return None
+
+    if Path(model_path).suffix != ".pt":
+        return None  # Already an exported format
+
+    device_name = _cuda_device_name()
+    if device_name is None:
+        logger.warning("TORCH_DEVICE=cuda but CUDA is not available")
+        return None
+
+    batch = max_batch()
+    int8 = os.getenv("YOLO_INT8") == "1"
+    precision = "int8" if int8 else "fp16"
+
+    cache_dir = Path(model_path).parent / "engines" / device_name.replace(" ", "_")
+    engine_path = (
+        cache_dir / f"{Path(model_path).stem}_{precision}_b{batch}_{imgsz}.engine"
+    )
+    if engine_path.exists():
+        return str(engine_path)
+
+    export_args = {
+        "format": "engine",
+        "half": not int8,
+        "imgsz": imgsz,
+        "device": 0,
+        "dynamic": True,
+        "batch": batch,
+    }
+    if int8:
+        export_args["int8"] = True
+        export_args["data"] = os.getenv("YOLO_CALIB_YAML")
+
+    try:
+        logger.info(f"Exporting TensorRT {precision} engine for {model_path}...")
+        exported = model.export(**export_args)
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        Path(exported).replace(engine_path)
+
+        logger.info(f"✅ TensorRT engine cached at {engine_path}")
+        return str(engine_path)
+
+    except Exception as e:
+        logger.error(f"❌ TensorRT export failed, using PyTorch weights: {e}")
+        return None
+
+
+def export_cpu_model(model: Any, model_path: str, imgsz: int = IMGSZ) -> Optional[str]:
+    """
+    Export a CPU-optimized copy of a loaded YOLO model (once, then cached)
+
+    Runs when TORCH_DEVICE is not CUDA. Prefers OpenVINO and falls back to
+    ONNX Runtime, whichever is installed; YOLO_CPU_EXPORT=0 turns it off.
+    Ultralytics loads either format directly, keeping its letterbox/NMS.
+    YOLO_INT8=1 quantizes to INT8 (OpenVINO via YOLO_CALIB_YAML, ONNX via
+    static QDQ quantization on the images in YOLO_CALIB_DIR).
+
+    Args:
+        model: Loaded ultralytics YOLO model (PyTorch weights)
+        model_path: Weights path the model was loaded from
+        imgsz: Input size for the export
+
+    Returns:
+        Path to the exported model, or None to keep the PyTorch model
+    """
+    if os.getenv("TORCH_DEVICE", "cpu").startswith("cuda"):
+        return None
+
+    if os.getenv("YOLO_CPU_EXPORT", "1") != "1" or Path(model_path).suffix != ".pt":
+        return None
+
+    weights = Path(model_path)
+    int8 = os.getenv("YOLO_INT8") == "1"
+    if importlib.util.find_spec("openvino") is not None:
+        export_args = {"format": "openvino", "imgsz": imgsz}
+        suffix = "_openvino_model"
+        if int8:
+            export_args["int8"] = True
+            export_args["data"] = os.getenv("YOLO_CALIB_YAML")
+            suffix = "_int8" + suffix
+        exported_path = weights.parent / f"{weights.stem}{suffix}"
+    elif importlib.util.find_spec("onnxruntime") is not None:
+        export_args = {"format": "onnx", "imgsz": imgsz, "dynamic": True}
+        export_args["simplify"] = True
+        exported_path = weights.with_suffix(".onnx")
+    else:
+        return None
+
+    if exported_path.exists():
+        exported = str(exported_path)
+    else:
+        try:
+            logger.info(f"Exporting {export_args['format']} model for {model_path}...")
+            exported = str(model.export(**export_args))
+            logger.info(f"✅ CPU model cached at {exported}")
+
+        except Exception as e:
+            logger.error(f"❌ CPU export failed, using PyTorch weights: {e}")
+            return None
+
+    if int8 and export_args["format"] == "onnx":
+        return _quantize_onnx(exported, imgsz) or exported
+
+    return exported
+
+
+class _CalibrationReader:
+    """Feeds letterboxed calibration images to onnxruntime's quantizer"""
+
+    def __init__(self, images_dir: str, input_name: str, imgsz: int, limit=100):
+        extensions = {".jpg", ".jpeg", ".png", ".bmp"}
+        self.paths = sorted(
+            p for p in Path(images_dir).iterdir() if p.suffix.lower() in extensions
+        )[:limit]
+        self.input_name = input_name
+        self.imgsz = imgsz
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        """Next preprocessed (1, 3, imgsz, imgsz) batch, or None when done"""
+        import cv2
+
+        while self.paths:
+            image = cv2.imread(str(self.paths.pop(0)))
+            if image is None:
+                continue
+
+            # Letterbox like Ultralytics: scale to fit, pad with gray
+            h, w = image.shape[:2]
+            scale = self.imgsz / max(h, w)
+            new_w, new_h = round(w * scale), round(h * scale)
+            canvas = np.full((self.imgsz, self.imgsz, 3), 114, np.uint8)
+            top, left = (self.imgsz - new_h) // 2, (self.imgsz - new_w) // 2
+            canvas[top : top + new_h, left : left + new_w] = cv2.resize(
+                image, (new_w, new_h), interpolation=cv2.INTER_LINEAR
+            )
+
+            # BGR HWC uint8 -> RGB CHW float32 in [0, 1]
+            blob = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32)
+            return {self.input_name: blob / 255.0}
+
+        return None
+
+
+def _quantize_onnx(onnx_path: str, imgsz: int) -> Optional[str]:
+    """Static INT8 (QDQ, per-channel) copy of an ONNX model, cached beside it"""
+    quantized_path = Path(onnx_path).with_name(f"{Path(onnx_path).stem}_int8.onnx")
+    if quantized_path.exists():
+        return str(quantized_path)
+
+    calib_dir = os.getenv("YOLO_CALIB_DIR")
+    if not calib_dir or not Path(calib_dir).is_dir():
+        logger.warning("YOLO_INT8 needs YOLO_CALIB_DIR with calibration images")
+        return None
+
+    try:
+        import onnxruntime as ort
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+        input_name = (
+            ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+            .get_inputs()[0]
+            .name
+        )
+
+        logger.info(f"Quantizing {onnx_path} to INT8...")
+        quantize_static(
+            onnx_path,
+            str(quantized_path),
+            _CalibrationReader(calib_dir, input_name, imgsz),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QInt8,
+            weight_type=QuantType.QInt8,
+        )
+
+        logger.info(f"✅ INT8 model cached at {quantized_path}")
+        return str(quantized_path)
+
+    except Exception as e:
+        logger.error(f"❌ INT8 quantization failed, using FP32 ONNX: {e}")
+        return None
+
+
+def max_batch() -> int:
+    """Most frames per model call (YOLO_BATCH, default 16)"""
+    return max(int(os.getenv("YOLO_BATCH", "16")), 1)
+
+
+def batch_limit(weights: str) -> int:
+    """
+    Most frames one call may pass to the model loaded for weights
+
+    PyTorch weights and the dynamic TensorRT/ONNX exports take up to
+    max_batch() frames; OpenVINO IR is exported static and pre-exported files
+    have an unknown batch, so both take one frame at a time.
+    """
+    return _BATCH_LIMITS.get(weights, 1)
+
+
+def use_half() -> bool:
+    """FP16 inference on CUDA unless YOLO_HALF=0"""
+    return os.getenv("TORCH_DEVICE", "cpu").startswith("cuda") and (
+        os.getenv("YOLO_HALF", "1") == "1"
+    )
+
+
+def tune_torch_runtime(model: Any) -> None:
+    """
+    Inference settings for a loaded PyTorch YOLO model
+
+    Turns autograd off, enables cuDNN autotuning, folds Conv+BN layers and
+    converts the network to channels_last. On CPU also sets the thread count
+    and matmul precision. YOLO_COMPILE=1 additionally wraps the network in
+    torch.compile on CUDA (PyTorch >= 2.1). Exported engines are left untouched.
+    """
+    try:
+        import torch
+    except ImportError:
+        return
+
+    torch.set_grad_enabled(False)
+    torch.backends.cudnn.benchmark = True
+
+    cuda = os.getenv("TORCH_DEVICE", "cpu").startswith("cuda")
+    if not cuda:
+        torch.set_num_threads(max((os.cpu_count() or 2) // 2, 1))
+        torch.set_float32_matmul_precision("high")
+
+    if not isinstance(getattr(model, "model", None), torch.nn.Module):
+        return
+
+    model.fuse()
+    network = model.model.to(memory_format=torch.channels_last)
+
+    torch_version = tuple(int(v) for v in torch.__version__.split(".")[:2])
+    if os.getenv("YOLO_COMPILE") == "1" and cuda and torch_version >= (2, 1):
+        network = torch.compile(
+            network, mode="reduce-overhead", fullgraph=False, dynamic=False
+        )
+
+    model.model = network
+
+
+def warmup(model: Any, runs: int = 3, **kwargs) -> None:
+    """
+    Run a few blank IMGSZ frames through a freshly loaded model
+
+    Pays for lazy initialization, engine setup, torch.compile and cuDNN
+    autotuning at load time instead of on the first real frame. A network
+    that fails to compile is swapped back to eager mode.
+
+    Args:
+        model: Loaded ultralytics YOLO model
+        runs: Number of forward passes
+        **kwargs: Extra predict arguments matching production calls
+    """
+    dummy = np.zeros((IMGSZ, IMGSZ, 3), dtype=np.uint8)
+    with inference_mode():
+        try:
+            model(dummy, imgsz=IMGSZ, verbose=False, **kwargs)
+        except Exception as e:
+            eager = getattr(getattr(model, "model", None), "_orig_mod", None)
+            if eager is None:
+                raise
+
+            logger.error(f"❌ torch.compile failed, running eager: {e}")
+            model.model = eager
+            model.predictor = None  # Rebuilt around the eager network
+            model(dummy, imgsz=IMGSZ, verbose=False, **kwargs)
+
+        for _ in range(runs - 1):
+            model(dummy, imgsz=IMGSZ, verbose=False, **kwargs)
+
+
+def inference_mode():
+    """torch.inference_mode() when torch is installed, otherwise a no-op"""
+    try:
+        import torch
+    except ImportError:
+        return contextlib.nullcontext()
+
+    return torch.inference_mode()
+
+
+def thread_rng() -> np.random.Generator:
+    """
+    Per-thread numpy Generator for the simulation modes
+
+    Generator draws whole arrays in one call and, unlike the global
+    np.random state, is never shared between camera threads.
+    """
+    rng = getattr(_THREAD_STATE, "rng", None)
+    if rng is None:
+        rng = _THREAD_STATE.rng = np.random.default_rng()
+    return rng
+
+
+def get_model(weights: str, task: str) -> Any:
+    """
+    Process-wide YOLO model for a weights file (loaded once, then shared)
+
+    The first call loads the weights, swaps in an exported engine (TensorRT
+    on CUDA, OpenVINO/ONNX on CPU), tunes the runtime and warms it up; later
+    calls for the same weights return that instance, so the detection
+    engine and the ai_engine bridge hold one copy and one CUDA context.
+
+    Args:
+        weights: Weights path or Ultralytics model name
+        task: Ultralytics task for exported engines ("detect", "pose")
+
+    Returns:
+        Loaded ultralytics YOLO model
+    """
+    with _MODELS_LOCK:
+        model = _MODELS.get(weights)
+        if model is not None:
+            return model
+
+        from ultralytics import YOLO
+
+        model = YOLO(weights)
+        engine_path = export_tensorrt(model, weights) or export_cpu_model(
+            model, weights
+        )
+        if engine_path:
+            model = YOLO(engine_path, task=task)
+        tune_torch_runtime(model)
+        warmup(model, half=use_half())
+
+        static = Path(weights).suffix != ".pt" or (
+            engine_path is not None and engine_path.endswith("_openvino_model")
+        )
+        _BATCH_LIMITS[weights] = 1 if static else max_batch()
+        _MODELS[weights] = model
+        return model
+
+
+def letterbox(tensor: Any, imgsz: int = IMGSZ) -> Tuple[Any, float, int, int]:
+    """
+    Letterbox a (1, 3, H, W) RGB float tensor in [0, 1] on its device
+
+    Resizes to fit imgsz and pads with gray like Ultralytics' LetterBox, so
+    the model sees the same input as for a host-preprocessed frame.
+
+    Args:
+        tensor: Frame tensor (already on the GPU)
+        imgsz: Square model input size
+
+    Returns:
+        (letterboxed (1, 3, imgsz, imgsz) tensor, scale, pad_x, pad_y)
+    """
+    import torch.nn.functional as F
+
+    h, w = tensor.shape[2:]
+    scale = imgsz / max(h, w)
+    new_h, new_w = round(h * scale), round(w * scale)
+    top = round((imgsz - new_h) / 2 - 0.1)
+    left = round((imgsz - new_w) / 2 - 0.1)
+
+    tensor = F.interpolate(tensor, size=(new_h, new_w), mode="bilinear")
+    tensor = F.pad(
+        tensor,
+        (left, imgsz - new_w - left, top, imgsz - new_h - top),
+        value=114 / 255,
+    )
+    return tensor.clamp_(0, 1), scale, left, top  # Keep the FP16 cast in range
+
+
+def upload_frame(frame: np.ndarray) -> Optional[DeviceFrame]:
+    """
+    Letterbox a BGR frame on the GPU once for every model that analyzes it
+
+    The frame is copied through a reused pinned buffer (one per thread), then
+    resized and padded on the device like Ultralytics' LetterBox. Detection
+    and pose both take the result, so a frame is uploaded and preprocessed
+    once instead of once per model.
+
+    Args:
+        frame: Video frame (BGR)
+
+    Returns:
+        DeviceFrame, or None without CUDA (callers keep using the ndarray)
+    """
+    device = os.getenv("TORCH_DEVICE", "cpu")
+    if not device.startswith("cuda") or _cuda_device_name() is None:
+        return None
+
+    import torch
+
+    staging = getattr(_THREAD_STATE, "staging", None)
+    if staging is None or tuple(staging.shape) != frame.shape:
+        staging = torch.empty(frame.shape, dtype=torch.uint8).pin_memory()
+        _THREAD_STATE.staging = staging
+        _THREAD_STATE.uploaded = torch.cuda.Event()
+    else:
+        _THREAD_STATE.uploaded.synchronize()  # Last upload must have finished
+    staging.numpy()[...] = frame
+
+    tensor = staging.to(device, non_blocking=True)
+    _THREAD_STATE.uploaded.record()
+
+    tensor = tensor.permute(2, 0, 1).unsqueeze(0).flip(1).float().div_(255)
+    tensor, scale, left, top = letterbox(tensor)
+
+    return DeviceFrame(tensor, scale, left, top, frame.shape)
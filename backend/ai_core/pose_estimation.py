@@ -4,12 +4,20 @@ Detect worker postures, falls, and ergonomic risks using YOLOv8-Pose
 """
 
 import logging
-import math
-from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 
+from .model_backends import (
+    IMGSZ,
+    DeviceFrame,
+    get_model,
+    inference_mode,
+    thread_rng,
+    use_half,
+)
+
 
 def _get_cv2():
     """Lazy import cv2 to prevent startup crashes"""
@@ -29,6 +37,50 @@ except ImportError:
     YOLO_AVAILABLE = False
 
 
+# COCO pose keypoints, in model output order
+KEYPOINT_NAMES = (
+    "nose",
+    "left_eye",
+    "right_eye",
+    "left_ear",
+    "right_ear",
+    "left_shoulder",
+    "right_shoulder",
+    "left_elbow",
+    "right_elbow",
+    "left_wrist",
+    "right_wrist",
+    "left_hip",
+    "right_hip",
+    "left_knee",
+    "right_knee",
+    "left_ankle",
+    "right_ankle",
+)
+(
+    KP_NOSE,
+    KP_LEYE,
+    KP_REYE,
+    KP_LEAR,
+    KP_REAR,
+    KP_LSHOULDER,
+    KP_RSHOULDER,
+    KP_LELBOW,
+    KP_RELBOW,
+    KP_LWRIST,
+    KP_RWRIST,
+    KP_LHIP,
+    KP_RHIP,
+    KP_LKNEE,
+    KP_RKNEE,
+    KP_LANKLE,
+    KP_RANKLE,
+) = range(len(KEYPOINT_NAMES))
+
+# Keypoints below this confidence are treated as not visible by the risk checks
+KEYPOINT_CONF_THRESHOLD = 0.3
+
+
 class PoseEstimator:
     """
     تقدير وضعية الجسم لكشف السقوط والأوضاع الخطرة
@@ -36,24 +88,28 @@ class PoseEstimator:
     """
 
     # Keypoint indices for COCO pose format
-    KEYPOINTS = {
-        "nose": 0,
-        "left_eye": 1,
-        "right_eye": 2,
-        "left_ear": 3,
-        "right_ear": 4,
-        "left_shoulder": 5,
-        "right_shoulder": 6,
-        "left_elbow": 7,
-        "right_elbow": 8,
-        "left_wrist": 9,
-        "right_wrist": 10,
-        "left_hip": 11,
-        "right_hip": 12,
-        "left_knee": 13,
-        "right_knee": 14,
-        "left_ankle": 15,
-        "right_ankle": 16,
+    KEYPOINTS = {name: idx for idx, name in enumerate(KEYPOINT_NAMES)}
+
+    # Risks in priority order (type, severity, confidence, description);
+    # each person reports only the first one that applies
+    RISK_TABLE = (
+        ("FALL_DETECTED", "CRITICAL", 0.92, "شخص ساقط - يحتاج مساعدة فورية"),
+        ("UNSAFE_LIFTING", "HIGH", 0.85, "وضعية رفع خطرة - خطر على الظهر"),
+        ("WORKING_AT_HEIGHT", "HIGH", 0.78, "عمل على ارتفاع - تأكد من معدات الحماية"),
+        ("AWKWARD_POSTURE", "MEDIUM", 0.73, "وضعية غير صحية - خطر إصابة متكررة"),
+    )
+
+    # Simulation mode skeleton: (dx, dy, confidence) from the hip center
+    SIM_KEYPOINTS = {
+        "nose": (0, -150, 0.9),
+        "left_shoulder": (-30, -100, 0.88),
+        "right_shoulder": (30, -100, 0.87),
+        "left_hip": (-25, 0, 0.85),
+        "right_hip": (25, 0, 0.86),
+        "left_knee": (-25, 50, 0.82),
+        "right_knee": (25, 50, 0.83),
+        "left_ankle": (-25, 100, 0.80),
+        "right_ankle": (25, 100, 0.81),
     }
 
     def __init__(self, model_path: str = "yolov8n-pose.pt"):
@@ -65,6 +121,7 @@ class PoseEstimator:
         """
         self.model_path = model_path
         self.model = None
+        self.half = use_half()  # FP16 forward pass on CUDA
         self.logger = logging.getLogger(__name__)
 
         # Load model
@@ -78,7 +135,7 @@ class PoseEstimator:
                 return False
 
             self.logger.info(f"Loading pose model: {self.model_path}")
-            self.model = YOLO(self.model_path)
+            self.model = get_model(self.model_path, task="pose")
             self.logger.info("✅ Pose model loaded successfully")
             return True
 
@@ -86,12 +143,13 @@ class PoseEstimator:
             self.logger.error(f"❌ Failed to load pose model: {e}")
             return False
 
-    def estimate_pose(self, image: np.ndarray) -> Dict[str, Any]:
+    def estimate_pose(self, image: Union[np.ndarray, DeviceFrame]) -> Dict[str, Any]:
         """
         Estimate human poses in image
 
         Args:
-            image: Input image (BGR)
+            image: Input image (BGR), or a frame already letterboxed on the GPU
+                by upload_frame
 
         Returns:
             Pose estimation results
@@ -101,52 +159,67 @@ class PoseEstimator:
 
         try:
             # Run pose estimation
-            results = self.model(image, verbose=False)
+            source = image.tensor if isinstance(image, DeviceFrame) else image
+            with inference_mode():
+                results = self.model(source, imgsz=IMGSZ, half=self.half, verbose=False)
 
             # Parse results
-            poses = self._parse_poses(results[0])
+            poses = self._parse_poses(results[0], image)
 
             # Analyze poses for risks
             analysis = self._analyze_poses(poses)
 
             return {
-                "poses": poses,
+                "poses": [self._pose_to_dict(pose) for pose in poses],
                 "analysis": analysis,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp_ns": time.time_ns(),
             }
 
         except Exception as e:
             self.logger.error(f"Pose estimation error: {e}")
             return self._simulate_pose(image)
 
-    def _parse_poses(self, result) -> List[Dict[str, Any]]:
-        """Parse pose estimation results"""
+    def _parse_poses(self, result, image: Any = None) -> List[Dict[str, Any]]:
+        """
+        Parse pose estimation results (mapped back onto the original frame
+        when the model ran on a DeviceFrame)
+
+        Returns:
+            One entry per person: {"xy": (17, 2), "conf": (17,), "avg_confidence"}
+        """
         poses = []
 
         if result.keypoints is None or len(result.keypoints) == 0:
             return poses
 
-        # Extract keypoints
-        keypoints_data = result.keypoints.xy.cpu().numpy()  # (N, 17, 2)
-        confidences = result.keypoints.conf.cpu().numpy()  # (N, 17)
+        # One device->host copy of (N, 17, 3) [x, y, conf], then split on the host
+        data = np.asarray(result.keypoints.data.cpu().numpy())
+        keypoints_data = data[..., :2]  # (N, 17, 2)
+        if isinstance(image, DeviceFrame):
+            keypoints_data = image.unletterbox(keypoints_data)
+        confidences = data[..., 2]  # (N, 17)
 
         for kpts, confs in zip(keypoints_data, confidences):
-            # Build keypoint dictionary
-            keypoints = {}
-            for name, idx in self.KEYPOINTS.items():
-                if idx < len(kpts):
-                    keypoints[name] = {
-                        "x": float(kpts[idx][0]),
-                        "y": float(kpts[idx][1]),
-                        "confidence": float(confs[idx]),
-                    }
-
             poses.append(
-                {"keypoints": keypoints, "avg_confidence": float(np.mean(confs))}
+                {
+                    "xy": kpts.astype(np.float32, copy=False),
+                    "conf": confs.astype(np.float32, copy=False),
+                    "avg_confidence": float(confs.mean()),
+                }
             )
 
         return poses
 
+    def _pose_to_dict(self, pose: Dict[str, Any]) -> Dict[str, Any]:
+        """Named keypoint dictionary for the API response"""
+        keypoints = {
+            name: {"x": x, "y": y, "confidence": conf}
+            for name, (x, y), conf in zip(
+                KEYPOINT_NAMES, pose["xy"].tolist(), pose["conf"].tolist()
+            )
+        }
+        return {"keypoints": keypoints, "avg_confidence": pose["avg_confidence"]}
+
     def _analyze_poses(self, poses: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Analyze poses for safety risks
@@ -157,57 +230,37 @@ class PoseEstimator:
         - Working at height
         - Awkward postures
         """
-        risks = []
         total_people = len(poses)
+        risks = []
 
-        for i, pose_data in enumerate(poses):
-            pose = pose_data["keypoints"]
-
-            # Check for fall
-            if self._is_fallen(pose):
-                risks.append(
-                    {
-                        "person_id": i,
-                        "type": "FALL_DETECTED",
-                        "severity": "CRITICAL",
-                        "confidence": 0.92,
-                        "description": "شخص ساقط - يحتاج مساعدة فورية",
-                    }
-                )
-
-            # Check for risky bending
-            elif self._is_risky_bending(pose):
-                risks.append(
-                    {
-                        "person_id": i,
-                        "type": "UNSAFE_LIFTING",
-                        "severity": "HIGH",
-                        "confidence": 0.85,
-                        "description": "وضعية رفع خطرة - خطر على الظهر",
-                    }
-                )
-
-            # Check for working at height
-            elif self._is_at_height(pose):
-                risks.append(
-                    {
-                        "person_id": i,
-                        "type": "WORKING_AT_HEIGHT",
-                        "severity": "HIGH",
-                        "confidence": 0.78,
-                        "description": "عمل على ارتفاع - تأكد من معدات الحماية",
-                    }
-                )
+        if total_people:
+            # All people at once: (N, 17, 2) positions, (N, 17) visibility
+            xy = np.stack([pose["xy"] for pose in poses]).astype(np.float64)
+            has = np.stack([pose["conf"] for pose in poses]) > KEYPOINT_CONF_THRESHOLD
+
+            # Index of the first matching risk per person (-1 = safe)
+            risk_index = np.select(
+                [
+                    self._is_fallen(xy, has),
+                    self._is_risky_bending(xy, has),
+                    self._is_at_height(xy, has),
+                    self._is_awkward_posture(xy, has),
+                ],
+                [0, 1, 2, 3],
+                default=-1,
+            )
 
-            # Check for awkward posture
-            elif self._is_awkward_posture(pose):
+            for i in np.flatnonzero(risk_index >= 0).tolist():
+                risk_type, severity, confidence, description = self.RISK_TABLE[
+                    risk_index[i]
+                ]
                 risks.append(
                     {
                         "person_id": i,
-                        "type": "AWKWARD_POSTURE",
-                        "severity": "MEDIUM",
-                        "confidence": 0.73,
-                        "description": "وضعية غير صحية - خطر إصابة متكررة",
+                        "type": risk_type,
+                        "severity": severity,
+                        "confidence": confidence,
+                        "description": description,
                     }
                 )
 
@@ -218,159 +271,91 @@ class PoseEstimator:
             "safe_count": total_people - len(risks),
         }
 
-    def _is_fallen(self, pose: Dict[str, Any]) -> bool:
-        """Detect if person has fallen"""
-        try:
-            # Check if person is horizontal (shoulders and hips at similar height)
-            if "left_shoulder" not in pose or "left_hip" not in pose:
-                return False
-
-            shoulder_y = pose["left_shoulder"]["y"]
-            hip_y = pose["left_hip"]["y"]
-
-            # If shoulders and hips are close in Y-axis, person might be horizontal
-            vertical_diff = abs(shoulder_y - hip_y)
-
-            # Also check head position
-            if "nose" in pose:
-                nose_y = pose["nose"]["y"]
-                # If head is below hips, likely fallen
-                if nose_y > hip_y and vertical_diff < 50:
-                    return True
-
-            return vertical_diff < 30  # Very small vertical difference = horizontal
-
-        except:
-            return False
-
-    def _is_risky_bending(self, pose: Dict[str, Any]) -> bool:
-        """Detect risky bending posture"""
-        try:
-            if "nose" not in pose or "left_hip" not in pose:
-                return False
-
-            # Calculate angle between torso and vertical
-            nose = pose["nose"]
-            hip = pose["left_hip"]
-
-            # If nose is significantly forward of hips, person is bending
-            horizontal_diff = abs(nose["x"] - hip["x"])
-            vertical_diff = abs(nose["y"] - hip["y"])
-
-            if vertical_diff > 0:
-                angle = math.degrees(math.atan(horizontal_diff / vertical_diff))
-                # Bending more than 45 degrees is risky
-                return angle > 45
-
-            return False
-
-        except:
-            return False
-
-    def _is_at_height(self, pose: Dict[str, Any]) -> bool:
-        """Detect if person is working at height"""
-        try:
-            # Simple heuristic: if feet are in upper portion of image
-            if "left_ankle" not in pose:
-                return False
-
-            ankle_y = pose["left_ankle"]["y"]
-
-            # Assuming image height is available, check if person is high up
-            # This is simplified - real implementation would need depth info
-            return ankle_y < 200  # Upper part of frame
-
-        except:
-            return False
-
-    def _is_awkward_posture(self, pose: Dict[str, Any]) -> bool:
-        """Detect awkward/uncomfortable posture"""
-        try:
-            # Check arm angles
-            if all(k in pose for k in ["left_shoulder", "left_elbow", "left_wrist"]):
-                shoulder = pose["left_shoulder"]
-                elbow = pose["left_elbow"]
-                wrist = pose["left_wrist"]
-
-                # Calculate elbow angle
-                angle = self._calculate_angle(shoulder, elbow, wrist)
-
-                # Very bent (< 60°) or very extended (> 160°) is awkward
-                if angle < 60 or angle > 160:
-                    return True
-
-            return False
-
-        except:
-            return False
-
-    def _calculate_angle(self, p1: Dict, p2: Dict, p3: Dict) -> float:
-        """Calculate angle between three points"""
-        try:
-            # Vector from p2 to p1
-            v1 = (p1["x"] - p2["x"], p1["y"] - p2["y"])
-            # Vector from p2 to p3
-            v2 = (p3["x"] - p2["x"], p3["y"] - p2["y"])
-
-            # Calculate angle
-            dot = v1[0] * v2[0] + v1[1] * v2[1]
-            mag1 = math.sqrt(v1[0] ** 2 + v1[1] ** 2)
-            mag2 = math.sqrt(v2[0] ** 2 + v2[1] ** 2)
-
-            if mag1 * mag2 == 0:
-                return 0
-
-            cos_angle = dot / (mag1 * mag2)
-            cos_angle = max(-1, min(1, cos_angle))  # Clamp to [-1, 1]
-
-            angle = math.degrees(math.acos(cos_angle))
-            return angle
-
-        except:
-            return 90  # Default to neutral angle
+    def _is_fallen(self, xy: np.ndarray, has: np.ndarray) -> np.ndarray:
+        """Detect fallen people in an (N, 17, 2) keypoint stack"""
+        # Check if person is horizontal (shoulders and hips at similar height)
+        shoulder_y = xy[:, KP_LSHOULDER, 1]
+        hip_y = xy[:, KP_LHIP, 1]
+        nose_y = xy[:, KP_NOSE, 1]
+
+        # If shoulders and hips are close in Y-axis, person might be horizontal
+        vertical_diff = np.abs(shoulder_y - hip_y)
+
+        # Head below hips, or a very small vertical difference = horizontal
+        head_down = has[:, KP_NOSE] & (nose_y > hip_y) & (vertical_diff < 50)
+        fallen = head_down | (vertical_diff < 30)
+        return fallen & has[:, KP_LSHOULDER] & has[:, KP_LHIP]
+
+    def _is_risky_bending(self, xy: np.ndarray, has: np.ndarray) -> np.ndarray:
+        """Detect risky bending posture in an (N, 17, 2) keypoint stack"""
+        nose = xy[:, KP_NOSE]
+        hip = xy[:, KP_LHIP]
+
+        # If nose is significantly forward of hips, person is bending
+        horizontal_diff = np.abs(nose[:, 0] - hip[:, 0])
+        vertical_diff = np.abs(nose[:, 1] - hip[:, 1])
+
+        # Angle between torso and vertical; more than 45 degrees is risky
+        angle = np.degrees(np.arctan2(horizontal_diff, vertical_diff))
+        visible = has[:, KP_NOSE] & has[:, KP_LHIP]
+        return visible & (vertical_diff > 0) & (angle > 45)
+
+    def _is_at_height(self, xy: np.ndarray, has: np.ndarray) -> np.ndarray:
+        """Detect people working at height in an (N, 17, 2) keypoint stack"""
+        # Simple heuristic: feet in the upper part of the frame
+        # This is simplified - real implementation would need depth info
+        return has[:, KP_LANKLE] & (xy[:, KP_LANKLE, 1] < 200)
+
+    def _is_awkward_posture(self, xy: np.ndarray, has: np.ndarray) -> np.ndarray:
+        """Detect awkward arm posture in an (N, 17, 2) keypoint stack"""
+        angle = self._calculate_angle(
+            xy[:, KP_LSHOULDER],
+            xy[:, KP_LELBOW],
+            xy[:, KP_LWRIST],
+        )
+
+        # Very bent (< 60°) or very extended (> 160°) is awkward
+        visible = has[:, [KP_LSHOULDER, KP_LELBOW, KP_LWRIST]].all(axis=1)
+        return visible & ((angle < 60) | (angle > 160))
+
+    def _calculate_angle(
+        self, p1: np.ndarray, p2: np.ndarray, p3: np.ndarray
+    ) -> np.ndarray:
+        """Angle at p2 in degrees for (N, 2) point arrays (0 if degenerate)"""
+        # Vectors from p2 to p1 and p3
+        v1 = p1 - p2
+        v2 = p3 - p2
+
+        # atan2(|v1 x v2|, v1 . v2) needs no magnitudes or clamping and is
+        # already 0 for a zero-length vector
+        cross = v1[:, 0] * v2[:, 1] - v1[:, 1] * v2[:, 0]
+        dot = np.einsum("ij,ij->i", v1, v2)
+        return np.degrees(np.arctan2(np.abs(cross), dot))
 
     def _simulate_pose(self, image: np.ndarray) -> Dict[str, Any]:
         """Simulate pose estimation when model not available"""
         height, width = image.shape[:2]
 
-        # Simulate 2-3 people
-        num_people = np.random.randint(2, 4)
-        poses = []
+        rng = thread_rng()
 
-        for i in range(num_people):
-            # Generate random pose
-            base_x = np.random.randint(100, width - 100)
-            base_y = np.random.randint(200, height - 100)
-
-            keypoints = {
-                "nose": {"x": base_x, "y": base_y - 150, "confidence": 0.9},
-                "left_shoulder": {
-                    "x": base_x - 30,
-                    "y": base_y - 100,
-                    "confidence": 0.88,
-                },
-                "right_shoulder": {
-                    "x": base_x + 30,
-                    "y": base_y - 100,
-                    "confidence": 0.87,
-                },
-                "left_hip": {"x": base_x - 25, "y": base_y, "confidence": 0.85},
-                "right_hip": {"x": base_x + 25, "y": base_y, "confidence": 0.86},
-                "left_knee": {"x": base_x - 25, "y": base_y + 50, "confidence": 0.82},
-                "right_knee": {"x": base_x + 25, "y": base_y + 50, "confidence": 0.83},
-                "left_ankle": {"x": base_x - 25, "y": base_y + 100, "confidence": 0.80},
-                "right_ankle": {
-                    "x": base_x + 25,
-                    "y": base_y + 100,
-                    "confidence": 0.81,
+        # Simulate 2-3 people, one random anchor (hip center) each
+        num_people = int(rng.integers(2, 4))
+        bases = rng.integers((100, 200), (width - 100, height - 100), (num_people, 2))
+
+        poses = [
+            {
+                "keypoints": {
+                    name: {"x": base_x + dx, "y": base_y + dy, "confidence": conf}
+                    for name, (dx, dy, conf) in self.SIM_KEYPOINTS.items()
                 },
+                "avg_confidence": 0.85,
             }
-
-            poses.append({"keypoints": keypoints, "avg_confidence": 0.85})
+            for base_x, base_y in bases.tolist()
+        ]
 
         # Simulate some risks
         risks = []
-        if np.random.random() > 0.7:
+        if rng.random() > 0.7:
             risks.append(
                 {
                     "person_id": 0,
@@ -389,7 +374,7 @@ class PoseEstimator:
                 "risks": risks,
                 "safe_count": num_people - len(risks),
             },
-            "timestamp": datetime.now().isoformat(),
+            "timestamp_ns": time.time_ns(),
             "simulation_mode": True,
         }
 
@@ -6,18 +6,37 @@ If ultralytics is not installed, returns mock detections.
 
 from __future__ import annotations
 
+import base64
 import os
 import time
 from threading import Lock
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    import numpy as np
+    import torch
 
 _MODEL = None
 _MODEL_LOCK = Lock()
+_DEVICE = "cpu"
+_HALF = False  # FP16 forward pass (CUDA only, YOLO_HALF=0 disables)
+
+_IMGSZ = 640
+_TS_CACHE = (-1, "")  # (epoch second, formatted UTC timestamp)
+
+
+def _backends():
+    """ai_core.model_backends, imported on first use (ai_core is heavy)."""
+    try:
+        from ai_core import model_backends
+    except ImportError:
+        from backend.ai_core import model_backends
+    return model_backends
 
 
 def _load_yolo() -> Optional[Any]:
     """Attempt to load ultralytics YOLO model."""
-    global _MODEL
+    global _MODEL, _DEVICE, _HALF
     try:
         from ultralytics import YOLO
     except Exception:
@@ -25,11 +44,14 @@ def _load_yolo() -> Optional[Any]:
 
     model_name = os.getenv("YOLO_MODEL", "yolov8n.pt")
     device = os.getenv("TORCH_DEVICE", "cpu")
+    _DEVICE = device
+    _HALF = device.startswith("cuda") and os.getenv("YOLO_HALF", "1") == "1"
 
     with _MODEL_LOCK:
         if _MODEL is None:
             try:
-                _MODEL = YOLO(model_name)
+                # Same instance as YOLOEngine when both use these weights
+                _MODEL = _backends().get_model(model_name, task="detect")
                 try:
                     _MODEL.to(device)
                 except Exception:
@@ -81,9 +103,56 @@ def _boxes_from_result(r) -> List[Dict[str, Any]]:
     return objs
 
 
-def detect_frame(frame_bytes: bytes, conf_thresh: float = 0.25) -> Dict[str, Any]:
-    """Run detection on raw image bytes."""
-    ts = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+def _decode(frame_bytes: bytes):
+    """Decode encoded image bytes to a BGR ndarray once, with OpenCV."""
+    import cv2
+    import numpy as np
+
+    img = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("could not decode image bytes")
+    return img
+
+
+def _timestamp() -> str:
+    """UTC ISO timestamp, formatted at most once per second."""
+    global _TS_CACHE
+    second = time.time_ns() // 1_000_000_000
+    if second != _TS_CACHE[0]:
+        _TS_CACHE = (second, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(second)))
+    return _TS_CACHE[1]
+
+
+def _to_source(frame: Any) -> Tuple[Any, Optional[Any]]:
+    """Model input for a frame, plus the DeviceFrame to map boxes back with.
+
+    Encoded bytes are decoded once with OpenCV; BGR ndarrays are used as-is.
+    Anything else is taken to be a torch tensor already letterboxed on the
+    device, (1, 3, 640, 640) RGB float in [0, 1], and is passed straight
+    through. On CUDA, ndarray frames are letterboxed on the device by
+    model_backends.upload_frame.
+    """
+    import numpy as np
+
+    if isinstance(frame, (bytes, bytearray, memoryview)):
+        img = _decode(frame)
+    elif isinstance(frame, np.ndarray):
+        img = frame
+    else:
+        return frame, None
+
+    if _DEVICE.startswith("cuda"):
+        device_frame = _backends().upload_frame(img)
+        if device_frame is not None:
+            return device_frame.tensor, device_frame
+    return img, None
+
+
+def detect_frame(
+    frame: Union[bytes, np.ndarray, torch.Tensor], conf_thresh: float = 0.25
+) -> Dict[str, Any]:
+    """Run detection on encoded image bytes, a BGR ndarray or a device tensor."""
+    ts = _timestamp()
 
     model = _load_yolo()
     if model is None:
@@ -102,11 +171,27 @@ def detect_frame(frame_bytes: bytes, conf_thresh: float = 0.25) -> Dict[str, Any
         }
 
     try:
-        results = model.predict(source=frame_bytes, conf=conf_thresh, imgsz=640)
+        source, device_frame = _to_source(frame)
+
+        with _backends().inference_mode():
+            results = model.predict(
+                source=source, conf=conf_thresh, imgsz=_IMGSZ, half=_HALF
+            )
         all_objs: List[Dict[str, Any]] = []
         for r in results:
             objs = _boxes_from_result(r)
             all_objs.extend(objs)
+
+        # Device-letterboxed frames come back in letterbox coordinates
+        if device_frame is not None and all_objs:
+            import numpy as np
+
+            boxes = device_frame.unletterbox(
+                np.array([o["bbox"] for o in all_objs], dtype=np.float32)
+            )
+            for o, box in zip(all_objs, boxes.tolist()):
+                o["bbox"] = box
+                o["box"] = list(box)
         return {
             "model": getattr(model, "model", "yolov8"),
             "timestamp": ts,
@@ -120,3 +205,74 @@ def detect_frame(frame_bytes: bytes, conf_thresh: float = 0.25) -> Dict[str, Any
             "objects": [],
             "raw": {"error": str(e)},
         }
+
+
+def _annotate(img: np.ndarray, objs: List[Dict[str, Any]]) -> Optional[bytes]:
+    """Draw boxes and labels on a BGR frame; quality-80 JPEG bytes or None."""
+    import cv2
+
+    for o in objs:
+        x1, y1, x2, y2 = (int(v) for v in o["bbox"])
+        label = f"{o.get('class', 'obj')} {o.get('confidence', 0.0):.2f}"
+        if o.get("track_id") is not None:
+            label += f" id:{o['track_id']}"
+        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(
+            img,
+            label,
+            (x1, max(10, y1 - 5)),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            (255, 255, 255),
+            1,
+        )
+
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return buf.tobytes() if ok else None
+
+
+def detect_frame_enhanced(
+    frame_bytes: bytes,
+    conf_thresh: float = 0.25,
+    tracked: bool = False,
+    annotate: bool = False,
+    camera_id: Optional[str] = None,
+    annotate_format: str = "b64",
+) -> Dict[str, Any]:
+    """`detect_frame` plus optional tracking and an annotated JPEG.
+
+    With `annotate`, the frame is decoded once for both detection and
+    drawing, and `raw` gets `annotated_b64`, or the JPEG bytes themselves
+    as `annotated_jpeg` when `annotate_format="jpeg"`.
+    """
+    img = None
+    if annotate:
+        try:
+            img = _decode(frame_bytes)
+        except Exception:
+            # Undecodable: detect_frame reports the error, nothing to draw on
+            pass
+
+    base = detect_frame(frame_bytes if img is None else img, conf_thresh)
+    objs = base["objects"]
+
+    if tracked:
+        try:
+            try:
+                from tracking import update
+            except ImportError:
+                from backend.tracking import update
+
+            objs = update(camera_id or "_local", objs)
+        except Exception:
+            pass
+
+    out = {**base, "objects": objs}
+    jpeg = _annotate(img, objs) if img is not None else None
+    if jpeg:
+        if annotate_format == "jpeg":
+            extra = {"annotated_jpeg": jpeg}
+        else:
+            extra = {"annotated_b64": base64.b64encode(jpeg).decode()}
+        out["raw"] = {**(base["raw"] or {}), **extra}
+    return out
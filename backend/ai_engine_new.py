@@ -7,18 +7,195 @@ the rest of the app continues working.
 
 from __future__ import annotations
 
+import base64
 import os
+import queue
 import time
-from threading import Lock
-from typing import Any, Dict, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+try:
+    import cv2
+except Exception:  # no OpenCV: host decode and annotation are unavailable
+    cv2 = None
+
+try:
+    from tracking import update as _track_update
+except Exception:
+    _track_update = None
 
 _MODEL = None
 _MODEL_LOCK = Lock()
+_HALF = False  # FP16 forward pass (CUDA only)
+_DEVICE = "cpu"
+_GPU_DECODE = False  # JPEGs decoded on the GPU with torchvision (nvJPEG)
+_LEGACY_BOX = os.getenv("YOLO_LEGACY_BOX") == "1"  # also emit "box" per object
+_MODEL_NAMES: Dict[int, str] = {}  # class id -> name, read once from the model
+# Frames per predict call and TensorRT export profile (YOLO_MAX_BATCH)
+_MAX_BATCH = max(1, int(os.getenv("YOLO_MAX_BATCH", "8")))
+_BATCH_LIMIT = 1  # Most frames the loaded weights take per call
+_NO_BOXES = np.empty((0, 6), dtype=np.float32)
+_NO_CLS = np.empty(0, dtype=int)
+
+
+def _snap_imgsz(size: int) -> int:
+    """Round an input size up to the YOLO stride (multiple of 32)."""
+    return max(32, (size + 31) // 32 * 32)
+
+
+# Model input size: smaller inputs trade small-object recall for much lower
+# latency, so CPU deployments default to 320 (YOLO_IMGSZ overrides)
+_IMGSZ = _snap_imgsz(
+    int(
+        os.getenv(
+            "YOLO_IMGSZ", "320" if os.getenv("TORCH_DEVICE", "cpu") == "cpu" else "640"
+        )
+    )
+)
+_BATCHER: Optional[BatchedPredictor] = None
+_TS_CACHE = (-1, "")  # (epoch second, formatted UTC timestamp)
+# Decode/draw/encode of annotated frames, kept off the detection thread
+_ENCODE_POOL = ThreadPoolExecutor(
+    max_workers=max(1, (os.cpu_count() or 2) // 2), thread_name_prefix="annotate"
+)
+
+
+class BatchedPredictor:
+    """Coalesces concurrent detect_frame calls into batched predict calls.
+
+    One consumer thread drains the queue until max_batch frames are
+    waiting or MAX_WAIT_MS has passed since the first one, runs a single
+    predict per confidence threshold (and input kind) and resolves each
+    caller's future.
+    """
+
+    def __init__(self, model: Any, max_batch: int, max_wait_ms: float):
+        self._model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._requests: queue.Queue = queue.Queue()
+        Thread(target=self._loop, name="yolo-batcher", daemon=True).start()
+
+    def submit(self, img: Any, conf: float, imgsz: int = _IMGSZ) -> Future:
+        """Queue a decoded frame; the future resolves to its predict result."""
+        future: Future = Future()
+        self._requests.put((img, conf, imgsz, future))
+        return future
+
+    def _loop(self) -> None:
+        while True:
+            # Batch state lives in _run's frame only, so the previous batch's
+            # inputs and Results (CUDA tensors) are not pinned while idle
+            self._run(self._collect())
+
+    def _collect(self) -> List[Tuple[Any, float, int, Future]]:
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, batch: List[Tuple[Any, float, int, Future]]) -> None:
+        # One predict per (threshold, input size, ndarray vs GPU tensor) group
+        groups: Dict[Tuple[float, int, bool], List[Any]] = {}
+        for img, conf, imgsz, future in batch:
+            key = (conf, imgsz, hasattr(img, "dim"))
+            groups.setdefault(key, []).append((img, future))
+
+        for (conf, imgsz, _), requests in groups.items():
+            try:
+                results = self._model.predict(
+                    source=_batch_source([img for img, _ in requests]),
+                    conf=conf,
+                    imgsz=imgsz,
+                    half=_HALF,
+                    verbose=False,
+                )
+            except Exception as e:
+                _release_cuda_cache(e)
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(requests, results):
+                future.set_result(result)
+
+
+def _batched_engine_path(weights: Path) -> Path:
+    """Where AUTO_EXPORT caches the dynamic engine built for _MAX_BATCH."""
+    return weights.with_name(f"{weights.stem}_b{_MAX_BATCH}.engine")
+
+
+def _export_engine(model_name: str, precision: str) -> Optional[str]:
+    """Export a dynamic TensorRT engine next to the .pt weights (AUTO_EXPORT=1)."""
+    from ultralytics import YOLO
+
+    try:
+        exported = YOLO(model_name).export(
+            format="engine",
+            half=precision == "fp16",
+            int8=precision == "int8",
+            simplify=True,
+            imgsz=_IMGSZ,
+            dynamic=True,
+            batch=_MAX_BATCH,
+            device=0,
+        )
+        engine_path = _batched_engine_path(Path(model_name))
+        Path(exported).replace(engine_path)
+        return str(engine_path)
+    except Exception:
+        return None
+
+
+def _resolve_weights(model_name: str, device: str) -> Tuple[str, int]:
+    """Fastest available weights and the most frames they take per call.
+
+    YOLO_ENGINE points at an engine/ONNX file explicitly; otherwise files
+    named like the .pt are probed: the dynamic engine AUTO_EXPORT built for
+    YOLO_MAX_BATCH, then a plain engine, then ONNX. Files not exported here
+    may have a static batch, so they run one frame per call. With
+    AUTO_EXPORT=1 on CUDA a missing engine is exported once (precision from
+    YOLO_PRECISION: fp16, int8 or fp32) and reused on later starts.
+    """
+    explicit = os.getenv("YOLO_ENGINE")
+    if explicit and Path(explicit).exists():
+        return explicit, 1
+
+    weights = Path(model_name)
+    cuda = device.startswith("cuda")
+    if cuda and _batched_engine_path(weights).exists():
+        return str(_batched_engine_path(weights)), _MAX_BATCH
+
+    candidates = [weights.with_suffix(".engine")] if cuda else []
+    candidates.append(weights.with_suffix(".onnx"))
+    for candidate in candidates:
+        if candidate.exists():
+            return str(candidate), 1
+
+    if cuda and weights.suffix == ".pt" and os.getenv("AUTO_EXPORT") == "1":
+        precision = os.getenv("YOLO_PRECISION", "fp16")
+        exported = _export_engine(model_name, precision)
+        if exported:
+            return exported, _MAX_BATCH
+
+    return model_name, _MAX_BATCH
 
 
 def _load_yolo() -> Optional[Any]:
     """Attempt to load ultralytics YOLO model. Returns model or None."""
-    global _MODEL
+    global _MODEL, _HALF, _DEVICE, _GPU_DECODE, _BATCHER, _MODEL_NAMES, _BATCH_LIMIT
+    if _MODEL is not None:
+        return _MODEL
     try:
         from ultralytics import YOLO
     except Exception:
@@ -28,76 +205,199 @@ def _load_yolo() -> Optional[Any]:
     device = os.getenv("TORCH_DEVICE", "cpu")
 
     with _MODEL_LOCK:
-        if _MODEL is None:
-            try:
-                _MODEL = YOLO(model_name)
+        if _MODEL is not None:
+            return _MODEL
+        try:
+            weights, _BATCH_LIMIT = _resolve_weights(model_name, device)
+            if weights.endswith(".pt"):
+                model = YOLO(weights)
                 try:
-                    _MODEL.to(device)
+                    model.to(device)
                 except Exception:
                     # device move best-effort
                     pass
-            except Exception:
-                _MODEL = None
+            else:
+                model = YOLO(weights, task="detect")
+            _HALF = device.startswith("cuda")
+            _DEVICE = device
+            _GPU_DECODE = _HALF and _torchvision_gpu_decode()
+        except Exception:
+            return None
+
+        # Warm up and start the batcher before publishing the model: the
+        # unlocked fast path above hands _MODEL out as soon as it is set.
+        max_batch = _BATCH_LIMIT
+        _warmup(model, max_batch)
+        try:
+            names = model.names
+            _MODEL_NAMES = names if isinstance(names, dict) else {}
+        except Exception:
+            # exported backends may only know names per result
+            pass
+        if max_batch > 1:
+            max_wait_ms = float(os.getenv("MAX_WAIT_MS", "10"))
+            _BATCHER = BatchedPredictor(model, max_batch, max_wait_ms)
+        _MODEL = model
     return _MODEL
 
 
+def _warmup(model: Any, max_batch: int) -> None:
+    """Blank _IMGSZ-square predicts at each batch size the batcher can form.
+
+    The first inference pays for CUDA context setup, kernel selection and
+    TensorRT profile loading; doing it here keeps that off the first request.
+    """
+    blank = np.zeros((_IMGSZ, _IMGSZ, 3), dtype=np.uint8)
+    for size in sorted({1, 2, 4, max_batch}):
+        if size > max_batch:
+            continue
+        try:
+            model.predict(
+                source=[blank] * size, imgsz=_IMGSZ, half=_HALF, verbose=False
+            )
+        except Exception:
+            # warm-up is best-effort
+            return
+
+
 def init_model() -> Optional[Any]:
     """Public initializer to load model at app startup (idempotent)."""
     return _load_yolo()
 
 
-def _boxes_from_result(r) -> List[Dict[str, Any]]:
-    objs: List[Dict[str, Any]] = []
-    boxes = getattr(r, "boxes", None)
-    if boxes is None:
-        return objs
+def _result_arrays(results: List[Any]) -> Tuple[Any, Any, Any, Dict[int, str]]:
+    """Boxes (N, 4), confidences (N,) and class ids (N,) over all results."""
+    rows = []
+    for r in results:
+        boxes = getattr(r, "boxes", None)
+        if boxes is not None and len(boxes):
+            # One device->host copy of [x1, y1, x2, y2, (track id,) conf, cls]
+            data = boxes.data.cpu().numpy()
+            rows.append(np.column_stack([data[:, :4], data[:, -2:]]))
+
+    if not rows:
+        # Idle frame: no copies, concatenation or class names needed
+        return _NO_BOXES[:, :4], _NO_BOXES[:, 4], _NO_CLS, {}
+
+    data = np.concatenate(rows) if len(rows) > 1 else rows[0]
+    data = data.astype(np.float32, copy=False)
+    names = _MODEL_NAMES or next(
+        (r.names for r in results if isinstance(getattr(r, "names", None), dict)), {}
+    )
+    return data[:, :4], data[:, 4], data[:, 5].astype(int), names
+
+
+def _objects(xyxy, conf, cls, names: Dict[int, str]) -> List[Dict[str, Any]]:
+    """One {class, confidence, bbox} dict per detection (plus "box" if legacy)."""
+    objs = [
+        {"class": names.get(c, str(c)), "confidence": cf, "bbox": bb}
+        for bb, cf, c in zip(xyxy.tolist(), conf.tolist(), cls.tolist())
+    ]
+    if _LEGACY_BOX:
+        for o in objs:
+            o["box"] = o["bbox"]
+    return objs
 
-    # Try to get class names mapping if available
-    names = getattr(r, "names", None)
 
-    for b in boxes:
-        try:
-            xyxy = getattr(b, "xyxy", None)
-            conf = float(getattr(b, "conf", 0.0))
-            cls = int(getattr(b, "cls", -1))
+def _release_cuda_cache(error: Exception) -> None:
+    """After a CUDA out-of-memory error, hand cached blocks back to the driver."""
+    if "out of memory" not in str(error).lower():
+        return
+    try:
+        import torch
 
-            if xyxy is not None:
-                # xyxy may be tensor-like
-                try:
-                    coords = [float(v) for v in xyxy.tolist()]
-                except Exception:
-                    coords = [float(v) for v in xyxy]
-                x1, y1, x2, y2 = coords
-            else:
-                x1 = y1 = x2 = y2 = 0.0
+        torch.cuda.empty_cache()
+    except Exception:
+        pass
 
-            label = None
-            if isinstance(names, dict):
-                label = names.get(cls)
-            if label is None:
-                label = str(cls)
 
-            objs.append(
-                {
-                    "class": label,
-                    "confidence": conf,
-                    "bbox": [x1, y1, x2, y2],
-                    "box": [x1, y1, x2, y2],
-                }
-            )
-        except Exception:
-            continue
+def _timestamp() -> str:
+    """UTC ISO timestamp, formatted at most once per second."""
+    global _TS_CACHE
+    second = time.time_ns() // 1_000_000_000
+    if second != _TS_CACHE[0]:
+        _TS_CACHE = (second, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(second)))
+    return _TS_CACHE[1]
 
-    return objs
 
+def _torchvision_gpu_decode() -> bool:
+    """True when torchvision can decode JPEGs on the CUDA device."""
+    try:
+        import torch
+        from torchvision.io import decode_jpeg  # noqa: F401
+    except Exception:
+        return False
+    return torch.cuda.is_available()
+
+
+def _decode_frame(
+    frame: Union[bytes, np.ndarray], imgsz: int = _IMGSZ
+) -> Tuple[Any, Optional[Tuple[float, int, int]]]:
+    """Decode encoded image bytes once per frame (BGR ndarrays pass through).
+
+    On CUDA, JPEGs are decoded on the GPU and letterboxed there into a
+    (1, 3, imgsz, imgsz) RGB float tensor, so only the compressed bytes cross
+    PCIe. Anything else is decoded to a BGR ndarray with OpenCV.
+
+    Returns (model source, letterbox (scale, pad_x, pad_y) or None).
+    """
+    if isinstance(frame, np.ndarray):
+        return frame, None
+    if _gpu_decodes(frame):
+        return _decode_jpeg_gpu(frame, imgsz)
+
+    img = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("could not decode image bytes")
+    return img, None
+
+
+def _gpu_decodes(frame_bytes: bytes) -> bool:
+    return _GPU_DECODE and frame_bytes[:2] == b"\xff\xd8"
+
+
+def _decode_jpeg_gpu(
+    frame_bytes: bytes, imgsz: int
+) -> Tuple[Any, Tuple[float, int, int]]:
+    """nvJPEG decode plus Ultralytics-style letterbox, all on the device."""
+    import torch
+    from torchvision.io import ImageReadMode, decode_jpeg
+
+    try:
+        from ai_core.model_backends import letterbox
+    except ImportError:
+        from backend.ai_core.model_backends import letterbox
+
+    data = torch.frombuffer(bytearray(frame_bytes), dtype=torch.uint8)
+    img = decode_jpeg(data, mode=ImageReadMode.RGB, device=_DEVICE)  # (3, H, W)
+
+    t, scale, left, top = letterbox(img.unsqueeze(0).float().div_(255), imgsz)
+    return t, (scale, left, top)
+
+
+def _batch_source(imgs: List[Any]) -> Any:
+    """Predict source for a batch: ndarray list, or one (B, 3, S, S) tensor."""
+    if hasattr(imgs[0], "dim"):
+        import torch
+
+        return torch.cat(imgs)
+    return imgs
+
+
+def detect_frame(
+    frame: Union[bytes, np.ndarray],
+    conf_thresh: float = 0.25,
+    imgsz: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Run detection on encoded image bytes or a BGR ndarray.
 
-def detect_frame(frame_bytes: bytes, conf_thresh: float = 0.25) -> Dict[str, Any]:
-    """Run detection on raw image bytes.
+    `imgsz` overrides the model input size (YOLO_IMGSZ; snapped to stride 32).
 
     Returns a dict with keys: model, timestamp, objects, raw
-    Each object contains: class, confidence, bbox (x1,y1,x2,y2) and box (same)
+    Each object contains: class, confidence, bbox (x1,y1,x2,y2); `box` (same)
+    is added with YOLO_LEGACY_BOX=1. raw["soa"] holds the xyxy/conf/cls arrays.
     """
-    ts = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    ts = _timestamp()
 
     model = _load_yolo()
     if model is None:
@@ -110,31 +410,39 @@ def detect_frame(frame_bytes: bytes, conf_thresh: float = 0.25) -> Dict[str, Any
                     "class": "person",
                     "confidence": 0.6,
                     "bbox": [10, 10, 100, 200],
-                    "box": [10, 10, 100, 200],
+                    **({"box": [10, 10, 100, 200]} if _LEGACY_BOX else {}),
                 }
             ],
             "raw": None,
         }
 
     try:
-        # ultralytics supports passing bytes directly as source
-        results = model.predict(source=frame_bytes, conf=conf_thresh, imgsz=640)
+        size = _snap_imgsz(imgsz) if imgsz else _IMGSZ
+        img, letterbox = _decode_frame(frame, size)
+        if _BATCHER is not None:
+            results = [_BATCHER.submit(img, conf_thresh, size).result()]
+        else:
+            results = model.predict(
+                source=img, conf=conf_thresh, imgsz=size, half=_HALF, verbose=False
+            )
 
-        all_objs: List[Dict[str, Any]] = []
-        raw = []
-        for r in results:
-            objs = _boxes_from_result(r)
-            all_objs.extend(objs)
-            raw.append(r)
+        xyxy, conf, cls, names = _result_arrays(results)
+        # Host arrays are all we keep; drop the Results (and their CUDA tensors)
+        del results, img
+        if letterbox is not None:
+            # Boxes predicted on the letterboxed tensor -> frame coordinates
+            scale, pad_x, pad_y = letterbox
+            xyxy = (xyxy - (pad_x, pad_y, pad_x, pad_y)) / scale
 
         return {
             "model": getattr(model, "model", "yolov8"),
             "timestamp": ts,
-            "objects": all_objs,
-            "raw": None,
+            "objects": _objects(xyxy, conf, cls, names),
+            "raw": {"soa": {"xyxy": xyxy, "conf": conf, "cls": cls}},
         }
 
     except Exception as e:
+        _release_cuda_cache(e)
         return {
             "model": "yolov8_error",
             "timestamp": ts,
@@ -143,72 +451,124 @@ def detect_frame(frame_bytes: bytes, conf_thresh: float = 0.25) -> Dict[str, Any
         }
 
 
+def _imdecode(frame_bytes: bytes) -> Any:
+    """BGR ndarray for the annotation canvas (None if undecodable)."""
+    return cv2.imdecode(np.frombuffer(frame_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def _encode_jpeg(img: Any) -> bytes:
+    """Quality-80 JPEG bytes; nvJPEG on the device when GPU decode is active."""
+    if _GPU_DECODE:
+        try:
+            import torch
+            from torchvision.io import encode_jpeg
+
+            rgb = torch.from_numpy(img[..., ::-1].copy()).permute(2, 0, 1)
+            return encode_jpeg(rgb.to(_DEVICE), quality=80).cpu().numpy().tobytes()
+        except Exception:
+            # torchvision without CUDA encode_jpeg: encode on the host
+            pass
+
+    params = [cv2.IMWRITE_JPEG_QUALITY, 80, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+    ok, buf = cv2.imencode(".jpg", img, params)
+    if not ok:
+        raise ValueError("could not encode annotated frame")
+    return buf.tobytes()
+
+
+def _annotate(
+    decoded: Future, xyxy: Any, conf: Any, objs: List[Dict], as_b64: bool
+) -> Optional[Any]:
+    """Draw boxes and labels on the decoded frame; JPEG bytes (or base64) or None."""
+    try:
+        img = decoded.result()
+        if img is None:
+            return None
+
+        # All boxes in one polylines call: (N, 4, 2) corner array
+        boxes = xyxy.astype(np.int32)
+        corners = boxes[:, [0, 1, 2, 1, 2, 3, 0, 3]].reshape(-1, 4, 2)
+        if len(corners):
+            cv2.polylines(img, corners, True, (0, 255, 0), 2, cv2.LINE_8)
+
+        labels = [
+            f"{o.get('class', 'obj')} {cf:.2f}"
+            + (f" id:{o['track_id']}" if o.get("track_id") is not None else "")
+            for cf, o in zip(conf.tolist(), objs)
+        ]
+        for (x1, y1), txt in zip(boxes[:, :2].tolist(), labels):
+            cv2.putText(
+                img,
+                txt,
+                (x1, max(10, y1 - 5)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (255, 255, 255),
+                1,
+                cv2.LINE_8,
+            )
+        jpeg = _encode_jpeg(img)
+        return base64.b64encode(jpeg).decode() if as_b64 else jpeg
+    except Exception:
+        return None
+
+
 def detect_frame_enhanced(
     frame_bytes: bytes,
     conf_thresh: float = 0.25,
     tracked: bool = False,
     annotate: bool = False,
     camera_id: Optional[str] = None,
+    defer_annotation: bool = False,
+    annotate_format: str = "b64",
 ) -> Dict[str, Any]:
     """Enhanced detect: runs `detect_frame`, optional lightweight tracking and annotation.
 
-    Returns same dict as `detect_frame` with optional keys in `raw`: `annotated_b64`.
+    Returns same dict as `detect_frame` with optional keys in `raw`:
+    `annotated_b64`, or `annotated_jpeg` (raw bytes) when
+    `annotate_format="jpeg"`. Drawing and encoding run on `_ENCODE_POOL`;
+    the frame decoded for detection is reused as the canvas. With
+    `defer_annotation=True` the value is the Future itself, resolving to
+    the image or None.
     """
-    base = detect_frame(frame_bytes, conf_thresh)
+    frame: Union[bytes, np.ndarray] = frame_bytes
+    decoded: Optional[Future] = None
+    if annotate and frame_bytes and cv2 is not None:
+        _load_yolo()  # sets _GPU_DECODE
+        if _gpu_decodes(frame_bytes):
+            # Detection decodes on the device; decode the host canvas alongside
+            decoded = _ENCODE_POOL.submit(_imdecode, frame_bytes)
+        else:
+            # One host decode shared by detection and the annotator
+            img = _imdecode(frame_bytes)
+            if img is not None:
+                frame = img
+            decoded = Future()
+            decoded.set_result(img)
+
+    base = detect_frame(frame, conf_thresh)
     objs = base.get("objects", [])
 
     # apply lightweight tracking if requested
-    if tracked:
+    if tracked and _track_update is not None:
         try:
-            from tracking import update as track_update
-
-            objs = track_update(camera_id or "_local", objs)
+            objs = _track_update(camera_id or "_local", objs)
         except Exception:
             pass
 
-    annotated_b64 = None
-    if annotate:
-        try:
-            try:
-                import cv2
-
-                CV2 = True
-            except Exception:
-                CV2 = False
-
-            if CV2 and frame_bytes:
-                import base64 as _b64
-
-                import numpy as np
-
-                arr = np.frombuffer(frame_bytes, dtype=np.uint8)
-                img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-                if img is not None:
-                    for o in objs:
-                        bbox = o.get("bbox") or o.get("box")
-                        if not bbox:
-                            continue
-                        x1, y1, x2, y2 = [int(v) for v in bbox]
-                        label = str(o.get("class", "obj"))
-                        tid = o.get("track_id")
-                        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        txt = f"{label} {o.get('confidence',0):.2f}"
-                        if tid is not None:
-                            txt += f" id:{tid}"
-                        cv2.putText(
-                            img,
-                            txt,
-                            (x1, max(10, y1 - 5)),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5,
-                            (255, 255, 255),
-                            1,
-                        )
-                    ok, buf = cv2.imencode(".jpg", img)
-                    if ok:
-                        annotated_b64 = _b64.b64encode(buf.tobytes()).decode()
-        except Exception:
-            annotated_b64 = None
+    annotated: Any = None
+    if decoded is not None:
+        soa = (base.get("raw") or {}).get("soa")
+        if soa is not None:
+            xyxy, conf = soa["xyxy"], soa["conf"]
+        else:
+            xyxy = np.array([o["bbox"] for o in objs]).reshape(-1, 4)
+            conf = np.array([o["confidence"] for o in objs])
+
+        as_b64 = annotate_format != "jpeg"
+        annotated = _ENCODE_POOL.submit(_annotate, decoded, xyxy, conf, objs, as_b64)
+        if not defer_annotation:
+            annotated = annotated.result()
 
     out = {
         "model": base.get("model", "yolov8"),
@@ -216,7 +576,7 @@ def detect_frame_enhanced(
         "objects": objs,
         "raw": base.get("raw"),
     }
-    if annotated_b64:
-        out.setdefault("raw", {})
-        out["raw"]["annotated_b64"] = annotated_b64
+    if annotated:
+        key = "annotated_jpeg" if annotate_format == "jpeg" else "annotated_b64"
+        out["raw"] = {**(out["raw"] or {}), key: annotated}
     return out
@@ -3,10 +3,22 @@ HAZM TUWAIQ - Alert API
 Alert management, acknowledgment, and escalation endpoints
 """
 
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+import heapq
+import os
+from collections import OrderedDict, deque
+from datetime import date, datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 from .engine import get_alert_engine
 from .escalation import get_escalation_manager
@@ -36,9 +48,21 @@ notification_manager = get_notification_manager()
 escalation_manager = get_escalation_manager()
 
 
-# In-memory databases
-ALERTS_DB: Dict[str, Alert] = {}
+# In-memory databases (alerts bounded: oldest evicted past MAX_ALERTS / TTL)
+ALERTS_DB: "OrderedDict[str, Alert]" = OrderedDict()
 ALERT_RULES_DB: Dict[str, AlertRule] = {}
+MAX_ALERTS = int(os.getenv("MAX_ALERTS", "10000"))
+ALERT_TTL_DAYS = int(os.getenv("ALERT_TTL_DAYS", "90"))
+
+# Secondary index: organization_id -> alert ids in insertion order
+ALERTS_BY_ORG: Dict[str, Deque[str]] = {}
+
+# Daily counters: organization_id -> "YYYY-MM-DD" -> {total, by_severity, by_type}
+TIMELINE_COUNTS: Dict[str, Dict[str, Dict[str, Any]]] = {}
+TIMELINE_RETENTION_DAYS = 90
+
+# Rule index: (organization_id, trigger_type) -> rules in creation order
+RULES_BY_ORG_TYPE: Dict[Tuple[str, AlertType], List[AlertRule]] = {}
 
 
 # ═══════════════════════════════════════════════════════════
@@ -48,19 +72,83 @@ ALERT_RULES_DB: Dict[str, AlertRule] = {}
 
 def create_response(
     success: bool, message: str, data: Any = None, error: Optional[str] = None
-) -> Dict[str, Any]:
-    """Create unified JSON response"""
+) -> Any:
+    """Create unified JSON response
+
+    Serialized with orjson when installed (datetimes, enums and numpy arrays
+    natively, skipping FastAPI's jsonable_encoder pass); otherwise the dict
+    is returned for FastAPI's default encoding.
+    """
     response = {
         "success": success,
         "message": message,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(),
         "data": data,
     }
 
     if error:
         response["error"] = error
 
-    return response
+    if not ORJSON_AVAILABLE:
+        return response
+
+    return Response(
+        orjson.dumps(
+            response,
+            default=jsonable_encoder,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        ),
+        media_type="application/json",
+    )
+
+
+def _org_alerts(organization_id: str) -> List[Alert]:
+    """Alerts of one organization in insertion order (via ALERTS_BY_ORG)"""
+    return [ALERTS_DB[i] for i in ALERTS_BY_ORG.get(organization_id, ())]
+
+
+def _evict_alerts() -> None:
+    """Drop the oldest alerts past MAX_ALERTS or older than ALERT_TTL_DAYS"""
+    cutoff = datetime.now() - timedelta(days=ALERT_TTL_DAYS)
+    while ALERTS_DB:
+        oldest = next(iter(ALERTS_DB.values()))
+        if len(ALERTS_DB) <= MAX_ALERTS and oldest.created_at >= cutoff:
+            break
+        ALERTS_DB.popitem(last=False)
+        # Globally oldest is also the oldest of its organization
+        org_ids = ALERTS_BY_ORG[oldest.organization_id]
+        org_ids.popleft()
+        if not org_ids:
+            del ALERTS_BY_ORG[oldest.organization_id]
+
+
+def _unindex_rule(rule: AlertRule) -> None:
+    """Remove rule from RULES_BY_ORG_TYPE, dropping its key once empty"""
+    key = (rule.organization_id, rule.trigger_type)
+    rules = RULES_BY_ORG_TYPE[key]
+    rules.remove(rule)
+    if not rules:
+        del RULES_BY_ORG_TYPE[key]
+
+
+def _count_in_timeline(alert: Alert) -> None:
+    """Add alert to its organization's daily counters"""
+    org_days = TIMELINE_COUNTS.setdefault(alert.organization_id, {})
+    day = alert.created_at.date().isoformat()
+
+    counts = org_days.get(day)
+    if counts is None:
+        # New day: drop buckets past retention (ISO dates sort as strings)
+        cutoff = (date.today() - timedelta(days=TIMELINE_RETENTION_DAYS)).isoformat()
+        for old_day in [d for d in org_days if d < cutoff]:
+            del org_days[old_day]
+        counts = org_days[day] = {"total": 0, "by_severity": {}, "by_type": {}}
+
+    counts["total"] += 1
+    severity = alert.severity.value
+    counts["by_severity"][severity] = counts["by_severity"].get(severity, 0) + 1
+    alert_type = alert.type.value
+    counts["by_type"][alert_type] = counts["by_type"].get(alert_type, 0) + 1
 
 
 # ═══════════════════════════════════════════════════════════
@@ -99,22 +187,22 @@ async def create_alert(
 
         # Store in DB
         ALERTS_DB[alert.id] = alert
-
-        # Find matching alert rules
-        matching_rules = [
-            rule
-            for rule in ALERT_RULES_DB.values()
-            if (
-                rule.organization_id == organization_id
-                and rule.is_active
-                and rule.trigger_type == alert.type
-            )
-        ]
+        ALERTS_BY_ORG.setdefault(organization_id, deque()).append(alert.id)
+        _count_in_timeline(alert)
+        _evict_alerts()
+
+        # First active rule for this organization and alert type
+        rule = next(
+            (
+                r
+                for r in RULES_BY_ORG_TYPE.get((organization_id, alert.type), ())
+                if r.is_active
+            ),
+            None,
+        )
 
         # Execute autonomous actions
-        if matching_rules:
-            rule = matching_rules[0]  # Use first matching rule
-
+        if rule is not None:
             actions = alert_engine.execute_autonomous_actions(alert, rule)
 
             # Send notifications
@@ -144,7 +232,7 @@ async def create_alert(
             success=True,
             message="Alert created successfully",
             data={
-                "alert": alert.dict(),
+                "alert": alert.cached_dump(),
                 "actions_executed": len(alert.autonomous_actions),
                 "notifications_sent": len(alert.notifications_sent),
             },
@@ -170,32 +258,27 @@ async def list_alerts(
     - **alert_type**: Filter by alert type
     """
     try:
-        # Filter alerts
-        alerts = [
-            alert
-            for alert in ALERTS_DB.values()
-            if alert.organization_id == organization_id
-        ]
-
-        if status:
-            alerts = [a for a in alerts if a.status == status]
-
-        if severity:
-            alerts = [a for a in alerts if a.severity == severity]
-
-        if alert_type:
-            alerts = [a for a in alerts if a.type == alert_type]
-
-        # Sort by creation date (newest first)
-        alerts = sorted(alerts, key=lambda x: x.created_at, reverse=True)
+        # Filter alerts (status etc. change in place, so only org is indexed)
+        alerts = _org_alerts(organization_id)
+        if status or severity or alert_type:
+            alerts = [
+                a
+                for a in alerts
+                if (not status or a.status == status)
+                and (not severity or a.severity == severity)
+                and (not alert_type or a.type == alert_type)
+            ]
 
-        # Limit results
-        alerts = alerts[:limit]
+        # Newest first, limited (partial sort when limit is small)
+        if limit < len(alerts):
+            alerts = heapq.nlargest(limit, alerts, key=lambda x: x.created_at)
+        else:
+            alerts = sorted(alerts, key=lambda x: x.created_at, reverse=True)
 
         return create_response(
             success=True,
             message=f"Retrieved {len(alerts)} alerts",
-            data={"alerts": [a.dict() for a in alerts], "total": len(alerts)},
+            data={"alerts": [a.cached_dump() for a in alerts], "total": len(alerts)},
         )
 
     except Exception as e:
@@ -214,7 +297,7 @@ async def get_alert(alert_id: str):
         return create_response(
             success=True,
             message="Alert retrieved successfully",
-            data={"alert": alert.dict()},
+            data={"alert": alert.cached_dump()},
         )
 
     except HTTPException:
@@ -254,7 +337,7 @@ async def acknowledge_alert(
         return create_response(
             success=True,
             message="Alert acknowledged successfully",
-            data={"alert": alert.dict() if alert else None},
+            data={"alert": alert.cached_dump() if alert else None},
         )
 
     except HTTPException:
@@ -321,7 +404,7 @@ async def escalate_alert(
         # Update alert
         alert.escalation_level += 1
         alert.escalated_at = datetime.now()
-        alert.status = AlertStatus.ESCALATED
+        alert_engine.set_alert_status(alert, AlertStatus.ESCALATED)
 
         alert.escalation_path.append(
             {
@@ -332,11 +415,12 @@ async def escalate_alert(
                 "type": "manual",
             }
         )
+        alert.mark_changed()
 
         return create_response(
             success=True,
             message="Alert escalated successfully",
-            data={"alert": alert.dict()},
+            data={"alert": alert.cached_dump()},
         )
 
     except HTTPException:
@@ -364,8 +448,15 @@ async def create_alert_rule(
     try:
         rule.organization_id = organization_id
 
-        # Store rule
+        # Store rule (replacing any previous rule with the same id)
+        old = ALERT_RULES_DB.get(rule.id)
+        if old is not None:
+            _unindex_rule(old)
         ALERT_RULES_DB[rule.id] = rule
+        RULES_BY_ORG_TYPE.setdefault((organization_id, rule.trigger_type), []).append(
+            rule
+        )
+        alert_engine.invalidate_rules()
 
         return create_response(
             success=True,
@@ -406,7 +497,8 @@ async def delete_alert_rule(rule_id: str):
         if rule_id not in ALERT_RULES_DB:
             raise HTTPException(status_code=404, detail="Rule not found")
 
-        del ALERT_RULES_DB[rule_id]
+        _unindex_rule(ALERT_RULES_DB.pop(rule_id))
+        alert_engine.invalidate_rules()
 
         return create_response(
             success=True,
@@ -448,9 +540,7 @@ async def get_alert_stats(
         escalation_stats = escalation_manager.get_stats()
 
         # Calculate additional metrics
-        org_alerts = [
-            a for a in ALERTS_DB.values() if a.organization_id == organization_id
-        ]
+        org_alerts = _org_alerts(organization_id)
 
         # Response times
         acknowledged = [a for a in org_alerts if a.acknowledged_at]
@@ -462,6 +552,12 @@ async def get_alert_stats(
             sum(response_times) / len(response_times) if response_times else 0
         )
 
+        # Today's bucket of the timeline counters (no per-alert date math);
+        # the counters keep counting alerts evicted from ALERTS_DB
+        today_counts = TIMELINE_COUNTS.get(organization_id, {}).get(
+            date.today().isoformat(), {}
+        )
+
         return create_response(
             success=True,
             message="Alert statistics retrieved",
@@ -471,14 +567,12 @@ async def get_alert_stats(
                 "escalation_stats": escalation_stats,
                 "metrics": {
                     "avg_response_time_seconds": round(avg_response_time, 2),
+                    # Only what ALERTS_DB still holds (see _evict_alerts)
+                    "total_alerts_retained": len(org_alerts),
+                    # Deprecated alias of total_alerts_retained, kept for
+                    # existing clients; despite the name it is not all-time
                     "total_alerts_all_time": len(org_alerts),
-                    "alerts_today": len(
-                        [
-                            a
-                            for a in org_alerts
-                            if a.created_at.date() == datetime.now().date()
-                        ]
-                    ),
+                    "alerts_today": today_counts.get("total", 0),
                 },
             },
         )
@@ -500,40 +594,21 @@ async def get_alert_timeline(
     - **Peak times**: Identify high-risk periods
     """
     try:
-        # Get alerts for time period
-        start_date = datetime.now() - timedelta(days=days)
-
-        alerts = [
-            a
-            for a in ALERTS_DB.values()
-            if (a.organization_id == organization_id and a.created_at >= start_date)
-        ]
-
-        # Group by day
+        # Read the last `days` daily buckets (oldest first)
+        org_days = TIMELINE_COUNTS.get(organization_id, {})
+        today = date.today()
         daily_counts = {}
-        for alert in alerts:
-            day = alert.created_at.date().isoformat()
-            if day not in daily_counts:
-                daily_counts[day] = {"total": 0, "by_severity": {}, "by_type": {}}
-
-            daily_counts[day]["total"] += 1
-
-            severity = alert.severity.value
-            daily_counts[day]["by_severity"][severity] = (
-                daily_counts[day]["by_severity"].get(severity, 0) + 1
-            )
-
-            alert_type = alert.type.value
-            daily_counts[day]["by_type"][alert_type] = (
-                daily_counts[day]["by_type"].get(alert_type, 0) + 1
-            )
+        for offset in range(days - 1, -1, -1):
+            day = (today - timedelta(days=offset)).isoformat()
+            if day in org_days:
+                daily_counts[day] = org_days[day]
 
         return create_response(
             success=True,
             message=f"Timeline for last {days} days",
             data={
                 "timeline": daily_counts,
-                "total_alerts": len(alerts),
+                "total_alerts": sum(c["total"] for c in daily_counts.values()),
                 "period_days": days,
             },
         )
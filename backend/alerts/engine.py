@@ -3,10 +3,41 @@ HAZM TUWAIQ - Alert Engine
 Real-time alert generation and autonomous action execution
 """
 
+import functools
 import logging
-from collections import defaultdict
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except Exception:  # Not installed, or a broken install - stay on plain NumPy
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Fallback decorator - kernels run as plain NumPy without numba"""
+
+        def decorator(func):
+            return func
+
+        return decorator
+
 
 from .models import (
     ActionType,
@@ -18,6 +49,65 @@ from .models import (
     AlertType,
 )
 
+# Statuses counted as active (escalated alerts are handled by escalation)
+ACTIVE_STATUSES = (AlertStatus.ACTIVE, AlertStatus.PENDING, AlertStatus.ACKNOWLEDGED)
+
+# Violations per frame above which PPE thresholds are matched with NumPy
+PPE_VECTORIZE_MIN = 8
+
+# Insertion-ordered set of alert ids
+IdSet = Dict[str, None]
+
+# Repeat detections of the same condition within this window (since it was
+# last seen) bump dedup_count on the existing alert instead of a new alert
+DEDUP_WINDOW = timedelta(seconds=30)
+DEDUP_CAPACITY = 4096
+
+# Unresolved alerts are dropped from the active cache past either bound
+ACTIVE_ALERTS_CAP = 100_000
+ACTIVE_ALERT_TTL = timedelta(days=1)
+# Resolved alerts are tombstoned and dropped in bulk after this many
+COMPACT_EVERY = 10_000
+
+# PPE rule tables kept for this many rule buckets (until invalidate_rules)
+RULE_TABLE_CACHE = 64
+
+# Autonomous actions run on a bounded pool; callers wait up to ACTION_TIMEOUT
+# seconds for results, except for signals nobody needs a result from
+ACTION_WORKERS = 8
+ACTION_TIMEOUT = 5.0
+FIRE_AND_FORGET_ACTIONS = frozenset({ActionType.SOUND_ALARM, ActionType.ACTIVATE_LIGHT})
+
+
+class RuleTable(NamedTuple):
+    """Active rules of one trigger type as parallel columns (index i = rule i)"""
+
+    thresholds: np.ndarray
+    severity: List[AlertSeverity]
+    org_id: List[str]
+
+
+@njit(cache=True, fastmath=True)
+def _classify_collisions(ttc: np.ndarray) -> np.ndarray:
+    """Severity code per time-to-collision: 0 none, 1 high (< 3s), 2 critical (< 1s)"""
+    return (ttc < 3.0).astype(np.int8) + (ttc < 1.0).astype(np.int8)
+
+
+# Alert severity per _classify_collisions code, and per fatigue level category
+_COLLISION_SEVERITY = (None, AlertSeverity.HIGH, AlertSeverity.CRITICAL)
+_FATIGUE_SEVERITY = {"HIGH": AlertSeverity.HIGH, "CRITICAL": AlertSeverity.CRITICAL}
+
+
+def _synchronized(method):
+    """Run an AlertEngine method under the engine lock"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
 
 class AlertEngine:
     """
@@ -29,15 +119,53 @@ class AlertEngine:
         """Initialize alert engine"""
         self.logger = logging.getLogger(__name__)
 
+        # Guards the alert cache, its indexes and counters (reentrant:
+        # locked methods call each other)
+        self._lock = threading.RLock()
+
+        # Runs autonomous actions off the caller's thread
+        self._executor = ThreadPoolExecutor(
+            max_workers=ACTION_WORKERS, thread_name_prefix="alert-action"
+        )
+
         # Alert counters per organization
         self.alert_counts = defaultdict(int)
 
-        # Active alerts cache
-        self.active_alerts: Dict[str, Alert] = {}
+        # Active alerts cache, oldest first (bounded, see _evict_stale)
+        self.active_alerts: "OrderedDict[str, Alert]" = OrderedDict()
+
+        # Secondary indexes over active_alerts
+        self._by_org: Dict[str, IdSet] = defaultdict(dict)
+        self._by_org_severity: Dict[Tuple[str, AlertSeverity], IdSet] = defaultdict(
+            dict
+        )
+        self._by_org_type: Dict[Tuple[str, AlertType], IdSet] = defaultdict(dict)
+
+        # Resolved alerts still in active_alerts/indexes until _compact
+        self._resolved: IdSet = {}
+
+        # Histograms for get_stats: per status, and per severity of alerts in
+        # ACTIVE_STATUSES (kept in step by _count / set_alert_status)
+        self._counts_by_org_status: Dict[Tuple[str, AlertStatus], int] = defaultdict(
+            int
+        )
+        self._counts_by_org_severity: Dict[Tuple[str, AlertSeverity], int] = (
+            defaultdict(int)
+        )
 
         # Alert rules cache
         self.alert_rules: Dict[str, AlertRule] = {}
+        # id(PPE rules bucket) -> (bucket, its RuleTable), least recent first
+        self._rule_tables: "OrderedDict[int, Tuple[List[AlertRule], RuleTable]]" = (
+            OrderedDict()
+        )
+
+        # Detection fingerprint -> (alert id, last seen), oldest first
+        self._recent_fingerprints: "OrderedDict[Tuple, Tuple[str, datetime]]" = (
+            OrderedDict()
+        )
 
+    @_synchronized
     def create_alert(
         self,
         alert_type: AlertType,
@@ -77,13 +205,20 @@ class AlertEngine:
 
             # Cache alert
             self.active_alerts[alert.id] = alert
+            self._index(alert)
+            self._count(alert, 1)
+            self._evict_stale()
 
             # Increment counter
             self.alert_counts[organization_id] += 1
 
-            self.logger.info(
-                f"Alert created: {alert.id} - {alert.type.value} - {alert.severity.value}"
-            )
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info(
+                    "Alert created: %s - %s - %s",
+                    alert.id,
+                    alert.type.value,
+                    alert.severity.value,
+                )
 
             return alert
 
@@ -91,15 +226,121 @@ class AlertEngine:
             self.logger.error(f"Failed to create alert: {e}")
             raise
 
+    @_synchronized
+    def _create_deduplicated(self, key: Any, **fields: Any) -> Optional[Alert]:
+        """
+        create_alert unless the same detection (type, camera, organization,
+        key) produced a still-active alert within DEDUP_WINDOW; then count
+        the repeat on that alert and return None
+        """
+        fingerprint = (
+            fields["alert_type"],
+            fields.get("camera_id"),
+            fields["organization_id"],
+            key,
+        )
+        now = datetime.now()
+
+        seen = self._recent_fingerprints.get(fingerprint)
+        if seen is not None:
+            alert = self._live(seen[0])
+            if alert is not None and now - seen[1] <= DEDUP_WINDOW:
+                alert.metadata["dedup_count"] = alert.metadata.get("dedup_count", 0) + 1
+                alert.mark_changed()
+                self._recent_fingerprints[fingerprint] = (alert.id, now)
+                self._recent_fingerprints.move_to_end(fingerprint)
+                return None
+
+        alert = self.create_alert(**fields)
+        self._recent_fingerprints[fingerprint] = (alert.id, now)
+        self._recent_fingerprints.move_to_end(fingerprint)
+        if len(self._recent_fingerprints) > DEDUP_CAPACITY:
+            self._recent_fingerprints.popitem(last=False)
+        return alert
+
+    @staticmethod
+    def bucket_rules(rules: Iterable[AlertRule]) -> Dict[AlertType, List[AlertRule]]:
+        """Group rules by trigger type (build once, reuse across detections)"""
+        by_type: Dict[AlertType, List[AlertRule]] = defaultdict(list)
+        for rule in rules:
+            by_type[rule.trigger_type].append(rule)
+        return dict(by_type)
+
+    @staticmethod
+    def _ppe_table(rules: Iterable[AlertRule]) -> RuleTable:
+        """Active PPE rules and their confidence thresholds as a RuleTable"""
+        active = [rule for rule in rules if rule.is_active]
+        return RuleTable(
+            thresholds=np.fromiter(
+                (rule.conditions.get("confidence_threshold", 0.8) for rule in active),
+                dtype=np.float64,
+                count=len(active),
+            ),
+            severity=[rule.severity for rule in active],
+            org_id=[rule.organization_id for rule in active],
+        )
+
+    @_synchronized
+    def _cached_ppe_table(self, rules: List[AlertRule]) -> RuleTable:
+        """_ppe_table for a rules bucket, reused until invalidate_rules()"""
+        key = id(rules)
+        cached = self._rule_tables.get(key)
+        if cached is not None and cached[0] is rules:
+            self._rule_tables.move_to_end(key)
+            return cached[1]
+
+        table = self._ppe_table(rules)
+        self._rule_tables[key] = (rules, table)
+        if len(self._rule_tables) > RULE_TABLE_CACHE:
+            self._rule_tables.popitem(last=False)
+        return table
+
+    @_synchronized
+    def invalidate_rules(self) -> None:
+        """Drop cached rule tables; call after adding, updating or deleting rules"""
+        self._rule_tables.clear()
+
+    @staticmethod
+    def _match_ppe_rules(
+        violations: List[Dict[str, Any]], table: RuleTable
+    ) -> Iterable[Tuple[Dict[str, Any], int]]:
+        """Pair each violation with the first rule index whose threshold it meets"""
+        if not len(table.thresholds):
+            return
+        if len(violations) <= PPE_VECTORIZE_MIN:
+            thresholds = table.thresholds.tolist()
+            for violation in violations:
+                confidence = violation.get("confidence", 0)
+                for i, threshold in enumerate(thresholds):
+                    if confidence >= threshold:
+                        yield violation, i
+                        break
+            return
+
+        # (V, R) threshold mask in one comparison for large frames
+        confs = np.fromiter(
+            (v.get("confidence", 0) for v in violations),
+            dtype=np.float64,
+            count=len(violations),
+        )
+        mask = confs[:, None] >= table.thresholds[None, :]
+        hits = np.flatnonzero(mask.any(axis=1))
+        first = mask[hits].argmax(axis=1)
+        for v, r in zip(hits.tolist(), first.tolist()):
+            yield violations[v], r
+
     def evaluate_detection(
-        self, detection_result: Dict[str, Any], rules: List[AlertRule]
+        self,
+        detection_result: Dict[str, Any],
+        rules: Union[List[AlertRule], Dict[AlertType, List[AlertRule]]],
     ) -> List[Alert]:
         """
         Evaluate detection result against alert rules
 
         Args:
             detection_result: AI detection result
-            rules: Active alert rules
+            rules: Active alert rules, or rules already grouped by
+                `bucket_rules` (preferred on a detection stream)
 
         Returns:
             List of generated alerts
@@ -107,115 +348,128 @@ class AlertEngine:
         alerts = []
 
         try:
+            rules_by_type = (
+                rules if isinstance(rules, dict) else self.bucket_rules(rules)
+            )
+            # Trigger types with at least one active rule; other checks skip
+            active_types = {
+                trigger_type
+                for trigger_type, typed_rules in rules_by_type.items()
+                if any(rule.is_active for rule in typed_rules)
+            }
+
             # Extract detection info
             ppe_compliance = detection_result.get("ppe_compliance", {})
             pose_analysis = detection_result.get("pose_analysis", {})
             fatigue_status = detection_result.get("fatigue_status", {})
             intent_prediction = detection_result.get("intent_prediction", {})
             safety_assessment = detection_result.get("safety_assessment", {})
+            # Shared by every alert from this detection, read once
+            detection_id = detection_result.get("detection_id")
+            camera_id = detection_result.get("camera_id")
+            organization_id = detection_result.get("organization_id", "ORG-DEFAULT")
 
             # Check PPE violations
-            if not ppe_compliance.get("compliant", True):
-                for violation in ppe_compliance.get("violations", []):
-                    # Find matching rules
-                    for rule in rules:
-                        if (
-                            rule.trigger_type == AlertType.PPE_VIOLATION
-                            and rule.is_active
-                            and violation.get("confidence", 0)
-                            >= rule.conditions.get("confidence_threshold", 0.8)
-                        ):
-
-                            alert = self.create_alert(
-                                alert_type=AlertType.PPE_VIOLATION,
-                                severity=rule.severity,
-                                title=f"PPE Violation: {violation['type']}",
-                                title_ar=f"خرق معدات السلامة: {violation['type']}",
-                                description=f"Worker detected without required PPE. Confidence: {violation['confidence']:.2f}",
-                                organization_id=rule.organization_id,
-                                source="AI_DETECTION",
-                                source_id=detection_result.get("detection_id"),
-                                camera_id=detection_result.get("camera_id"),
-                                confidence=violation["confidence"],
-                                metadata=violation,
-                            )
-                            alerts.append(alert)
-                            break
+            if AlertType.PPE_VIOLATION in active_types and not ppe_compliance.get(
+                "compliant", True
+            ):
+                # Rule columns built once per bucket, indexed per match
+                table = self._cached_ppe_table(rules_by_type[AlertType.PPE_VIOLATION])
+                violations = ppe_compliance.get("violations", [])
+                for violation, i in self._match_ppe_rules(violations, table):
+                    alert = self._create_deduplicated(
+                        violation["type"],
+                        alert_type=AlertType.PPE_VIOLATION,
+                        severity=table.severity[i],
+                        title=f"PPE Violation: {violation['type']}",
+                        title_ar=f"خرق معدات السلامة: {violation['type']}",
+                        description=f"Worker detected without required PPE. Confidence: {violation['confidence']:.2f}",
+                        organization_id=table.org_id[i],
+                        source="AI_DETECTION",
+                        source_id=detection_id,
+                        camera_id=camera_id,
+                        confidence=violation["confidence"],
+                        metadata=violation,
+                    )
+                    if alert:
+                        alerts.append(alert)
 
             # Check fall detection
-            if pose_analysis:
+            if AlertType.FALL_DETECTED in active_types and pose_analysis:
                 pose_risks = pose_analysis.get("posture_risks", [])
                 for risk in pose_risks:
                     if risk["type"] == "FALL_DETECTED":
-                        alert = self.create_alert(
+                        alert = self._create_deduplicated(
+                            risk["type"],
                             alert_type=AlertType.FALL_DETECTED,
                             severity=AlertSeverity.CRITICAL,
                             title="Worker Fall Detected",
                             title_ar="سقوط عامل مُكتشف",
                             description=f"Fall detected with {risk['severity']} severity",
-                            organization_id=detection_result.get(
-                                "organization_id", "ORG-DEFAULT"
-                            ),
+                            organization_id=organization_id,
                             source="AI_DETECTION",
-                            camera_id=detection_result.get("camera_id"),
+                            camera_id=camera_id,
                             confidence=risk.get("confidence", 0.9),
                             metadata=risk,
                         )
-                        alerts.append(alert)
+                        if alert:
+                            alerts.append(alert)
 
             # Check fatigue
-            if fatigue_status.get("fatigue_detected", False):
-                if fatigue_status.get("level_category") in ["HIGH", "CRITICAL"]:
-                    alert = self.create_alert(
+            if AlertType.WORKER_FATIGUE in active_types and fatigue_status.get(
+                "fatigue_detected", False
+            ):
+                severity = _FATIGUE_SEVERITY.get(fatigue_status.get("level_category"))
+                if severity is not None:
+                    alert = self._create_deduplicated(
+                        None,
                         alert_type=AlertType.WORKER_FATIGUE,
-                        severity=(
-                            AlertSeverity.HIGH
-                            if fatigue_status["level_category"] == "HIGH"
-                            else AlertSeverity.CRITICAL
-                        ),
+                        severity=severity,
                         title="Worker Fatigue Detected",
                         title_ar="إرهاق عامل مُكتشف",
                         description=fatigue_status.get("message", ""),
-                        organization_id=detection_result.get(
-                            "organization_id", "ORG-DEFAULT"
-                        ),
+                        organization_id=organization_id,
                         source="AI_DETECTION",
-                        camera_id=detection_result.get("camera_id"),
+                        camera_id=camera_id,
                         confidence=fatigue_status.get("fatigue_level", 0) / 100,
                         metadata=fatigue_status,
                     )
-                    alerts.append(alert)
+                    if alert:
+                        alerts.append(alert)
 
             # Check collision risks
-            if intent_prediction:
+            if AlertType.COLLISION_RISK in active_types and intent_prediction:
                 collision_risks = intent_prediction.get("collision_risks", [])
-                for collision in collision_risks:
-                    if (
-                        collision.get("time_to_collision", 999) < 3
-                    ):  # Less than 3 seconds
-                        alert = self.create_alert(
-                            alert_type=AlertType.COLLISION_RISK,
-                            severity=(
-                                AlertSeverity.CRITICAL
-                                if collision["time_to_collision"] < 1
-                                else AlertSeverity.HIGH
-                            ),
-                            title=f"Collision Risk: {collision['zone']}",
-                            title_ar=f"خطر اصطدام: {collision['zone']}",
-                            description=f"Worker approaching danger zone. Time to collision: {collision['time_to_collision']:.1f}s",
-                            organization_id=detection_result.get(
-                                "organization_id", "ORG-DEFAULT"
-                            ),
-                            source="AI_DETECTION",
-                            camera_id=detection_result.get("camera_id"),
-                            confidence=0.95,
-                            metadata=collision,
-                        )
+                # Classify every time-to-collision in one kernel call
+                codes = _classify_collisions(
+                    np.fromiter(
+                        (c.get("time_to_collision", 999) for c in collision_risks),
+                        dtype=np.float64,
+                        count=len(collision_risks),
+                    )
+                )
+                for i in np.flatnonzero(codes).tolist():
+                    collision = collision_risks[i]
+                    alert = self._create_deduplicated(
+                        collision["zone"],
+                        alert_type=AlertType.COLLISION_RISK,
+                        severity=_COLLISION_SEVERITY[codes[i]],
+                        title=f"Collision Risk: {collision['zone']}",
+                        title_ar=f"خطر اصطدام: {collision['zone']}",
+                        description=f"Worker approaching danger zone. Time to collision: {collision['time_to_collision']:.1f}s",
+                        organization_id=organization_id,
+                        source="AI_DETECTION",
+                        camera_id=camera_id,
+                        confidence=0.95,
+                        metadata=collision,
+                    )
+                    if alert:
                         alerts.append(alert)
 
             return alerts
 
-        except Exception as e:
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            # Malformed detection payload (alert validation errors included)
             self.logger.error(f"Failed to evaluate detection: {e}")
             return alerts
 
@@ -230,34 +484,49 @@ class AlertEngine:
             rule: Alert rule with actions
 
         Returns:
-            List of executed actions
+            List of actions; fire-and-forget actions and ones past
+            ACTION_TIMEOUT may still be "executing" and are filled in later
         """
         actions = []
 
         try:
+            submitted: List[Tuple[AlertAction, Future]] = []
             for action_type in rule.actions:
-                action = AlertAction(
-                    alert_id=alert.id, action_type=action_type, status="executing"
+                # Internally built, so skip validation
+                now = datetime.now()
+                action = AlertAction.model_construct(
+                    alert_id=alert.id,
+                    action_type=action_type,
+                    status="executing",
+                    executed_at=now,
+                    created_at=now,
                 )
-
-                # Execute action
-                success, result = self._execute_action(action_type, alert, rule)
-
-                # Update action
-                action.executed_at = datetime.now()
-                action.success = success
-                action.status = "completed" if success else "failed"
-                action.result = result
-                action.completed_at = datetime.now()
-
+                future = self._executor.submit(
+                    self._execute_action, action_type, alert, rule
+                )
+                submitted.append((action, future))
                 actions.append(action)
 
                 # Add to alert
                 alert.autonomous_actions.append(action.id)
-
-                self.logger.info(
-                    f"Action executed: {action.action_type.value} - {'✅' if success else '❌'}"
-                )
+            alert.mark_changed()
+
+            wait(
+                [
+                    future
+                    for action, future in submitted
+                    if action.action_type not in FIRE_AND_FORGET_ACTIONS
+                ],
+                timeout=ACTION_TIMEOUT,
+            )
+            # Finished actions are filled in now, the rest when they complete
+            for action, future in submitted:
+                if future.done():
+                    self._finish_action(action, future)
+                else:
+                    future.add_done_callback(
+                        functools.partial(self._finish_action, action)
+                    )
 
             return actions
 
@@ -265,6 +534,26 @@ class AlertEngine:
             self.logger.error(f"Failed to execute autonomous actions: {e}")
             return actions
 
+    def _finish_action(self, action: AlertAction, future: Future) -> None:
+        """Record the outcome of a submitted action"""
+        try:
+            success, result = future.result()
+        except Exception as e:
+            self.logger.error(f"Action execution failed: {e}")
+            success, result = False, {"error": str(e)}
+
+        action.success = success
+        action.status = "completed" if success else "failed"
+        action.result = result
+        action.completed_at = datetime.now()
+
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(
+                "Action executed: %s - %s",
+                action.action_type.value,
+                "✅" if success else "❌",
+            )
+
     def _execute_action(
         self, action_type: ActionType, alert: Alert, rule: AlertRule
     ) -> Tuple[bool, Dict[str, Any]]:
@@ -279,56 +568,52 @@ class AlertEngine:
         Returns:
             Tuple of (success, result)
         """
-        try:
-            if action_type == ActionType.SOUND_ALARM:
-                # Simulate sounding alarm
-                return True, {
-                    "alarm_id": f"ALARM-{alert.id}",
-                    "duration": 10,
-                    "location": alert.zone or "Site-wide",
-                }
-
-            elif action_type == ActionType.ACTIVATE_LIGHT:
-                # Simulate activating warning light
-                return True, {
-                    "light_id": f"LIGHT-{alert.camera_id}",
-                    "color": (
-                        "red" if alert.severity == AlertSeverity.CRITICAL else "yellow"
-                    ),
-                }
-
-            elif action_type == ActionType.STOP_EQUIPMENT:
-                # Simulate stopping equipment
-                return True, {
-                    "equipment_stopped": True,
-                    "zone": alert.zone,
-                    "stopped_at": datetime.now().isoformat(),
-                }
-
-            elif action_type == ActionType.LOCK_ZONE:
-                # Simulate locking zone
-                return True, {
-                    "zone_locked": True,
-                    "zone": alert.zone,
-                    "locked_at": datetime.now().isoformat(),
-                }
-
-            elif action_type == ActionType.CREATE_INCIDENT:
-                # Simulate creating incident report
-                return True, {
-                    "incident_created": True,
-                    "incident_id": f"INC-{alert.id}",
-                    "severity": alert.severity.value,
-                }
-
-            else:
-                # Notification actions are handled by NotificationManager
-                return True, {"queued": True}
+        if action_type == ActionType.SOUND_ALARM:
+            # Simulate sounding alarm
+            return True, {
+                "alarm_id": f"ALARM-{alert.id}",
+                "duration": 10,
+                "location": alert.zone or "Site-wide",
+            }
 
-        except Exception as e:
-            self.logger.error(f"Action execution failed: {e}")
-            return False, {"error": str(e)}
+        elif action_type == ActionType.ACTIVATE_LIGHT:
+            # Simulate activating warning light
+            return True, {
+                "light_id": f"LIGHT-{alert.camera_id}",
+                "color": (
+                    "red" if alert.severity == AlertSeverity.CRITICAL else "yellow"
+                ),
+            }
+
+        elif action_type == ActionType.STOP_EQUIPMENT:
+            # Simulate stopping equipment
+            return True, {
+                "equipment_stopped": True,
+                "zone": alert.zone,
+                "stopped_at": datetime.now().isoformat(),
+            }
 
+        elif action_type == ActionType.LOCK_ZONE:
+            # Simulate locking zone
+            return True, {
+                "zone_locked": True,
+                "zone": alert.zone,
+                "locked_at": datetime.now().isoformat(),
+            }
+
+        elif action_type == ActionType.CREATE_INCIDENT:
+            # Simulate creating incident report
+            return True, {
+                "incident_created": True,
+                "incident_id": f"INC-{alert.id}",
+                "severity": alert.severity.value,
+            }
+
+        else:
+            # Notification actions are handled by NotificationManager
+            return True, {"queued": True}
+
+    @_synchronized
     def acknowledge_alert(
         self, alert_id: str, user_id: str, notes: Optional[str] = None
     ) -> Tuple[bool, Optional[str]]:
@@ -344,7 +629,7 @@ class AlertEngine:
             Tuple of (success, error_message)
         """
         try:
-            alert = self.active_alerts.get(alert_id)
+            alert = self._live(alert_id)
 
             if not alert:
                 return False, "Alert not found"
@@ -353,23 +638,23 @@ class AlertEngine:
                 return False, "Alert already acknowledged"
 
             # Update alert
-            alert.status = AlertStatus.ACKNOWLEDGED
+            now = datetime.now()
+            self.set_alert_status(alert, AlertStatus.ACKNOWLEDGED)
             alert.acknowledged_by = user_id
-            alert.acknowledged_at = datetime.now()
-            alert.updated_at = datetime.now()
+            alert.acknowledged_at = now
+            alert.updated_at = now
 
             if notes:
-                if "acknowledgment_notes" not in alert.metadata:
-                    alert.metadata["acknowledgment_notes"] = []
-                alert.metadata["acknowledgment_notes"].append(
+                alert.metadata.setdefault("acknowledgment_notes", []).append(
                     {
                         "user_id": user_id,
                         "notes": notes,
-                        "timestamp": datetime.now().isoformat(),
+                        "timestamp": now.isoformat(),
                     }
                 )
+                alert.mark_changed()
 
-            self.logger.info(f"Alert acknowledged: {alert_id} by {user_id}")
+            self.logger.info("Alert acknowledged: %s by %s", alert_id, user_id)
 
             return True, None
 
@@ -377,6 +662,7 @@ class AlertEngine:
             self.logger.error(f"Failed to acknowledge alert: {e}")
             return False, str(e)
 
+    @_synchronized
     def resolve_alert(
         self, alert_id: str, user_id: str, resolution_notes: str
     ) -> Tuple[bool, Optional[str]]:
@@ -392,7 +678,7 @@ class AlertEngine:
             Tuple of (success, error_message)
         """
         try:
-            alert = self.active_alerts.get(alert_id)
+            alert = self._live(alert_id)
 
             if not alert:
                 return False, "Alert not found"
@@ -400,22 +686,26 @@ class AlertEngine:
             if alert.status == AlertStatus.RESOLVED:
                 return False, "Alert already resolved"
 
-            # Update alert
+            # Update alert (leaves the active counters)
+            now = datetime.now()
+            self._count(alert, -1)
             alert.status = AlertStatus.RESOLVED
             alert.resolved_by = user_id
-            alert.resolved_at = datetime.now()
-            alert.updated_at = datetime.now()
+            alert.resolved_at = now
+            alert.updated_at = now
 
             alert.metadata["resolution"] = {
                 "user_id": user_id,
                 "notes": resolution_notes,
-                "resolved_at": datetime.now().isoformat(),
+                "resolved_at": now.isoformat(),
             }
 
-            # Remove from active alerts
-            del self.active_alerts[alert_id]
+            # Tombstone rather than delete; removed in bulk by _compact
+            self._resolved[alert_id] = None
+            if len(self._resolved) >= COMPACT_EVERY:
+                self._compact()
 
-            self.logger.info(f"Alert resolved: {alert_id} by {user_id}")
+            self.logger.info("Alert resolved: %s by %s", alert_id, user_id)
 
             return True, None
 
@@ -423,6 +713,113 @@ class AlertEngine:
             self.logger.error(f"Failed to resolve alert: {e}")
             return False, str(e)
 
+    def _index(self, alert: Alert) -> None:
+        """Add alert to the organization/severity/type indexes"""
+        org = alert.organization_id
+        self._by_org[org][alert.id] = None
+        self._by_org_severity[(org, alert.severity)][alert.id] = None
+        self._by_org_type[(org, alert.type)][alert.id] = None
+
+    def _unindex(self, alert: Alert) -> None:
+        """Remove alert from the indexes (dropping emptied buckets)"""
+        org = alert.organization_id
+        for index, key in (
+            (self._by_org, org),
+            (self._by_org_severity, (org, alert.severity)),
+            (self._by_org_type, (org, alert.type)),
+        ):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(alert.id, None)
+                if not bucket:
+                    del index[key]
+
+    def _evict_stale(self) -> None:
+        """Drop the oldest active alerts past ACTIVE_ALERTS_CAP / ACTIVE_ALERT_TTL"""
+        cutoff = datetime.now() - ACTIVE_ALERT_TTL
+        while self.active_alerts:
+            oldest = next(iter(self.active_alerts.values()))
+            if (
+                len(self.active_alerts) <= ACTIVE_ALERTS_CAP
+                and oldest.created_at >= cutoff
+            ):
+                break
+            self.active_alerts.popitem(last=False)
+            self._unindex(oldest)
+            if oldest.id in self._resolved:
+                del self._resolved[oldest.id]  # Resolved, already uncounted
+                continue
+            self._count(oldest, -1)
+            if self.logger.isEnabledFor(logging.WARNING):
+                self.logger.warning(
+                    "Alert evicted unresolved: %s - %s", oldest.id, oldest.status.value
+                )
+
+    def _live(self, alert_id: str) -> Optional[Alert]:
+        """Cached alert by id, unless it has been resolved"""
+        if alert_id in self._resolved:
+            return None
+        return self.active_alerts.get(alert_id)
+
+    def _compact(self) -> None:
+        """Drop tombstoned (resolved) alerts from the cache and indexes"""
+        resolved, self._resolved = self._resolved, {}
+        alerts = self.active_alerts
+        for alert_id in resolved:
+            self._unindex(alerts[alert_id])
+        self.active_alerts = OrderedDict(
+            (alert_id, alert)
+            for alert_id, alert in alerts.items()
+            if alert_id not in resolved
+        )
+
+    def _count(self, alert: Alert, delta: int) -> None:
+        """Add (or remove) alert to the status/severity histograms"""
+        org = alert.organization_id
+        self._counts_by_org_status[(org, alert.status)] += delta
+        if alert.status in ACTIVE_STATUSES:
+            self._counts_by_org_severity[(org, alert.severity)] += delta
+
+    @_synchronized
+    def set_alert_status(self, alert: Alert, status: AlertStatus) -> None:
+        """Change alert status, keeping the stats histograms in step"""
+        tracked = self._live(alert.id) is alert
+        if tracked:
+            self._count(alert, -1)
+        alert.status = status
+        if tracked:
+            self._count(alert, 1)
+
+    @_synchronized
+    def iter_active_alerts(
+        self,
+        organization_id: str,
+        severity: Optional[AlertSeverity] = None,
+        alert_type: Optional[AlertType] = None,
+    ) -> Iterator[Alert]:
+        """Lazily yield active alerts with filters (candidates fixed at call time)"""
+        # Scan the smallest matching index bucket, check the other one
+        buckets = [
+            index.get((organization_id, value), {})
+            for index, value in (
+                (self._by_org_severity, severity),
+                (self._by_org_type, alert_type),
+            )
+            if value
+        ] or [self._by_org.get(organization_id, {})]
+        buckets.sort(key=len)
+        ids, others = buckets[0], buckets[1:]
+        # Snapshot ids under the lock; the generator runs without it
+        candidates = [aid for aid in ids if all(aid in other for other in others)]
+
+        # Status changes often, so it is checked per alert rather than indexed
+        return (
+            alert
+            for alert in map(self._live, candidates)
+            if alert is not None and alert.status in ACTIVE_STATUSES
+        )
+
+    @_synchronized
     def get_active_alerts(
         self,
         organization_id: str,
@@ -430,53 +827,31 @@ class AlertEngine:
         alert_type: Optional[AlertType] = None,
     ) -> List[Alert]:
         """Get active alerts with filters"""
-        alerts = [
-            alert
-            for alert in self.active_alerts.values()
-            if alert.organization_id == organization_id
-            and alert.status
-            in [AlertStatus.ACTIVE, AlertStatus.PENDING, AlertStatus.ACKNOWLEDGED]
-        ]
-
-        if severity:
-            alerts = [a for a in alerts if a.severity == severity]
-
-        if alert_type:
-            alerts = [a for a in alerts if a.type == alert_type]
-
-        return alerts
+        return list(self.iter_active_alerts(organization_id, severity, alert_type))
 
+    @_synchronized
     def get_stats(self, organization_id: str) -> Dict[str, Any]:
         """Get alert statistics for organization"""
-        active_alerts = self.get_active_alerts(organization_id)
+        org = organization_id
+        severity_counts = self._counts_by_org_severity
+        by_status = {
+            status: self._counts_by_org_status.get((org, status), 0)
+            for status in ACTIVE_STATUSES
+        }
 
         stats = {
-            "total_alerts": self.alert_counts[organization_id],
-            "active_alerts": len(active_alerts),
+            "total_alerts": self.alert_counts[org],
+            "active_alerts": sum(by_status.values()),
             "by_severity": {
-                "critical": len(
-                    [a for a in active_alerts if a.severity == AlertSeverity.CRITICAL]
-                ),
-                "high": len(
-                    [a for a in active_alerts if a.severity == AlertSeverity.HIGH]
-                ),
-                "medium": len(
-                    [a for a in active_alerts if a.severity == AlertSeverity.MEDIUM]
-                ),
-                "low": len(
-                    [a for a in active_alerts if a.severity == AlertSeverity.LOW]
-                ),
+                "critical": severity_counts.get((org, AlertSeverity.CRITICAL), 0),
+                "high": severity_counts.get((org, AlertSeverity.HIGH), 0),
+                "medium": severity_counts.get((org, AlertSeverity.MEDIUM), 0),
+                "low": severity_counts.get((org, AlertSeverity.LOW), 0),
             },
             "by_status": {
-                "pending": len(
-                    [a for a in active_alerts if a.status == AlertStatus.PENDING]
-                ),
-                "active": len(
-                    [a for a in active_alerts if a.status == AlertStatus.ACTIVE]
-                ),
-                "acknowledged": len(
-                    [a for a in active_alerts if a.status == AlertStatus.ACKNOWLEDGED]
-                ),
+                "pending": by_status[AlertStatus.PENDING],
+                "active": by_status[AlertStatus.ACTIVE],
+                "acknowledged": by_status[AlertStatus.ACKNOWLEDGED],
             },
         }
 
@@ -485,6 +860,7 @@ class AlertEngine:
 
 # Singleton instance
 _alert_engine: Optional[AlertEngine] = None
+_alert_engine_lock = threading.Lock()
 
 
 def get_alert_engine() -> AlertEngine:
@@ -492,6 +868,8 @@ def get_alert_engine() -> AlertEngine:
     global _alert_engine
 
     if _alert_engine is None:
-        _alert_engine = AlertEngine()
+        with _alert_engine_lock:
+            if _alert_engine is None:
+                _alert_engine = AlertEngine()
 
     return _alert_engine
@@ -3,19 +3,163 @@ HAZM TUWAIQ - Escalation Manager
 Automatic alert escalation based on time and severity
 """
 
+import asyncio
+import inspect
 import logging
+import math
 import threading
 import time
+from collections import defaultdict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from itertools import chain
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
 
+import numpy as np
+
+from .engine import get_alert_engine
 from .models import (
     Alert,
     AlertSeverity,
     AlertStatus,
+    AlertType,
     EscalationRule,
+    Notification,
     NotificationChannel,
 )
+from .notifications import get_notification_manager
+
+# Scheduled checks are grouped into buckets this wide and run together when
+# their bucket closes (at most one bucket late, never early)
+ESCALATION_TICK_SECONDS = 60
+
+# Recipients per provider call when a level sets no max_batch_size
+MAX_BATCH_SIZE = 1000
+
+# Escalations kept in EscalationLog before the oldest half is dropped
+ESCALATION_LOG_MAX = 1_000_000
+
+# Severity rank, lowest first (rule matches alerts at or above min_severity)
+SEVERITY_LEVEL: Dict[AlertSeverity, int] = {
+    severity: level
+    for level, severity in enumerate(
+        [
+            AlertSeverity.INFO,
+            AlertSeverity.LOW,
+            AlertSeverity.MEDIUM,
+            AlertSeverity.HIGH,
+            AlertSeverity.CRITICAL,
+        ]
+    )
+}
+
+
+def _freeze_level(level: Dict[str, Any]) -> Mapping[str, Any]:
+    """Read-only copy of one escalation level (list values become tuples)"""
+    return MappingProxyType(
+        {
+            key: tuple(value) if isinstance(value, list) else value
+            for key, value in level.items()
+        }
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class EscalationRuleCore:
+    """
+    Immutable in-memory copy of an EscalationRule, used for matching
+
+    is_active is left out: it is toggled in place, so it is always read
+    from the live rule (EscalationManager._is_active).
+    """
+
+    id: str
+    organization_id: str
+    alert_types: FrozenSet[AlertType]  # Empty = all types
+    min_level: int  # SEVERITY_LEVEL of min_severity
+    escalation_levels: Tuple[Mapping[str, Any], ...]  # Read-only copies
+
+    @classmethod
+    def from_pydantic(cls, rule: EscalationRule) -> "EscalationRuleCore":
+        """Snapshot a validated rule (ValueError on an unusable level)"""
+        for level in rule.escalation_levels:
+            batch_size = level.get("max_batch_size", MAX_BATCH_SIZE)
+            if not isinstance(batch_size, int) or batch_size < 1:
+                raise ValueError(
+                    f"Escalation rule {rule.id}: max_batch_size must be an "
+                    f"integer >= 1, got {batch_size!r}"
+                )
+
+        return cls(
+            id=rule.id,
+            organization_id=rule.organization_id,
+            alert_types=frozenset(rule.alert_types),
+            min_level=SEVERITY_LEVEL[rule.min_severity],
+            escalation_levels=tuple(
+                _freeze_level(level) for level in rule.escalation_levels
+            ),
+        )
+
+
+class EscalationLog:
+    """
+    Column store of escalation levels and times, for aggregate analytics
+    (e.g. how many alerts reached level 3 in the last hour)
+
+    Lossy by design: past max_entries the oldest half is dropped, so count()
+    only covers the retained window (`dropped` says how many fell out). The
+    per-alert record of who was notified is Alert.escalation_path.
+    """
+
+    def __init__(self, max_entries: int = ESCALATION_LOG_MAX):
+        self.max_entries = max_entries
+        self._level = np.empty(1024, dtype=np.int16)
+        self._escalated_at = np.empty(1024, dtype=np.float64)  # Epoch seconds
+        self._size = 0
+        self.dropped = 0  # Entries discarded to stay within max_entries
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def level(self) -> np.ndarray:
+        return self._level[: self._size]
+
+    @property
+    def escalated_at(self) -> np.ndarray:
+        return self._escalated_at[: self._size]
+
+    def append(self, level: int, escalated_at: datetime):
+        """Record one escalation (oldest half is dropped at max_entries)"""
+        with self._lock:
+            size = self._size
+            if size >= self.max_entries:
+                keep = size // 2
+                self._level[:keep] = self._level[size - keep : size]
+                self._escalated_at[:keep] = self._escalated_at[size - keep : size]
+                self.dropped += size - keep
+                size = keep
+            elif size == len(self._level):
+                self._level = np.resize(self._level, size * 2)
+                self._escalated_at = np.resize(self._escalated_at, size * 2)
+
+            self._level[size] = level
+            self._escalated_at[size] = escalated_at.timestamp()
+            self._size = size + 1
+
+    def count(
+        self, level: Optional[int] = None, since: Optional[datetime] = None
+    ) -> int:
+        """Retained escalations, optionally at one level and/or since a time"""
+        with self._lock:
+            mask = np.ones(len(self), dtype=bool)
+            if level is not None:
+                mask &= self.level == level
+            if since is not None:
+                mask &= self.escalated_at >= since.timestamp()
+            return int(np.count_nonzero(mask))
 
 
 class EscalationManager:
@@ -31,20 +175,64 @@ class EscalationManager:
         # Escalation rules
         self.rules: Dict[str, EscalationRule] = {}
 
-        # Escalation tracking
-        self.escalation_timers: Dict[str, threading.Timer] = {}
+        # Frozen copies used for matching (re-add a rule to apply changes
+        # other than is_active):
+        # by id, per organization (in self.rules order), and per
+        # (organization, alert type) - built on first lookup, cleared by add_rule
+        self._cores: Dict[str, EscalationRuleCore] = {}
+        self._rules_by_org: Dict[str, List[EscalationRuleCore]] = {}
+        self._rules_by_org_type: Dict[
+            Tuple[str, AlertType], List[EscalationRuleCore]
+        ] = {}
+
+        # Contact dicts ('id', '<channel>_contact') by user id, used to
+        # deliver escalation notifications
+        self.user_contacts: Dict[str, Dict[str, str]] = {}
+
+        # Levels and times of executed escalations, for aggregate queries
+        self.escalation_log = EscalationLog()
+
+        # Escalation tracking: alert id -> (due bucket, alert, callback), and
+        # bucket -> alert ids due then (stale ids are skipped when drained).
+        # Both belong to the scheduler loop
+        self.escalation_timers: Dict[str, Tuple[int, Alert, Callable]] = {}
+        self._buckets: Dict[int, List[str]] = defaultdict(list)
+        self._tick_task: Optional[asyncio.Task] = None
+
+        # One event loop thread runs every scheduled check and the monitor
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
 
         # Background monitoring
         self.monitoring = False
-        self.monitor_thread: Optional[threading.Thread] = None
+        self.monitor_task: Optional[asyncio.Task] = None
 
     def add_rule(self, rule: EscalationRule):
-        """Add escalation rule"""
+        """Add escalation rule (ValueError if its levels are invalid)"""
+        core = EscalationRuleCore.from_pydantic(rule)
+        old = self.rules.get(rule.id)
         self.rules[rule.id] = rule
+        self._cores[rule.id] = core
+
+        # Re-derive the affected organizations' lists (rules are added rarely)
+        orgs = {rule.organization_id}
+        if old is not None:
+            orgs.add(old.organization_id)
+        for org in orgs:
+            self._rules_by_org[org] = [
+                r for r in self._cores.values() if r.organization_id == org
+            ]
+        self._rules_by_org_type.clear()
+
         self.logger.info(f"Escalation rule added: {rule.name}")
 
     def check_escalation(
-        self, alert: Alert, organization_users: Dict[str, Any]
+        self,
+        alert: Alert,
+        organization_users: Dict[str, Any],
+        *,
+        now: Optional[datetime] = None,
     ) -> Optional[Dict[str, Any]]:
         """
         Check if alert should be escalated
@@ -52,15 +240,18 @@ class EscalationManager:
         Args:
             alert: Alert to check
             organization_users: Dict of organization users by role
+            now: Current time (pass one reading for a whole sweep)
 
         Returns:
             Escalation info if escalation triggered, None otherwise
         """
         try:
+            now = now or datetime.now()
+
             # Find matching rule
             rule = self._find_matching_rule(alert)
 
-            if not rule or not rule.is_active:
+            if not rule or not self._is_active(rule):
                 return None
 
             # Check if already at max escalation level
@@ -76,16 +267,14 @@ class EscalationManager:
             # Check if enough time has passed
             if alert.escalation_level == 0:
                 # First escalation - check time since creation
-                time_since_creation = datetime.now() - alert.created_at
+                time_since_creation = now - alert.created_at
                 delay = timedelta(minutes=next_level.get("delay_minutes", 15))
 
                 if time_since_creation < delay:
                     return None
             else:
                 # Subsequent escalation - check time since last escalation
-                time_since_escalation = datetime.now() - (
-                    alert.escalated_at or alert.created_at
-                )
+                time_since_escalation = now - (alert.escalated_at or alert.created_at)
                 delay = timedelta(minutes=next_level.get("delay_minutes", 15))
 
                 if time_since_escalation < delay:
@@ -101,6 +290,7 @@ class EscalationManager:
                 level=next_level,
                 rule=rule,
                 organization_users=organization_users,
+                now=now,
             )
 
             return escalation_info
@@ -109,43 +299,103 @@ class EscalationManager:
             self.logger.error(f"Failed to check escalation: {e}")
             return None
 
-    def _find_matching_rule(self, alert: Alert) -> Optional[EscalationRule]:
-        """Find escalation rule matching alert"""
-        for rule in self.rules.values():
-            # Check organization
-            if rule.organization_id != alert.organization_id:
-                continue
+    def check_escalations_bulk(
+        self, alerts: List[Alert], organization_users: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        Check many alerts for escalation in one sweep
+
+        Same conditions as `check_escalation`; the due-time comparison runs
+        as one NumPy operation over all candidates.
+
+        Args:
+            alerts: Alerts to check
+            organization_users: Dict of organization users by role
 
-            # Check alert type (empty list = all types)
-            if rule.alert_types and alert.type not in rule.alert_types:
+        Returns:
+            Escalation info for each alert that was escalated
+        """
+        # Unresolved alerts with an active rule and a next level left
+        candidates = []
+        for alert in alerts:
+            if alert.status not in (AlertStatus.ACTIVE, AlertStatus.ACKNOWLEDGED):
+                continue
+            rule = self._find_matching_rule(alert)
+            if not rule or not self._is_active(rule):
+                continue
+            if alert.escalation_level >= len(rule.escalation_levels):
                 continue
+            candidates.append(
+                (alert, rule, rule.escalation_levels[alert.escalation_level])
+            )
+        if not candidates:
+            return []
+
+        count = len(candidates)
+        # Time since creation (first escalation) or since the last escalation
+        since = np.fromiter(
+            (
+                (
+                    alert.created_at
+                    if alert.escalation_level == 0
+                    else alert.escalated_at or alert.created_at
+                ).timestamp()
+                for alert, _, _ in candidates
+            ),
+            dtype=np.float64,
+            count=count,
+        )
+        delays = np.fromiter(
+            (level.get("delay_minutes", 15) * 60 for _, _, level in candidates),
+            dtype=np.float64,
+            count=count,
+        )
+        now = datetime.now()
+        due = now.timestamp() - since >= delays
 
-            # Check severity
-            severity_order = [
-                AlertSeverity.INFO,
-                AlertSeverity.LOW,
-                AlertSeverity.MEDIUM,
-                AlertSeverity.HIGH,
-                AlertSeverity.CRITICAL,
-            ]
+        return [
+            self._execute_escalation(
+                alert=alert,
+                level=level,
+                rule=rule,
+                organization_users=organization_users,
+                now=now,
+            )
+            for alert, rule, level in (
+                candidates[i] for i in np.flatnonzero(due).tolist()
+            )
+        ]
 
-            min_severity_idx = severity_order.index(rule.min_severity)
-            alert_severity_idx = severity_order.index(alert.severity)
+    def _is_active(self, rule: EscalationRuleCore) -> bool:
+        """Whether the live rule behind a snapshot is currently active"""
+        return self.rules[rule.id].is_active
 
-            if alert_severity_idx < min_severity_idx:
-                continue
+    def _find_matching_rule(self, alert: Alert) -> Optional[EscalationRuleCore]:
+        """Find escalation rule matching alert"""
+        key = (alert.organization_id, alert.type)
+        candidates = self._rules_by_org_type.get(key)
+        if candidates is None:
+            # Empty alert_types = all types
+            candidates = self._rules_by_org_type[key] = [
+                rule
+                for rule in self._rules_by_org.get(alert.organization_id, ())
+                if not rule.alert_types or alert.type in rule.alert_types
+            ]
 
-            # Match found
-            return rule
+        alert_level = SEVERITY_LEVEL[alert.severity]
+        for rule in candidates:
+            if alert_level >= rule.min_level:
+                return rule
 
         return None
 
     def _execute_escalation(
         self,
         alert: Alert,
-        level: Dict[str, Any],
-        rule: EscalationRule,
+        level: Mapping[str, Any],
+        rule: EscalationRuleCore,
         organization_users: Dict[str, Any],
+        now: Optional[datetime] = None,
     ) -> Dict[str, Any]:
         """Execute escalation for specific level"""
         try:
@@ -153,24 +403,24 @@ class EscalationManager:
 
             # Update alert
             alert.escalation_level = level_num
-            alert.escalated_at = datetime.now()
-            alert.status = AlertStatus.ESCALATED
+            now = now or datetime.now()
+            alert.escalated_at = now
+            get_alert_engine().set_alert_status(alert, AlertStatus.ESCALATED)
 
-            # Get recipients for this level
-            recipients = []
-
-            # Add users by role
+            # Get recipients for this level: users by role, then specific
+            # users, without duplicates (first occurrence keeps its place)
             notify_roles = level.get("notify_roles", [])
-            for role in notify_roles:
-                role_users = organization_users.get(role, [])
-                recipients.extend(role_users)
-
-            # Add specific users
             notify_users = level.get("notify_users", [])
-            recipients.extend(notify_users)
-
-            # Remove duplicates
-            recipients = list(set(recipients))
+            recipients = list(
+                dict.fromkeys(
+                    chain(
+                        chain.from_iterable(
+                            organization_users.get(role, ()) for role in notify_roles
+                        ),
+                        notify_users,
+                    )
+                )
+            )
 
             # Get notification channels (default: all)
             channels = level.get(
@@ -182,34 +432,57 @@ class EscalationManager:
                 ],
             )
 
+            # Recipients per channel, split into provider-sized batches so
+            # the notification layer makes one send per batch
+            batch_size = level.get("max_batch_size", MAX_BATCH_SIZE)
+            channel_batches = {
+                channel: [
+                    recipients[i : i + batch_size]
+                    for i in range(0, len(recipients), batch_size)
+                ]
+                for channel in channels
+            }
+
+            notifications = self._dispatch(alert, channel_batches)
+
+            # Channel values, shared by the path entry and the log line
+            channel_names = [
+                c.value if isinstance(c, NotificationChannel) else c for c in channels
+            ]
+
             # Execute additional actions
             actions = level.get("actions", [])
 
             # Add to escalation path
             escalation_entry = {
                 "level": level_num,
-                "escalated_at": datetime.now().isoformat(),
+                "escalated_at": now.isoformat(),
                 "rule_id": rule.id,
                 "recipients": recipients,
-                "channels": [c.value if hasattr(c, "value") else c for c in channels],
+                "channels": channel_names,
                 "actions": actions,
             }
 
             alert.escalation_path.append(escalation_entry)
-
-            self.logger.warning(
-                f"🚨 ALERT ESCALATED\n"
-                f"   Alert: {alert.id}\n"
-                f"   Level: {level_num}\n"
-                f"   Recipients: {len(recipients)}\n"
-                f"   Channels: {[c.value if hasattr(c, 'value') else c for c in channels]}"
-            )
+            alert.mark_changed()
+            self.escalation_log.append(level_num, now)
+
+            if self.logger.isEnabledFor(logging.WARNING):
+                self.logger.warning(
+                    f"🚨 ALERT ESCALATED\n"
+                    f"   Alert: {alert.id}\n"
+                    f"   Level: {level_num}\n"
+                    f"   Recipients: {len(recipients)}\n"
+                    f"   Channels: {channel_names}"
+                )
 
             return {
                 "escalated": True,
                 "level": level_num,
                 "recipients": recipients,
                 "channels": channels,
+                "channel_batches": channel_batches,
+                "notifications_sent": len(notifications),
                 "actions": actions,
                 "escalation_entry": escalation_entry,
             }
@@ -218,6 +491,55 @@ class EscalationManager:
             self.logger.error(f"Failed to execute escalation: {e}")
             return {"escalated": False, "error": str(e)}
 
+    def register_contacts(self, users: List[Dict[str, str]]):
+        """Add or replace the contact details of users by their 'id'"""
+        for user in users:
+            self.user_contacts[user["id"]] = user
+
+    def _dispatch(
+        self, alert: Alert, channel_batches: Dict[Any, List[List[str]]]
+    ) -> List[Notification]:
+        """Send each recipient batch with one notification call per channel"""
+        notification_manager = get_notification_manager()
+        notifications = []
+        for channel, batches in channel_batches.items():
+            channel = NotificationChannel(channel)
+            for batch in batches:
+                notifications.extend(
+                    notification_manager.send_batch_notification(
+                        alert,
+                        channel,
+                        [
+                            self.user_contacts.get(user_id, {"id": user_id})
+                            for user_id in batch
+                        ],
+                    )
+                )
+        return notifications
+
+    def _scheduler(self) -> asyncio.AbstractEventLoop:
+        """Event loop shared by all escalation timers (started on first use)"""
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._loop_thread = threading.Thread(
+                        target=loop.run_forever,
+                        name="escalation-scheduler",
+                        daemon=True,
+                    )
+                    self._loop_thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def _call(self, func: Callable, *args: Any) -> None:
+        """Run func on the scheduler loop (directly when already on it)"""
+        loop = self._scheduler()
+        if threading.current_thread() is self._loop_thread:
+            func(*args)
+        else:
+            loop.call_soon_threadsafe(func, *args)
+
     def schedule_escalation_check(
         self, alert: Alert, delay_minutes: int, callback: callable
     ):
@@ -227,22 +549,10 @@ class EscalationManager:
         Args:
             alert: Alert to monitor
             delay_minutes: Minutes to wait before checking
-            callback: Function to call for escalation
+            callback: Function (or coroutine function) to call for escalation
         """
         try:
-            # Cancel existing timer if any
-            if alert.id in self.escalation_timers:
-                self.escalation_timers[alert.id].cancel()
-
-            # Create new timer
-            delay_seconds = delay_minutes * 60
-            timer = threading.Timer(delay_seconds, callback, args=[alert])
-
-            # Start timer
-            timer.start()
-
-            # Store timer
-            self.escalation_timers[alert.id] = timer
+            self._call(self._schedule, alert, delay_minutes * 60, callback)
 
             self.logger.info(
                 f"Escalation check scheduled for alert {alert.id} in {delay_minutes} minutes"
@@ -251,58 +561,159 @@ class EscalationManager:
         except Exception as e:
             self.logger.error(f"Failed to schedule escalation: {e}")
 
+    def _schedule(self, alert: Alert, delay_seconds: float, callback: Callable):
+        """Put the alert in its due bucket, replacing any earlier check"""
+        bucket = math.ceil((time.time() + delay_seconds) / ESCALATION_TICK_SECONDS)
+        self.escalation_timers[alert.id] = (bucket, alert, callback)
+        self._buckets[bucket].append(alert.id)
+        if self._tick_task is None:
+            self._tick_task = self._loop.create_task(self._tick())
+
+    async def _tick(self):
+        """Wake at each bucket boundary and run the checks that came due"""
+        while True:
+            tick = ESCALATION_TICK_SECONDS
+            await asyncio.sleep(tick - time.time() % tick)
+            current = math.floor(time.time() / tick)
+
+            pending = []
+            for bucket in sorted(b for b in self._buckets if b <= current):
+                for alert_id in self._buckets.pop(bucket):
+                    entry = self.escalation_timers.get(alert_id)
+                    if entry is None or entry[0] != bucket:
+                        continue  # Cancelled or rescheduled
+                    del self.escalation_timers[alert_id]
+                    _, alert, callback = entry
+                    try:
+                        result = callback(alert)
+                    except Exception as e:
+                        self._log_check_error(alert, e)
+                        continue
+                    if inspect.isawaitable(result):
+                        pending.append((alert, result))
+
+            if pending:
+                results = await asyncio.gather(
+                    *(result for _, result in pending), return_exceptions=True
+                )
+                for (alert, _), result in zip(pending, results):
+                    if isinstance(result, Exception):
+                        self._log_check_error(alert, result)
+
+    def _log_check_error(self, alert: Alert, error: Exception):
+        """Log a failed escalation check"""
+        self.logger.error(f"Escalation check failed for alert {alert.id}: {error}")
+
     def cancel_escalation(self, alert_id: str):
         """Cancel scheduled escalation for alert"""
-        if alert_id in self.escalation_timers:
-            self.escalation_timers[alert_id].cancel()
-            del self.escalation_timers[alert_id]
+        # Always posted: a _schedule queued just before may not have run yet,
+        # and escalation_timers is only read on the scheduler loop
+        self._call(self._cancel, alert_id)
+
+    def _cancel(self, alert_id: str):
+        """Forget the alert's check; its bucket entry is skipped when drained"""
+        if self.escalation_timers.pop(alert_id, None) is not None:
             self.logger.info(f"Escalation cancelled for alert {alert_id}")
 
-    def start_monitoring(self, check_interval_seconds: int = 60):
+    def start_monitoring(
+        self,
+        check_interval_seconds: int = 60,
+        organization_users: Optional[Dict[str, Any]] = None,
+    ):
         """
         Start background escalation monitoring
 
+        Each sweep checks the active alerts of every organization with
+        escalation rules through `check_escalations_bulk`.
+
         Args:
             check_interval_seconds: Interval between checks
+            organization_users: Dict of organization users by role
         """
         if self.monitoring:
             self.logger.warning("Escalation monitoring already running")
             return
 
         self.monitoring = True
-
-        def monitor_loop():
-            while self.monitoring:
-                try:
-                    self.logger.debug("Running escalation check...")
-                    # In production, check all active alerts here
-                    time.sleep(check_interval_seconds)
-
-                except Exception as e:
-                    self.logger.error(f"Error in escalation monitoring: {e}")
-
-        # Start monitoring thread
-        self.monitor_thread = threading.Thread(target=monitor_loop, daemon=True)
-        self.monitor_thread.start()
+        self._call(
+            self._start_monitor, check_interval_seconds, organization_users or {}
+        )
 
         self.logger.info(
             f"Escalation monitoring started (interval: {check_interval_seconds}s)"
         )
 
+    def _start_monitor(
+        self, check_interval_seconds: int, organization_users: Dict[str, Any]
+    ):
+        """Start the monitor coroutine (scheduler loop only)"""
+        self.monitor_task = self._loop.create_task(
+            self._monitor(check_interval_seconds, organization_users)
+        )
+
+    async def _monitor(
+        self, check_interval_seconds: int, organization_users: Dict[str, Any]
+    ):
+        """Periodic escalation sweep"""
+        while self.monitoring:
+            try:
+                self.logger.debug("Running escalation check...")
+                self.sweep_escalations(organization_users)
+                await asyncio.sleep(check_interval_seconds)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Error in escalation monitoring: {e}")
+                await asyncio.sleep(check_interval_seconds)
+
+    def sweep_escalations(
+        self, organization_users: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        Escalate every due active alert of the organizations with rules
+
+        Args:
+            organization_users: Dict of organization users by role
+
+        Returns:
+            Escalation info for each alert that was escalated
+        """
+        engine = get_alert_engine()
+        alerts = [
+            alert
+            for organization_id in list(self._rules_by_org)
+            for alert in engine.get_active_alerts(organization_id)
+        ]
+        return self.check_escalations_bulk(alerts, organization_users)
+
     def stop_monitoring(self):
         """Stop background monitoring"""
         self.monitoring = False
 
-        if self.monitor_thread:
-            self.monitor_thread.join(timeout=5)
+        if self._loop is not None:
+            if threading.current_thread() is self._loop_thread:
+                self._stop()
+            else:
+                done = threading.Event()
+                self._loop.call_soon_threadsafe(lambda: (self._stop(), done.set()))
+                done.wait(timeout=5)
+
+        self.logger.info("Escalation monitoring stopped")
+
+    def _stop(self):
+        """Cancel the monitor and every timer (scheduler loop only)"""
+        if self.monitor_task is not None:
+            self.monitor_task.cancel()
+            self.monitor_task = None
 
         # Cancel all timers
-        for timer in self.escalation_timers.values():
-            timer.cancel()
+        if self._tick_task is not None:
+            self._tick_task.cancel()
+            self._tick_task = None
 
         self.escalation_timers.clear()
-
-        self.logger.info("Escalation monitoring stopped")
+        self._buckets.clear()
 
     def get_stats(self) -> Dict[str, Any]:
         """Get escalation statistics"""
@@ -310,6 +721,7 @@ class EscalationManager:
             "total_rules": len(self.rules),
             "active_rules": len([r for r in self.rules.values() if r.is_active]),
             "scheduled_escalations": len(self.escalation_timers),
+            "escalations_total": len(self.escalation_log) + self.escalation_log.dropped,
             "monitoring_active": self.monitoring,
         }
 
@@ -3,12 +3,13 @@ HAZM TUWAIQ - Alert Models
 Alert types, rules, and escalation definitions
 """
 
+import copy
 import uuid
 from datetime import datetime
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 # ═══════════════════════════════════════════════════════════
 # ENUMS
@@ -85,6 +86,12 @@ class NotificationChannel(str, Enum):
 # ═══════════════════════════════════════════════════════════
 
 
+# Alert fields holding lists of scalars (shallow copies are independent)
+_ALERT_LIST_FIELDS = ("evidence", "actions_taken", "autonomous_actions")
+# Alert fields that may nest dicts and lists (copied deeply)
+_ALERT_NESTED_FIELDS = ("metadata", "escalation_path", "notifications_sent")
+
+
 class Alert(BaseModel):
     """
     التنبيه - Alert
@@ -146,6 +153,38 @@ class Alert(BaseModel):
     # Notifications
     notifications_sent: List[Dict[str, Any]] = Field(default_factory=list)
 
+    # Cached model_dump(); cleared on field assignment or mark_changed()
+    _dict_cache: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if not name.startswith("_"):
+            self._dict_cache = None
+
+    def mark_changed(self) -> None:
+        """Drop the cached dump after in-place edits (e.g. list appends)"""
+        self._dict_cache = None
+
+    def cached_dump(self) -> Dict[str, Any]:
+        """
+        model_dump(), cached until the alert changes
+
+        Every call returns a fresh dict whose list and dict fields are copies
+        too (escalation entries and metadata deeply), so callers may edit it
+        without touching the cache or the alert.
+        """
+        if self._dict_cache is None:
+            self._dict_cache = self.model_dump()
+
+        dump = dict(self._dict_cache)
+        for name in _ALERT_LIST_FIELDS:
+            dump[name] = list(dump[name])
+        if dump["coordinates"] is not None:
+            dump["coordinates"] = dict(dump["coordinates"])
+        for name in _ALERT_NESTED_FIELDS:
+            dump[name] = copy.deepcopy(dump[name])
+        return dump
+
     class Config:
         json_schema_extra = {
             "example": {
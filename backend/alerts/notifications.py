@@ -18,6 +18,9 @@ from .models import Alert, AlertSeverity, Notification, NotificationChannel
 class NotificationChannelBase(ABC):
     """قناة إشعار - Base class for notification channels"""
 
+    # Recipients the provider accepts in one batched call
+    max_batch_size = 1
+
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
 
@@ -43,6 +46,26 @@ class NotificationChannelBase(ABC):
         """
         pass
 
+    def send_batch(
+        self,
+        recipients: List[str],
+        subject: str,
+        message: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[bool, Optional[str], Optional[str]]]:
+        """
+        Send the same notification to a batch of recipients
+
+        Providers with a batch endpoint override this with a single call;
+        the default sends one by one.
+
+        Returns:
+            One (success, provider_id, error_message) per recipient
+        """
+        return [
+            self.send(recipient, subject, message, metadata) for recipient in recipients
+        ]
+
     @abstractmethod
     def get_channel_type(self) -> NotificationChannel:
         """Get channel type"""
@@ -60,6 +83,9 @@ class SMSChannel(NotificationChannelBase):
     Production implementation would use Twilio, AWS SNS, or similar
     """
 
+    # Twilio Notify accepts up to 10,000 bindings; stay well under it
+    max_batch_size = 1000
+
     def __init__(
         self,
         account_sid: Optional[str] = None,
@@ -125,6 +151,48 @@ class SMSChannel(NotificationChannelBase):
             self.logger.error(f"Failed to send SMS: {e}")
             return False, None, str(e)
 
+    def send_batch(
+        self,
+        recipients: List[str],
+        subject: str,
+        message: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[bool, Optional[str], Optional[str]]]:
+        """Send one SMS to every recipient with a single batch request"""
+        try:
+            numbers = [r if r.startswith("+") else f"+{r}" for r in recipients]
+
+            max_length = 160
+            if len(message) > max_length:
+                message = message[: max_length - 3] + "..."
+
+            # PRODUCTION CODE (commented):
+            # notification = self.client.notify.services(service_sid) \
+            #     .notifications.create(
+            #         to_binding=[
+            #             json.dumps({"binding_type": "sms", "address": n})
+            #             for n in numbers
+            #         ],
+            #         body=message,
+            #     )
+            # return [(True, notification.sid, None)] * len(numbers)
+
+            # SIMULATION (for development):
+            provider_id = f"SMS-BATCH-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+            self.logger.info(
+                f"📱 SMS BATCH SENT\n"
+                f"   To: {len(numbers)} recipients\n"
+                f"   Message: {message}\n"
+                f"   Provider ID: {provider_id}"
+            )
+
+            return [(True, provider_id, None)] * len(numbers)
+
+        except Exception as e:
+            self.logger.error(f"Failed to send SMS batch: {e}")
+            return [(False, None, str(e))] * len(recipients)
+
     def get_channel_type(self) -> NotificationChannel:
         return NotificationChannel.SMS
 
@@ -140,6 +208,9 @@ class EmailChannel(NotificationChannelBase):
     Production implementation would use SendGrid, AWS SES, or SMTP
     """
 
+    # SendGrid allows 1000 recipients (to + cc + bcc) per message
+    max_batch_size = 1000
+
     def __init__(
         self,
         api_key: Optional[str] = None,
@@ -202,6 +273,48 @@ class EmailChannel(NotificationChannelBase):
             self.logger.error(f"Failed to send email: {e}")
             return False, None, str(e)
 
+    def send_batch(
+        self,
+        recipients: List[str],
+        subject: str,
+        message: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[bool, Optional[str], Optional[str]]]:
+        """Send one email with every recipient in BCC"""
+        try:
+            html_message = self._build_html_email(subject, message, metadata)
+
+            # PRODUCTION CODE (commented):
+            # from sendgrid.helpers.mail import Bcc, Mail
+            # email = Mail(
+            #     from_email=self.from_email,
+            #     to_emails=self.from_email,
+            #     subject=subject,
+            #     html_content=html_message
+            # )
+            # for recipient in recipients:
+            #     email.add_bcc(Bcc(recipient))
+            # response = self.client.send(email)
+            # provider_id = response.headers.get('X-Message-Id')
+            # return [(True, provider_id, None)] * len(recipients)
+
+            # SIMULATION (for development):
+            provider_id = f"EMAIL-BATCH-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+            self.logger.info(
+                f"📧 EMAIL BATCH SENT\n"
+                f"   Bcc: {len(recipients)} recipients\n"
+                f"   Subject: {subject}\n"
+                f"   Size: {len(html_message)} chars\n"
+                f"   Provider ID: {provider_id}"
+            )
+
+            return [(True, provider_id, None)] * len(recipients)
+
+        except Exception as e:
+            self.logger.error(f"Failed to send email batch: {e}")
+            return [(False, None, str(e))] * len(recipients)
+
     def _build_html_email(
         self, subject: str, message: str, metadata: Optional[Dict[str, Any]] = None
     ) -> str:
@@ -449,125 +562,129 @@ class NotificationManager:
         """
         Send alert notification to multiple recipients via multiple channels
 
+        Each channel gets one batched send (see send_batch_notification).
+
         Args:
             alert: Alert object
             recipients: List of recipient dicts with 'id', 'contact', 'channel'
             channels: Channels to use
 
+        Returns:
+            List of created notifications
+        """
+        notifications = []
+        for channel in channels:
+            notifications.extend(
+                self.send_batch_notification(
+                    alert, NotificationChannel(channel), recipients
+                )
+            )
+        return notifications
+
+    def send_batch_notification(
+        self,
+        alert: Alert,
+        channel: NotificationChannel,
+        recipients: List[Dict[str, str]],
+    ) -> List[Notification]:
+        """
+        Send an alert to many recipients over one channel
+
+        Recipients without a contact for the channel are skipped. The rest go
+        out in provider-sized batches through the channel's send_batch; a
+        lone recipient takes the single-send path.
+
+        Args:
+            alert: Alert object
+            channel: Channel to use
+            recipients: List of recipient dicts with 'id' and '<channel>_contact'
+
         Returns:
             List of created notifications
         """
         notifications = []
 
         try:
-            # Build message
             subject = self._build_subject(alert)
             message = self._build_message(alert)
+            metadata = {
+                "alert_id": alert.id,
+                "severity": alert.severity.value,
+                "camera_id": alert.camera_id,
+            }
+
+            # Get recipient contacts for this channel
+            contact_key = f"{channel.value}_contact"
+            targets = [
+                (recipient_info.get("id"), recipient_info[contact_key])
+                for recipient_info in recipients
+                if recipient_info.get(contact_key)
+            ]
+            if not targets:
+                return notifications
 
-            # Send to each recipient via each channel
-            for recipient_info in recipients:
-                for channel in channels:
-                    # Get recipient contact for this channel
-                    contact = recipient_info.get(f"{channel.value}_contact")
-
-                    if not contact:
-                        continue
+            channel_handler = self.channels.get(channel)
+            batch_size = channel_handler.max_batch_size if channel_handler else 1
+
+            for start in range(0, len(targets), batch_size):
+                batch = targets[start : start + batch_size]
+                contacts = [contact for _, contact in batch]
+
+                if not channel_handler:
+                    results = [
+                        (False, None, f"Channel {channel.value} not configured")
+                    ] * len(batch)
+                elif len(batch) == 1:
+                    results = [
+                        channel_handler.send(contacts[0], subject, message, metadata)
+                    ]
+                else:
+                    results = channel_handler.send_batch(
+                        contacts, subject, message, metadata
+                    )
 
-                    # Send notification
-                    notification = self._send_notification(
-                        alert=alert,
+                sent_at = datetime.now() if channel_handler else None
+                for (recipient_id, contact), (success, provider_id, error) in zip(
+                    batch, results
+                ):
+                    notification = Notification(
+                        alert_id=alert.id,
                         channel=channel,
-                        recipient_id=recipient_info.get("id"),
+                        recipient_id=recipient_id,
                         recipient_contact=contact,
                         subject=subject,
                         message=message,
+                        status="sent" if success else "failed",
+                        sent_at=sent_at,
+                    )
+                    if success:
+                        notification.provider_id = provider_id
+                        # Simulate delivery
+                        notification.delivered_at = sent_at
+                    else:
+                        notification.error = error
+
+                    if channel_handler:
+                        # Store notification
+                        self.notifications[notification.id] = notification
+                    notifications.append(notification)
+
+                    # Add to alert
+                    alert.notifications_sent.append(
+                        {
+                            "notification_id": notification.id,
+                            "channel": channel.value,
+                            "sent_at": sent_at.isoformat() if sent_at else None,
+                        }
                     )
 
-                    if notification:
-                        notifications.append(notification)
-
-                        # Add to alert
-                        alert.notifications_sent.append(
-                            {
-                                "notification_id": notification.id,
-                                "channel": channel.value,
-                                "sent_at": (
-                                    notification.sent_at.isoformat()
-                                    if notification.sent_at
-                                    else None
-                                ),
-                            }
-                        )
-
+            alert.mark_changed()
             return notifications
 
         except Exception as e:
             self.logger.error(f"Failed to send alert notifications: {e}")
             return notifications
 
-    def _send_notification(
-        self,
-        alert: Alert,
-        channel: NotificationChannel,
-        recipient_id: str,
-        recipient_contact: str,
-        subject: str,
-        message: str,
-    ) -> Optional[Notification]:
-        """Send single notification"""
-        try:
-            # Create notification record
-            notification = Notification(
-                alert_id=alert.id,
-                channel=channel,
-                recipient_id=recipient_id,
-                recipient_contact=recipient_contact,
-                subject=subject,
-                message=message,
-                status="pending",
-            )
-
-            # Get channel handler
-            channel_handler = self.channels.get(channel)
-
-            if not channel_handler:
-                notification.status = "failed"
-                notification.error = f"Channel {channel.value} not configured"
-                return notification
-
-            # Send via channel
-            success, provider_id, error = channel_handler.send(
-                recipient=recipient_contact,
-                subject=subject,
-                message=message,
-                metadata={
-                    "alert_id": alert.id,
-                    "severity": alert.severity.value,
-                    "camera_id": alert.camera_id,
-                },
-            )
-
-            # Update notification
-            notification.sent_at = datetime.now()
-
-            if success:
-                notification.status = "sent"
-                notification.provider_id = provider_id
-                # Simulate delivery
-                notification.delivered_at = datetime.now()
-            else:
-                notification.status = "failed"
-                notification.error = error
-
-            # Store notification
-            self.notifications[notification.id] = notification
-
-            return notification
-
-        except Exception as e:
-            self.logger.error(f"Failed to send notification: {e}")
-            return None
-
     def _build_subject(self, alert: Alert) -> str:
         """Build notification subject"""
         severity_emoji = {
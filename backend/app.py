@@ -18,7 +18,7 @@ import report_generator
 from dotenv import load_dotenv
 from fastapi import FastAPI, File, Header, HTTPException, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from starlette.concurrency import run_in_threadpool
 
@@ -807,13 +807,29 @@ def list_uploads(x_api_key: Optional[str] = Header(default=None)):
 # =========================
 # Detection (AI / Camera)
 # =========================
-@app.post("/detect", response_model=DetectionResult)
+@app.post(
+    "/detect",
+    response_model=DetectionResult,
+    responses={
+        200: {
+            "content": {"image/jpeg": {}},
+            "description": "DetectionResult JSON, or with annotate=true and "
+            "annotate_format=jpeg the annotated frame itself (detection id in "
+            "the X-Detection-Id header, result in /detections)",
+        }
+    },
+)
 async def detect_frame(
     payload: DetectionRequest,
     tracked: bool = Query(False, description="Assign track ids when possible"),
     annotate: bool = Query(
         False, description="Return annotated JPEG as base64 in raw.annotated_b64"
     ),
+    annotate_format: str = Query(
+        "b64",
+        pattern="^(b64|jpeg)$",
+        description="jpeg: respond with the annotated image/jpeg body itself",
+    ),
     camera_id: Optional[str] = Query(
         None, description="Optional camera id for tracking context"
     ),
@@ -851,6 +867,7 @@ async def detect_frame(
                 bool(tracked),
                 bool(annotate),
                 camera_id,
+                annotate_format=annotate_format,
             )
         else:
             result = await run_in_threadpool(ai_engine.detect_frame, image_data, conf)
@@ -897,6 +914,15 @@ async def detect_frame(
         logger.info(
             f"Detection completed: {det_id} - {len(detection.objects)} objects detected"
         )
+
+        # Raw JPEG body (no base64 inflation); detection stays in /detections
+        annotated_jpeg = (result.get("raw") or {}).get("annotated_jpeg")
+        if annotated_jpeg:
+            return Response(
+                content=annotated_jpeg,
+                media_type="image/jpeg",
+                headers={"X-Detection-Id": det_id},
+            )
         return detection
 
     except HTTPException:
@@ -180,19 +180,8 @@ class CameraWorker(threading.Thread):
                     time.sleep(reconnect_delay)
                     continue
 
-                # encode frame to JPEG bytes
-                try:
-                    cv2 = _get_cv2()  # Lazy import
-                    ok, buf = cv2.imencode(".jpg", frame)
-                    if not ok:
-                        time.sleep(frame_interval)
-                        continue
-                    frame_bytes = buf.tobytes()
-                except Exception:
-                    frame_bytes = b""
-
-                # process detection
-                self._process_frame(frame_bytes)
+                # process detection (the decoded frame goes straight to the model)
+                self._process_frame(frame)
 
                 # throttle by fps
                 time.sleep(frame_interval)
@@ -209,10 +198,10 @@ class CameraWorker(threading.Thread):
         except Exception:
             pass
 
-    def _process_frame(self, frame_bytes: bytes) -> None:
+    def _process_frame(self, frame: Any) -> None:
         try:
             result = ai_engine.detect_frame(
-                frame_bytes, conf_thresh=float(os.getenv("YOLO_CONF", "0.25"))
+                frame, conf_thresh=float(os.getenv("YOLO_CONF", "0.25"))
             )
             objects = result.get("objects", []) if isinstance(result, dict) else []
             ts = (
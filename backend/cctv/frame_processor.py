@@ -29,6 +29,7 @@ sys.path.insert(0, str(backend_path))
 
 from ai_core.fatigue_detection import get_fatigue_detector
 from ai_core.intent_detection import get_intent_detector
+from ai_core.model_backends import upload_frame
 from ai_core.pose_estimation import get_pose_estimator
 from ai_core.yolo_engine import get_yolo_engine
 
@@ -86,46 +87,61 @@ class FrameProcessor:
             Comprehensive analysis results
         """
 
+        # One timestamp per frame, shared by every detector below
+        timestamp = datetime.now().isoformat()
+
         results = {
             "camera_id": camera_id,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
             "frame_shape": frame.shape,
         }
 
         try:
+            run_pose = self.enable_pose and self.pose_estimator and full_analysis
+
+            # On CUDA, letterbox and upload once for both detection and pose
+            source = upload_frame(frame) if run_pose else None
+
             # 1. Object Detection
             if self.enable_detection and self.yolo_engine:
-                detection_results = self.yolo_engine.detect(frame, detect_ppe=True)
+                detection_results = self.yolo_engine.detect_video_frame(
+                    frame, camera_id=camera_id, source=source
+                )
                 results["detection"] = detection_results
 
             # 2. Pose Estimation
-            if self.enable_pose and self.pose_estimator and full_analysis:
-                pose_results = self.pose_estimator.estimate_pose(frame)
+            if run_pose:
+                pose_results = self.pose_estimator.estimate_pose(
+                    frame if source is None else source
+                )
                 results["pose"] = pose_results
 
             # 3. Fatigue Detection
             if self.enable_fatigue and self.fatigue_detector and full_analysis:
-                fatigue_results = self.fatigue_detector.detect_fatigue(frame)
+                fatigue_results = self.fatigue_detector.detect_fatigue(
+                    frame, timestamp=timestamp
+                )
                 results["fatigue"] = fatigue_results
 
             # 4. Intent Detection
             if self.enable_intent and self.intent_detector and full_analysis:
                 # Get person positions from detection
-                if (
-                    "detection" in results
-                    and results["detection"].get("people_count", 0) > 0
-                ):
+                detection = results.get("detection")
+                if detection and detection.get("people_count", 0) > 0:
                     # Use first detected person
-                    for obj in results["detection"].get("objects", []):
-                        if obj["class"] == "person":
-                            bbox = obj["bbox"]
-                            center_x = (bbox["x1"] + bbox["x2"]) / 2
-                            center_y = (bbox["y1"] + bbox["y2"]) / 2
+                    names = detection["names"]
+                    for cls_id, (x1, y1, x2, y2) in zip(
+                        detection["cls"].tolist(), detection["boxes"].tolist()
+                    ):
+                        if names[cls_id] == "person":
+                            center_x = (x1 + x2) / 2
+                            center_y = (y1 + y2) / 2
 
                             intent_results = self.intent_detector.detect_intent(
                                 person_position=(center_x, center_y),
                                 person_pose=results.get("pose"),
                                 context={"detection": results.get("detection")},
+                                timestamp=timestamp,
                             )
                             results["intent"] = intent_results
                             break
@@ -259,21 +275,25 @@ class FrameProcessor:
             cv2 = _get_cv2()  # Lazy import
             # Draw detections
             if "detection" in analysis:
-                for obj in analysis["detection"].get("objects", []):
-                    bbox = obj["bbox"]
-                    x1, y1 = int(bbox["x1"]), int(bbox["y1"])
-                    x2, y2 = int(bbox["x2"]), int(bbox["y2"])
+                detection = analysis["detection"]
+                names = detection["names"]
+                for cls_id, conf, (x1, y1, x2, y2) in zip(
+                    detection["cls"].tolist(),
+                    detection["conf"].tolist(),
+                    detection["boxes"].astype(int).tolist(),
+                ):
+                    class_name = names[cls_id]
 
                     # Color based on class
                     color = (0, 255, 0)  # Green for normal
-                    if "no_" in obj["class"].lower():
+                    if "no_" in class_name.lower():
                         color = (0, 0, 255)  # Red for violations
 
                     # Draw box
                     cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
 
                     # Draw label
-                    label = f"{obj['class']} {obj['confidence']:.2f}"
+                    label = f"{class_name} {conf:.2f}"
                     cv2.putText(
                         annotated,
                         label,
@@ -12,9 +12,16 @@ import uuid
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Body, File, HTTPException, UploadFile
+from fastapi import APIRouter, Body, File, HTTPException, Response, UploadFile
 from pydantic import BaseModel, Field
 
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Import AI Core engines
 try:
     import sys
@@ -26,7 +33,7 @@ try:
     from ai_core.fatigue_detection import get_fatigue_detector
     from ai_core.intent_detection import get_intent_detector
     from ai_core.pose_estimation import get_pose_estimator
-    from ai_core.yolo_engine import get_yolo_engine
+    from ai_core.yolo_engine import detections_to_dict, get_yolo_engine
     from cctv.frame_processor import get_frame_processor
     from cctv.stream_manager import get_stream_manager
 
@@ -121,6 +128,23 @@ def create_response(status: str, data: Any, message: str = "") -> Dict:
     }
 
 
+def json_response(payload: Dict) -> Any:
+    """
+    Serialize a response with orjson when installed
+
+    orjson writes numpy arrays and scalars directly and is much faster than
+    the stdlib encoder on float-heavy detection payloads. Without it the
+    payload is returned for FastAPI's default encoding.
+    """
+    if not ORJSON_AVAILABLE:
+        return payload
+
+    return Response(
+        orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+        media_type="application/json",
+    )
+
+
 # ═══════════════════════════════════════════════════════════
 # CORE ENDPOINTS
 # ═══════════════════════════════════════════════════════════
@@ -326,7 +350,10 @@ def detect_objects(request: DetectionRequest):
                 )
 
                 # Extract detections
-                detection_data = analysis.get("detection", {})
+                detection_data = analysis.get("detection")
+                detection_data = (
+                    detections_to_dict(detection_data) if detection_data else {}
+                )
                 pose_data = analysis.get("pose", {})
                 fatigue_data = analysis.get("fatigue", {})
                 intent_data = analysis.get("intent", {})
@@ -428,10 +455,12 @@ def detect_objects(request: DetectionRequest):
         # ═══════════════════════════════════════════════════════════
         DETECTIONS_DB.append(detection_result)
 
-        return create_response(
-            status="success",
-            data=detection_result,
-            message="Detection completed successfully",
+        return json_response(
+            create_response(
+                status="success",
+                data=detection_result,
+                message="Detection completed successfully",
+            )
         )
 
     except Exception as e:
@@ -1,11 +1,21 @@
+import atexit
 import json
 import logging
+import queue
 from datetime import datetime, timezone
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Optional
+
+# Writes queued records to the root handlers off the calling threads
+_listener: Optional[QueueListener] = None
 
 
 def setup_logging() -> None:
+    global _listener
+    if _listener is not None:
+        return  # Already set up; root's handlers now live in the listener
+
     Path("logs").mkdir(exist_ok=True)
     handler = RotatingFileHandler(
         "logs/platform.log", maxBytes=2_000_000, backupCount=5, encoding="utf-8"
@@ -15,7 +25,9 @@ def setup_logging() -> None:
         def format(self, record: logging.LogRecord) -> str:
             return json.dumps(
                 {
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "timestamp": datetime.fromtimestamp(
+                        record.created, timezone.utc
+                    ).isoformat(),
                     "level": record.levelname,
                     "logger": record.name,
                     "message": record.getMessage(),
@@ -28,3 +40,12 @@ def setup_logging() -> None:
     root.setLevel(logging.INFO)
     if not any(isinstance(h, RotatingFileHandler) for h in root.handlers):
         root.addHandler(handler)
+
+    # Loggers keep propagating to root; only root's handler I/O is queued
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    _listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(QueueHandler(log_queue))
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,51 @@
+import base64
+
+import cv2
+import numpy as np
+
+from backend import ai_engine
+
+
+def _jpeg() -> bytes:
+    return cv2.imencode(".jpg", np.zeros((120, 160, 3), np.uint8))[1].tobytes()
+
+
+def test_enhanced_detect_returns_raw_jpeg():
+    result = ai_engine.detect_frame_enhanced(
+        _jpeg(), annotate=True, annotate_format="jpeg"
+    )
+
+    assert result["raw"]["annotated_jpeg"][:2] == b"\xff\xd8"
+    assert "annotated_b64" not in result["raw"]
+
+
+def test_enhanced_detect_returns_base64_by_default():
+    result = ai_engine.detect_frame_enhanced(_jpeg(), annotate=True)
+
+    assert base64.b64decode(result["raw"]["annotated_b64"])[:2] == b"\xff\xd8"
+
+
+def test_device_frame_boxes_are_mapped_back_and_clipped(monkeypatch):
+    from backend.ai_core.model_backends import DeviceFrame
+
+    class Box:
+        xyxy = np.array([20.0, 40.0, 660.0, 600.0])
+        conf = 0.9
+        cls = 0
+
+    class Result:
+        boxes = [Box()]
+        names = {0: "person"}
+
+    class Model:
+        def predict(self, **kwargs):
+            return [Result()]
+
+    # 320x240 frame letterboxed to 640: scale 2, 80 px of padding top and bottom
+    frame = DeviceFrame(None, 2.0, 0, 80, (240, 320, 3))
+    monkeypatch.setattr(ai_engine, "_load_yolo", Model)
+    monkeypatch.setattr(ai_engine, "_to_source", lambda f: (f, frame))
+
+    result = ai_engine.detect_frame(b"frame")
+
+    assert result["objects"][0]["bbox"] == [10.0, 0.0, 320.0, 240.0]
@@ -0,0 +1,216 @@
+from backend.alerts import engine as engine_module
+from backend.alerts.engine import AlertEngine
+from backend.alerts.models import (
+    Alert,
+    AlertRule,
+    AlertSeverity,
+    AlertType,
+    NotificationChannel,
+)
+from backend.alerts.notifications import (
+    EmailChannel,
+    NotificationChannelBase,
+    NotificationManager,
+)
+
+
+def make_alert(**fields) -> Alert:
+    values = {
+        "type": AlertType.PPE_VIOLATION,
+        "severity": AlertSeverity.HIGH,
+        "title": "No helmet",
+        "description": "Worker without helmet",
+        "source": "AI_DETECTION",
+        "organization_id": "ORG-TEST",
+        **fields,
+    }
+    return Alert(**values)
+
+
+def test_cached_dump_is_not_shared():
+    alert = make_alert(metadata={"zone": {"name": "A"}})
+
+    dump = alert.cached_dump()
+    dump["metadata"]["zone"]["name"] = "B"
+    dump["escalation_path"].append("USER-1")
+    dump["notifications_sent"].append({"channel": "sms"})
+
+    assert alert.metadata == {"zone": {"name": "A"}}
+    assert alert.cached_dump()["escalation_path"] == []
+    assert alert.cached_dump()["notifications_sent"] == []
+
+
+def test_cached_dump_copies_escalation_entries():
+    alert = make_alert()
+    alert.escalation_path.append({"level": 1, "recipients": ["USER-1"]})
+    alert.mark_changed()
+
+    alert.cached_dump()["escalation_path"][0]["recipients"].append("USER-2")
+
+    assert alert.cached_dump()["escalation_path"][0]["recipients"] == ["USER-1"]
+
+
+def test_cached_dump_follows_changes():
+    alert = make_alert()
+    assert alert.cached_dump()["escalation_level"] == 0
+
+    alert.escalation_level = 2
+    alert.escalation_path.append("USER-1")
+    alert.mark_changed()
+
+    dump = alert.cached_dump()
+    assert dump["escalation_level"] == 2
+    assert dump["escalation_path"] == ["USER-1"]
+
+
+def make_rule(**fields) -> AlertRule:
+    values = {
+        "name": "PPE",
+        "trigger_type": AlertType.PPE_VIOLATION,
+        "severity": AlertSeverity.HIGH,
+        "organization_id": "ORG-TEST",
+        **fields,
+    }
+    return AlertRule(**values)
+
+
+def ppe_detection(confidence: float, kind: str = "no_hardhat") -> dict:
+    return {
+        "camera_id": "CAM-1",
+        "ppe_compliance": {
+            "compliant": False,
+            "violations": [{"type": kind, "confidence": confidence}],
+        },
+    }
+
+
+def test_ppe_rule_table_cached_until_invalidated():
+    engine = AlertEngine()
+    rule = make_rule(conditions={"confidence_threshold": 0.9})
+    rules = engine.bucket_rules([rule])
+
+    assert engine.evaluate_detection(ppe_detection(0.85), rules) == []
+
+    # The table is cached per bucket, so a changed threshold needs invalidation
+    rule.conditions["confidence_threshold"] = 0.5
+    assert engine.evaluate_detection(ppe_detection(0.85, "no_vest"), rules) == []
+
+    engine.invalidate_rules()
+    alerts = engine.evaluate_detection(ppe_detection(0.85, "no_vest"), rules)
+    assert [a.severity for a in alerts] == [AlertSeverity.HIGH]
+
+
+def test_repeat_detection_is_deduplicated():
+    engine = AlertEngine()
+    rules = engine.bucket_rules([make_rule()])
+
+    first = engine.evaluate_detection(ppe_detection(0.95), rules)
+    repeat = engine.evaluate_detection(ppe_detection(0.95), rules)
+
+    assert len(first) == 1
+    assert repeat == []
+    assert first[0].metadata["dedup_count"] == 1
+
+    # Once resolved, the same condition raises a new alert
+    engine.resolve_alert(first[0].id, "USER-1", "Helmet on")
+    assert len(engine.evaluate_detection(ppe_detection(0.95), rules)) == 1
+
+
+def create(engine: AlertEngine, severity=AlertSeverity.HIGH, **fields) -> Alert:
+    return engine.create_alert(
+        alert_type=AlertType.PPE_VIOLATION,
+        severity=severity,
+        title="No helmet",
+        description="Worker without helmet",
+        organization_id="ORG-TEST",
+        **fields,
+    )
+
+
+def test_active_alerts_past_the_cap_are_evicted(monkeypatch):
+    monkeypatch.setattr(engine_module, "ACTIVE_ALERTS_CAP", 2)
+    engine = AlertEngine()
+    alerts = [create(engine) for _ in range(3)]
+
+    active = engine.get_active_alerts("ORG-TEST")
+    assert [a.id for a in active] == [a.id for a in alerts[1:]]
+    assert engine.get_stats("ORG-TEST")["active_alerts"] == 2
+
+
+def test_iter_active_alerts_filters_and_skips_resolved():
+    engine = AlertEngine()
+    high, critical, resolved = (
+        create(engine),
+        create(engine, severity=AlertSeverity.CRITICAL),
+        create(engine, severity=AlertSeverity.CRITICAL),
+    )
+    engine.resolve_alert(resolved.id, "USER-1", "Helmet on")
+
+    assert {a.id for a in engine.iter_active_alerts("ORG-TEST")} == {
+        high.id,
+        critical.id,
+    }
+    assert [
+        a.id
+        for a in engine.iter_active_alerts("ORG-TEST", severity=AlertSeverity.CRITICAL)
+    ] == [critical.id]
+    assert list(engine.iter_active_alerts("ORG-OTHER")) == []
+
+
+def test_send_batch_sends_to_each_recipient():
+    class RecordingChannel(NotificationChannelBase):
+        def __init__(self):
+            self.sent = []
+
+        def send(self, recipient, subject, message, metadata=None):
+            self.sent.append(recipient)
+            return True, f"ID-{recipient}", None
+
+        def get_channel_type(self):
+            return NotificationChannel.SMS
+
+    channel = RecordingChannel()
+    results = channel.send_batch(["a", "b"], "Subject", "Message")
+
+    assert channel.sent == ["a", "b"]
+    assert results == [(True, "ID-a", None), (True, "ID-b", None)]
+
+
+def test_email_batch_is_one_message_for_all_recipients():
+    results = EmailChannel().send_batch(
+        ["a@example.com", "b@example.com"], "Subject", "Message"
+    )
+
+    assert len(results) == 2
+    assert all(success for success, _, _ in results)
+    assert len({provider_id for _, provider_id, _ in results}) == 1
+
+
+def test_batch_notification_respects_provider_batch_size():
+    calls = []
+
+    class RecordingChannel(NotificationChannelBase):
+        max_batch_size = 2
+
+        def send(self, recipient, subject, message, metadata=None):
+            calls.append(["send", recipient])
+            return True, "ID", None
+
+        def send_batch(self, recipients, subject, message, metadata=None):
+            calls.append(["batch", *recipients])
+            return [(True, "ID", None)] * len(recipients)
+
+        def get_channel_type(self):
+            return NotificationChannel.SMS
+
+    manager = NotificationManager()
+    manager.channels[NotificationChannel.SMS] = RecordingChannel()
+    alert = make_alert()
+    recipients = [{"id": f"U{i}", "sms_contact": f"+{i}"} for i in range(5)]
+    recipients.append({"id": "U-NO-SMS", "email_contact": "x@example.com"})
+
+    sent = manager.send_batch_notification(alert, NotificationChannel.SMS, recipients)
+
+    assert calls == [["batch", "+0", "+1"], ["batch", "+2", "+3"], ["send", "+4"]]
+    assert [n.recipient_id for n in sent] == ["U0", "U1", "U2", "U3", "U4"]
+    assert len(alert.notifications_sent) == 5
@@ -0,0 +1,45 @@
+from fastapi.testclient import TestClient
+
+from backend.alerts import api
+from backend.main import app
+
+client = TestClient(app)
+
+RULE = {
+    "name": "PPE",
+    "trigger_type": "ppe_violation",
+    "severity": "high",
+    "organization_id": "ORG-IDX",
+}
+
+
+def test_rule_index_drops_empty_buckets():
+    created = client.post(
+        "/api/alerts/alert-rules", params={"organization_id": "ORG-IDX"}, json=RULE
+    )
+    assert created.status_code == 200
+    rule_id = created.json()["data"]["rule"]["id"]
+    key = ("ORG-IDX", api.AlertType.PPE_VIOLATION)
+    assert [r.id for r in api.RULES_BY_ORG_TYPE[key]] == [rule_id]
+
+    # Re-creating the rule under another organization moves it between buckets
+    moved = client.post(
+        "/api/alerts/alert-rules",
+        params={"organization_id": "ORG-IDX-2"},
+        json={**RULE, "id": rule_id},
+    )
+    assert moved.status_code == 200
+    assert key not in api.RULES_BY_ORG_TYPE
+
+    assert client.delete(f"/api/alerts/alert-rules/{rule_id}").status_code == 200
+    assert ("ORG-IDX-2", api.AlertType.PPE_VIOLATION) not in api.RULES_BY_ORG_TYPE
+
+
+def test_stats_keep_the_deprecated_total_key():
+    response = client.get(
+        "/api/alerts/alerts/stats/overview", params={"organization_id": "X"}
+    )
+    assert response.status_code == 200
+
+    metrics = response.json()["data"]["metrics"]
+    assert metrics["total_alerts_all_time"] == metrics["total_alerts_retained"]
@@ -0,0 +1,237 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.alerts import escalation
+from backend.alerts.engine import get_alert_engine
+from backend.alerts.escalation import EscalationLog, EscalationManager
+from backend.alerts.models import (
+    Alert,
+    AlertSeverity,
+    AlertType,
+    EscalationRule,
+    NotificationChannel,
+)
+from backend.alerts.notifications import get_notification_manager
+
+
+def make_alert(**fields) -> Alert:
+    values = {
+        "type": AlertType.PPE_VIOLATION,
+        "severity": AlertSeverity.CRITICAL,
+        "title": "No helmet",
+        "description": "Worker without helmet",
+        "source": "AI_DETECTION",
+        "organization_id": "ORG-TEST",
+        **fields,
+    }
+    return Alert(**values)
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    # Short buckets so scheduled checks come due within the test
+    monkeypatch.setattr(escalation, "ESCALATION_TICK_SECONDS", 0.05)
+    manager = EscalationManager()
+    yield manager
+    manager.stop_monitoring()
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_cancel_right_after_schedule_drops_the_check(manager):
+    fired = []
+    alert = make_alert()
+
+    manager.schedule_escalation_check(alert, 0, fired.append)
+    manager.cancel_escalation(alert.id)
+
+    time.sleep(0.3)
+    assert fired == []
+    assert manager.escalation_timers == {}
+
+
+def test_scheduled_checks_fire_when_their_bucket_comes_due(manager):
+    fired = []
+
+    async def async_check(alert):
+        fired.append(("async", alert.id))
+
+    first, second = make_alert(), make_alert()
+    manager.schedule_escalation_check(first, 0, lambda a: fired.append(("sync", a.id)))
+    manager.schedule_escalation_check(second, 0, async_check)
+
+    assert wait_for(lambda: len(fired) == 2)
+    assert sorted(fired) == [("async", second.id), ("sync", first.id)]
+    assert wait_for(lambda: manager.escalation_timers == {})
+
+
+def test_rescheduling_replaces_the_earlier_check(manager):
+    fired = []
+    alert = make_alert()
+
+    manager.schedule_escalation_check(alert, 60, lambda a: fired.append("late"))
+    manager.schedule_escalation_check(alert, 0, lambda a: fired.append("now"))
+
+    assert wait_for(lambda: fired == ["now"])
+    time.sleep(0.2)
+    assert fired == ["now"]
+
+
+def make_rule(**fields) -> EscalationRule:
+    values = {
+        "name": "Critical",
+        "min_severity": AlertSeverity.CRITICAL,
+        "organization_id": "ORG-TEST",
+        "escalation_levels": [
+            {"level": 1, "delay_minutes": 5, "notify_roles": ["supervisor"]}
+        ],
+        **fields,
+    }
+    return EscalationRule(**values)
+
+
+def test_bulk_check_escalates_only_due_alerts():
+    manager = EscalationManager()
+    manager.add_rule(make_rule())
+    users = {"supervisor": ["USER-1"]}
+
+    due = make_alert(created_at=datetime.now() - timedelta(minutes=6))
+    fresh = make_alert()
+    low = make_alert(
+        severity=AlertSeverity.LOW, created_at=datetime.now() - timedelta(hours=1)
+    )
+
+    results = manager.check_escalations_bulk([due, fresh, low], users)
+
+    assert [r["level"] for r in results] == [1]
+    assert results[0]["recipients"] == ["USER-1"]
+    assert due.escalation_level == 1
+    assert fresh.escalation_level == 0
+    assert low.escalation_level == 0
+    assert manager.escalation_log.count(level=1) == 1
+
+
+def test_sweep_checks_active_engine_alerts():
+    manager = EscalationManager()
+    manager.add_rule(make_rule(organization_id="ORG-SWEEP"))
+    alert = get_alert_engine().create_alert(
+        alert_type=AlertType.FALL_DETECTED,
+        severity=AlertSeverity.CRITICAL,
+        title="Fall",
+        description="Worker fall",
+        organization_id="ORG-SWEEP",
+    )
+    alert.created_at = datetime.now() - timedelta(minutes=10)
+
+    results = manager.sweep_escalations({})
+
+    assert [r["level"] for r in results] == [1]
+    assert alert.escalation_level == 1
+
+
+def test_escalation_log_counts_by_level_and_time():
+    log = EscalationLog(max_entries=4)
+    now = datetime.now()
+    for i, level in enumerate([1, 1, 2]):
+        log.append(level, now - timedelta(minutes=10 - i))
+
+    assert len(log) == 3
+    assert log.count(level=1) == 2
+    assert log.count(since=now - timedelta(minutes=8.5)) == 1
+
+    # Full: the oldest half is dropped before the new entry
+    log.append(3, now)
+    log.append(3, now)
+    assert log.level.tolist() == [2, 3, 3]
+    assert log.dropped == 2
+    assert log.count(level=3) == 2
+
+
+@pytest.mark.parametrize("batch_size", [0, -5, 2.5])
+def test_add_rule_rejects_unusable_batch_size(batch_size):
+    manager = EscalationManager()
+    levels = [{"level": 1, "delay_minutes": 5, "max_batch_size": batch_size}]
+
+    with pytest.raises(ValueError):
+        manager.add_rule(make_rule(escalation_levels=levels))
+
+    assert manager.rules == {}
+
+
+def test_rule_snapshot_is_isolated_but_is_active_is_live():
+    manager = EscalationManager()
+    rule = make_rule()
+    manager.add_rule(rule)
+    alert = make_alert(created_at=datetime.now() - timedelta(minutes=6))
+
+    # Edits to the rule's levels only apply once it is re-added
+    rule.escalation_levels[0]["delay_minutes"] = 60
+    rule.escalation_levels[0]["notify_roles"].append("owner")
+    core_level = manager._cores[rule.id].escalation_levels[0]
+    assert core_level["delay_minutes"] == 5
+    assert core_level["notify_roles"] == ("supervisor",)
+    with pytest.raises(TypeError):
+        core_level["delay_minutes"] = 1
+
+    # Toggling is_active takes effect right away, for both check paths
+    rule.is_active = False
+    assert manager.check_escalation(alert, {}) is None
+    assert manager.check_escalations_bulk([alert], {}) == []
+    assert manager.get_stats()["active_rules"] == 0
+
+    rule.is_active = True
+    assert manager.check_escalation(alert, {})["level"] == 1
+
+
+def test_escalation_sends_one_batch_per_channel(monkeypatch):
+    calls = []
+    sms = get_notification_manager().channels[NotificationChannel.SMS]
+
+    def recording_send(recipient, *args, **kwargs):
+        calls.append(("send", recipient))
+        return True, "SMS-1", None
+
+    monkeypatch.setattr(sms, "send", recording_send)
+    real_batch = sms.send_batch
+
+    def recording_batch(recipients, *args, **kwargs):
+        calls.append(("batch", list(recipients)))
+        return real_batch(recipients, *args, **kwargs)
+
+    monkeypatch.setattr(sms, "send_batch", recording_batch)
+
+    manager = EscalationManager()
+    levels = [
+        {
+            "level": 1,
+            "delay_minutes": 5,
+            "notify_roles": ["supervisor"],
+            "channels": ["sms"],
+            "max_batch_size": 2,
+        }
+    ]
+    manager.add_rule(make_rule(escalation_levels=levels))
+    manager.register_contacts(
+        [{"id": f"USER-{i}", "sms_contact": f"+96650000000{i}"} for i in range(3)]
+    )
+    alert = make_alert(created_at=datetime.now() - timedelta(minutes=6))
+
+    users = {"supervisor": ["USER-0", "USER-1", "USER-2"]}
+    result = manager.check_escalation(alert, users)
+
+    assert result["channel_batches"] == {"sms": [["USER-0", "USER-1"], ["USER-2"]]}
+    assert result["notifications_sent"] == 3
+    # Full batch goes out in one call; the lone recipient takes send()
+    assert calls == [
+        ("batch", ["+966500000000", "+966500000001"]),
+        ("send", "+966500000002"),
+    ]
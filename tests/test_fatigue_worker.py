@@ -0,0 +1,114 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from backend.ai_core import fatigue_detection as fd
+
+SLOT_BYTES = 1920 * 1080 * 3
+
+
+@pytest.mark.parametrize("shape", [(1536, 2048, 3), (3000, 4000, 3), (1080, 1920, 3)])
+def test_fit_frame_fits_shm_slot(shape):
+    image = np.zeros(shape, dtype=np.uint8)
+    fitted = fd._fit_frame(image, SLOT_BYTES)
+
+    assert fitted.nbytes <= SLOT_BYTES
+    assert fitted.shape[2] == 3
+    # Uniform downscale keeps the aspect ratio
+    assert abs(fitted.shape[1] / fitted.shape[0] - shape[1] / shape[0]) < 0.01
+
+
+def test_worker_start_failure_unlinks_shm(monkeypatch):
+    created = []
+    real_shm = shared_memory.SharedMemory
+
+    def recording_shm(*args, **kwargs):
+        shm = real_shm(*args, **kwargs)
+        created.append(shm.name)
+        return shm
+
+    def failing_start(process):
+        raise RuntimeError("spawn failed")
+
+    monkeypatch.setattr(fd.shared_memory, "SharedMemory", recording_shm)
+    monkeypatch.setattr(fd._FaceMeshWorker, "_start", staticmethod(failing_start))
+
+    with pytest.raises(RuntimeError):
+        fd._FaceMeshWorker(max_num_faces=1)
+
+    assert created
+    with pytest.raises(FileNotFoundError):
+        real_shm(name=created[0])
+
+
+@pytest.mark.skipif(not fd.MEDIAPIPE_AVAILABLE, reason="mediapipe not installed")
+def test_worker_processes_oversized_4x3_frame():
+    worker = fd._FaceMeshWorker(max_num_faces=1)
+    try:
+        assert worker.submit(np.zeros((1536, 2048, 3), dtype=np.uint8))
+
+        deadline = time.monotonic() + 60
+        faces = None
+        while faces is None and time.monotonic() < deadline:
+            faces = worker.poll()
+            time.sleep(0.05)
+
+        assert faces == []
+    finally:
+        worker.close()
+
+
+def test_fatigue_batch_simulation_tags_each_person(monkeypatch):
+    monkeypatch.setattr(fd, "MEDIAPIPE_AVAILABLE", False)
+    detector = fd.FatigueDetector()
+
+    analyses = detector.detect_fatigue_batch(
+        np.zeros((480, 640, 3), dtype=np.uint8), person_ids=[7, 9]
+    )
+
+    assert [a["person_id"] for a in analyses] == [7, 9]
+
+
+@pytest.mark.skipif(not fd.MEDIAPIPE_AVAILABLE, reason="mediapipe not installed")
+def test_fatigue_batch_without_faces_is_empty():
+    detector = fd.FatigueDetector(max_num_faces=2)
+    try:
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        assert detector.detect_fatigue_batch(frame) == []
+    finally:
+        detector.close()
+
+
+@pytest.mark.skipif(not fd.MEDIAPIPE_AVAILABLE, reason="mediapipe not installed")
+def test_worker_death_while_busy_raises_from_poll():
+    worker = fd._FaceMeshWorker(max_num_faces=1)
+    try:
+        assert worker.submit(np.zeros((480, 640, 3), dtype=np.uint8))
+        worker._process.kill()
+        worker._process.join(timeout=5)
+
+        with pytest.raises(RuntimeError):
+            worker.poll()
+        assert not worker._busy
+    finally:
+        worker.close()
+
+
+@pytest.mark.skipif(not fd.MEDIAPIPE_AVAILABLE, reason="mediapipe not installed")
+def test_detector_falls_back_in_process_when_worker_dies():
+    detector = fd.FatigueDetector(async_mode=True)
+    try:
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        detector.detect_fatigue(frame)
+        detector._worker._process.kill()
+        detector._worker._process.join(timeout=5)
+
+        result = detector.detect_fatigue(frame)
+
+        assert detector._worker is None
+        assert detector.face_mesh is not None
+        assert "simulation_mode" not in result
+    finally:
+        detector.close()
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from backend.ai_core.yolo_engine import YOLOEngine, detections_to_dict
+
+
+def test_detect_batch_splits_frames_by_the_model_batch_limit():
+    engine = YOLOEngine()
+    calls = []
+
+    def fake_infer(frames):
+        calls.append(len(frames))
+        return [SimpleNamespace(names={0: "person"}, boxes=None) for _ in frames]
+
+    engine.model = object()  # Loaded model stand-in; inference is faked
+    engine.max_batch = 3
+    engine._infer = fake_infer
+
+    frames = [np.zeros((64, 64, 3), dtype=np.uint8)] * 7
+    results = engine.detect_batch(frames, detect_ppe=False)
+
+    assert calls == [3, 3, 1]
+    assert len(results) == 7
+    assert all(len(r["boxes"]) == 0 for r in results)
+
+
+def test_detections_to_dict_expands_the_arrays():
+    detections = {
+        "boxes": np.array([[1, 2, 3, 4]], dtype=np.float32),
+        "conf": np.array([0.5], dtype=np.float32),
+        "cls": np.array([0], dtype=np.int32),
+        "names": {0: "person"},
+        "people_count": 1,
+        "timestamp_ns": 1_700_000_000_000_000_000,
+    }
+
+    payload = detections_to_dict(detections)
+
+    assert payload["objects"] == [
+        {
+            "class": "person",
+            "confidence": 0.5,
+            "bbox": {"x1": 1.0, "y1": 2.0, "x2": 3.0, "y2": 4.0},
+        }
+    ]
+    assert payload["people_count"] == 1
+    assert payload["timestamp"].startswith("2023-11-1")
+    assert "boxes" not in payload and "timestamp_ns" not in payload